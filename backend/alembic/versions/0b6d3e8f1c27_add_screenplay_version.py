@@ -0,0 +1,24 @@
+"""add screenplay version
+
+Revision ID: 0b6d3e8f1c27
+Revises: f2a7b9c4e8d3
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6d3e8f1c27'
+down_revision = 'f2a7b9c4e8d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('screenplays', sa.Column('version', sa.Integer, nullable=False, server_default=sa.text('0')))
+
+
+def downgrade():
+    op.drop_column('screenplays', 'version')
@@ -0,0 +1,27 @@
+"""add keyset pagination indexes
+
+Revision ID: 3f1d2a9c8e41
+Revises: 5b9a6c625c53
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1d2a9c8e41'
+down_revision = '5b9a6c625c53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('screenplay_updated_at_id_idx', 'screenplays', ['updated_at', 'id'])
+    op.create_index('screenplay_owner_updated_at_id_idx', 'screenplays', ['owner_id', 'updated_at', 'id'])
+    op.create_index('screenplay_public_updated_at_id_idx', 'screenplays', ['is_public', 'updated_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('screenplay_public_updated_at_id_idx', table_name='screenplays')
+    op.drop_index('screenplay_owner_updated_at_id_idx', table_name='screenplays')
+    op.drop_index('screenplay_updated_at_id_idx', table_name='screenplays')
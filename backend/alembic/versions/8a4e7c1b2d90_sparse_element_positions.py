@@ -0,0 +1,54 @@
+"""sparse element positions
+
+Revision ID: 8a4e7c1b2d90
+Revises: 3f1d2a9c8e41
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e7c1b2d90'
+down_revision = '3f1d2a9c8e41'
+branch_labels = None
+depends_on = None
+
+POSITION_GAP = 1024
+# screenplays renumbered per statement, so that no transaction holds row locks on the whole table
+BATCH_SIZE = 100
+
+
+def renumber(connection, expression):
+    max_id = connection.execute(sa.text("SELECT coalesce(max(id), 0) FROM screenplays")).scalar()
+    for start in range(0, max_id + 1, BATCH_SIZE):
+        connection.execute(sa.text(f"""
+            UPDATE editorelements SET position = numbered.position
+            FROM (
+                SELECT id, {expression} AS position
+                FROM editorelements
+                WHERE screenplay_id >= :start AND screenplay_id < :end
+            ) AS numbered
+            WHERE editorelements.id = numbered.id AND editorelements.position IS DISTINCT FROM numbered.position
+        """), {"start": start, "end": start + BATCH_SIZE})
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'editor_element_screenplay_position_idx', 'editorelements', ['screenplay_id', 'position'],
+            postgresql_concurrently=True,
+        )
+        renumber(
+            op.get_bind(),
+            f"row_number() OVER (PARTITION BY screenplay_id ORDER BY position, id) * {POSITION_GAP}",
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        renumber(op.get_bind(), "row_number() OVER (PARTITION BY screenplay_id ORDER BY position, id) - 1")
+        op.drop_index(
+            'editor_element_screenplay_position_idx', table_name='editorelements', postgresql_concurrently=True,
+        )
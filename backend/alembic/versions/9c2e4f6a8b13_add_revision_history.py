@@ -0,0 +1,56 @@
+"""add revision history
+
+Revision ID: 9c2e4f6a8b13
+Revises: 0b6d3e8f1c27
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c2e4f6a8b13'
+down_revision = '0b6d3e8f1c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing screenplays get their first snapshot with their next change
+    op.create_table(
+        'screenplayrevisions',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('version', sa.Integer, nullable=False),
+        sa.Column('operation_count', sa.Integer, nullable=False, server_default=sa.text('0')),
+        sa.Column('encoding', sa.String, nullable=False),
+        sa.Column('data', sa.LargeBinary, nullable=False),
+
+        sa.Column('created_at', sa.DateTime, nullable=False, server_default=sa.text('now()')),
+        sa.Column('updated_at', sa.DateTime, nullable=False, server_default=sa.text('now()')),
+        sa.Column('deleted_at', sa.DateTime, nullable=True, default=None),
+
+        sa.Column('screenplay_id', sa.Integer, nullable=False),
+        sa.ForeignKeyConstraint(('screenplay_id',), ['screenplays.id'], ondelete='CASCADE'),
+        sa.UniqueConstraint('screenplay_id', 'version', name='screenplay_revision_screenplay_version_key'),
+    )
+    op.create_table(
+        'screenplaysnapshots',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('version', sa.Integer, nullable=False),
+        sa.Column('encoding', sa.String, nullable=False),
+        sa.Column('data', sa.LargeBinary, nullable=False),
+
+        sa.Column('created_at', sa.DateTime, nullable=False, server_default=sa.text('now()')),
+        sa.Column('updated_at', sa.DateTime, nullable=False, server_default=sa.text('now()')),
+        sa.Column('deleted_at', sa.DateTime, nullable=True, default=None),
+
+        sa.Column('screenplay_id', sa.Integer, nullable=False),
+        sa.ForeignKeyConstraint(('screenplay_id',), ['screenplays.id'], ondelete='CASCADE'),
+        sa.UniqueConstraint('screenplay_id', 'version', name='screenplay_snapshot_screenplay_version_key'),
+    )
+
+
+def downgrade():
+    op.drop_table('screenplaysnapshots')
+    op.drop_table('screenplayrevisions')
@@ -0,0 +1,68 @@
+"""partial live screenplay indexes
+
+Revision ID: a6d8e1f3b250
+Revises: 9c2e4f6a8b13
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d8e1f3b250'
+down_revision = '9c2e4f6a8b13'
+branch_labels = None
+depends_on = None
+
+# must match the filters of the list queries in crud.screenplay for the indexes to apply
+LIVE = "deleted_at IS NULL"
+LIVE_PUBLIC = "deleted_at IS NULL AND is_public IS true"
+
+
+def upgrade():
+    # the list queries only read live rows, soft-deleted screenplays no longer take space in their indexes
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'screenplay_live_updated_at_id_idx', 'screenplays', ['updated_at', 'id'],
+            postgresql_where=sa.text(LIVE), postgresql_concurrently=True,
+        )
+        op.create_index(
+            'screenplay_live_owner_updated_at_id_idx', 'screenplays', ['owner_id', 'updated_at', 'id'],
+            postgresql_where=sa.text(LIVE), postgresql_concurrently=True,
+        )
+        op.create_index(
+            'screenplay_live_public_updated_at_id_idx', 'screenplays', ['updated_at', 'id'],
+            postgresql_where=sa.text(LIVE_PUBLIC), postgresql_concurrently=True,
+        )
+        # soft-deleted screenplays in deletion order, for the purge
+        op.create_index(
+            'screenplay_deleted_at_idx', 'screenplays', ['deleted_at'],
+            postgresql_where=sa.text("deleted_at IS NOT NULL"), postgresql_concurrently=True,
+        )
+        op.drop_index('screenplay_public_updated_at_id_idx', table_name='screenplays', postgresql_concurrently=True)
+        op.drop_index('screenplay_owner_updated_at_id_idx', table_name='screenplays', postgresql_concurrently=True)
+        op.drop_index('screenplay_updated_at_id_idx', table_name='screenplays', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'screenplay_updated_at_id_idx', 'screenplays', ['updated_at', 'id'], postgresql_concurrently=True,
+        )
+        op.create_index(
+            'screenplay_owner_updated_at_id_idx', 'screenplays', ['owner_id', 'updated_at', 'id'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'screenplay_public_updated_at_id_idx', 'screenplays', ['is_public', 'updated_at', 'id'],
+            postgresql_concurrently=True,
+        )
+        op.drop_index('screenplay_deleted_at_idx', table_name='screenplays', postgresql_concurrently=True)
+        op.drop_index(
+            'screenplay_live_public_updated_at_id_idx', table_name='screenplays', postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'screenplay_live_owner_updated_at_id_idx', table_name='screenplays', postgresql_concurrently=True,
+        )
+        op.drop_index('screenplay_live_updated_at_id_idx', table_name='screenplays', postgresql_concurrently=True)
@@ -0,0 +1,24 @@
+"""add user token version
+
+Revision ID: b7c3e5f90a12
+Revises: 8a4e7c1b2d90
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7c3e5f90a12'
+down_revision = '8a4e7c1b2d90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('token_version', sa.Integer, nullable=False, server_default=sa.text('0')))
+
+
+def downgrade():
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,48 @@
+"""element content search index
+
+Revision ID: d41e6b2a7f35
+Revises: b7c3e5f90a12
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41e6b2a7f35'
+down_revision = 'b7c3e5f90a12'
+branch_labels = None
+depends_on = None
+
+# must match the expression searched in crud.editor_element.search
+SEARCH_VECTOR = "to_tsvector('english', coalesce(content, ''))"
+TRIGRAM_ENABLED = os.getenv("SEARCH_TRIGRAM_ENABLED", "").lower() in ("1", "true", "yes")
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('editor_element_content_idx', table_name='editorelements', postgresql_concurrently=True)
+        op.create_index(
+            'editor_element_content_search_idx', 'editorelements', [sa.text(SEARCH_VECTOR)],
+            postgresql_using='gin', postgresql_concurrently=True,
+        )
+        if TRIGRAM_ENABLED:
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            op.create_index(
+                'editor_element_content_trgm_idx', 'editorelements', ['content'],
+                postgresql_using='gin', postgresql_ops={'content': 'gin_trgm_ops'}, postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS editor_element_content_trgm_idx")
+        op.drop_index(
+            'editor_element_content_search_idx', table_name='editorelements', postgresql_concurrently=True,
+        )
+        op.create_index(
+            'editor_element_content_idx', 'editorelements', ['content'], postgresql_concurrently=True,
+        )
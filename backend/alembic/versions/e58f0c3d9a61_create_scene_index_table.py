@@ -0,0 +1,44 @@
+"""create scene index table
+
+Revision ID: e58f0c3d9a61
+Revises: d41e6b2a7f35
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e58f0c3d9a61'
+down_revision = 'd41e6b2a7f35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing screenplays are indexed by running rebuild_scenes.py
+    op.create_table(
+        'scenes',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('heading_id', sa.Integer, nullable=True),
+        sa.Column('heading', sa.String, nullable=True),
+        sa.Column('start_position', sa.Integer, nullable=False),
+        sa.Column('end_position', sa.Integer, nullable=False),
+        sa.Column('element_count', sa.Integer, nullable=False, server_default=sa.text('0')),
+        sa.Column('word_count', sa.Integer, nullable=False, server_default=sa.text('0')),
+        sa.Column('characters', sa.JSON, nullable=False, server_default=sa.text("'[]'")),
+
+        sa.Column('created_at', sa.DateTime, nullable=False, server_default=sa.text('now()')),
+        sa.Column('updated_at', sa.DateTime, nullable=False, server_default=sa.text('now()')),
+        sa.Column('deleted_at', sa.DateTime, nullable=True, default=None),
+
+        sa.Column('screenplay_id', sa.Integer, nullable=False),
+        sa.ForeignKeyConstraint(('screenplay_id',), ['screenplays.id'], ondelete='CASCADE'),
+    )
+    op.create_index('scene_screenplay_start_position_idx', 'scenes', ['screenplay_id', 'start_position'])
+
+
+def downgrade():
+    op.drop_index('scene_screenplay_start_position_idx', table_name='scenes')
+    op.drop_table('scenes')
@@ -0,0 +1,42 @@
+"""add character statistics
+
+Revision ID: f2a7b9c4e8d3
+Revises: e58f0c3d9a61
+Create Date: 2026-10-18 11:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a7b9c4e8d3'
+down_revision = 'e58f0c3d9a61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing screenplays get their statistics by running rebuild_scenes.py
+    op.add_column('scenes', sa.Column('character_stats', sa.JSON, nullable=False, server_default=sa.text("'{}'")))
+    op.create_table(
+        'characterstats',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('name', sa.String, nullable=False),
+        sa.Column('lines', sa.Integer, nullable=False, server_default=sa.text('0')),
+        sa.Column('words', sa.Integer, nullable=False, server_default=sa.text('0')),
+        sa.Column('scenes', sa.Integer, nullable=False, server_default=sa.text('0')),
+
+        sa.Column('created_at', sa.DateTime, nullable=False, server_default=sa.text('now()')),
+        sa.Column('updated_at', sa.DateTime, nullable=False, server_default=sa.text('now()')),
+        sa.Column('deleted_at', sa.DateTime, nullable=True, default=None),
+
+        sa.Column('screenplay_id', sa.Integer, nullable=False),
+        sa.ForeignKeyConstraint(('screenplay_id',), ['screenplays.id'], ondelete='CASCADE'),
+        sa.UniqueConstraint('screenplay_id', 'name', name='character_stat_screenplay_name_key'),
+    )
+
+
+def downgrade():
+    op.drop_table('characterstats')
+    op.drop_column('scenes', 'character_stats')
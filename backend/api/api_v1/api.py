@@ -1,8 +1,11 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
 from api.api_v1.endpoints import screenplays, users, auth
+from core.query_budget import QueryBudget
 
+# queries a request may issue, see QUERY_BUDGET_MODE; keep them tight so that N+1 regressions show
 api_router = APIRouter()
-api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
-api_router.include_router(users.router, prefix="/users", tags=["users"])
-api_router.include_router(screenplays.router, prefix="/screenplays", tags=["screenplays"])
+api_router.include_router(auth.router, prefix="/auth", tags=["auth"], dependencies=[Depends(QueryBudget(5))])
+api_router.include_router(users.router, prefix="/users", tags=["users"], dependencies=[Depends(QueryBudget(10))])
+api_router.include_router(
+    screenplays.router, prefix="/screenplays", tags=["screenplays"], dependencies=[Depends(QueryBudget(20))])
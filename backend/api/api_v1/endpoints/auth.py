@@ -12,24 +12,25 @@ from starlette.responses import Response
 import crud
 import schemas
 from api import deps
-from api.deps import get_current_active_user, get_user_with_expired_access_token
+from api.deps import get_current_active_claims, get_user_with_expired_access_token
 from core import security
 from core.config import settings
+from crud.base import AnySession
 
 router = APIRouter()
 
 
 @router.post("/login/access-token", response_model=schemas.Token)
-def login_access_token(
+async def login_access_token(
     response: Response,
-    db: Session = Depends(deps.get_db),
+    db: AnySession = Depends(deps.get_async_db),
     form_data: OAuth2PasswordRequestForm = Depends(),
     stay_logged_in: bool = False
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = crud.user.authenticate(
+    user = await crud.user.aauthenticate(
         db, email=form_data.username, password=form_data.password
     )
     if not user:
@@ -40,7 +41,7 @@ def login_access_token(
     if stay_logged_in:
         refresh_token_expires = timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
         refresh_token = security.create_refresh_token(
-            user.id, expires_delta=refresh_token_expires, db=db
+            user.id, expires_delta=refresh_token_expires, user=user
         ),
         response.set_cookie(
             key="refresh_token",
@@ -52,7 +53,7 @@ def login_access_token(
         access_token_expires = access_token_expires + timedelta(hours=12)
     return {
         "access_token": security.create_access_token(
-            user.id, expires_delta=access_token_expires, db=db
+            user.id, expires_delta=access_token_expires, user=user
         ),
     }
 
@@ -92,7 +93,7 @@ def login_refresh_token(
     }
 
 
-@router.post("/login/remove-token", dependencies=[Depends(get_current_active_user)])
+@router.post("/login/remove-token", dependencies=[Depends(get_current_active_claims)])
 def remove_token(
     response: Response
 ) -> Any:
@@ -103,6 +104,6 @@ def remove_token(
     return {}
 
 
-@router.get("/login/check-token", dependencies=[Depends(get_current_active_user)])
+@router.get("/login/check-token", dependencies=[Depends(get_current_active_claims)])
 def check_access_token_validity() -> Any:
     return {}
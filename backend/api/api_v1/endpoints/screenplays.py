@@ -1,40 +1,115 @@
-from typing import List, Any
+import os
+from typing import List, Any, Optional
+from xml.etree.ElementTree import ParseError
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile, WebSocket
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from starlette import status
+from starlette.requests import Request
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+from starlette.websockets import WebSocketDisconnect
 
 import crud
 import schemas
-from api import deps
+from api import caching, collaboration, conditional, deps
+from api.encoding import encode_element, encode_screenplay, encode_screenplays
+from api.pagination import next_cursor_headers, set_next_cursor
+from core import cache, formats, layout
+from core.config import settings
+from core.middleware import APIResponse
+from core.query_budget import QueryBudget
+from crud.base import AnySession
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[schemas.Screenplay])
 def get_screenplay_list(
+        db: Session = Depends(deps.get_read_db),
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
+) -> Any:
+    """
+    Get screenplay list, most recently edited first.
+    Pass the `X-Next-Cursor` response header as `cursor` to get the next page.
+    Allow only if user is owner or superuser.
+    """
+    options = [crud.screenplay.elements_loader("selectin")]
+    if crud.user.is_superuser(current_user):
+        screenplays = crud.screenplay.get_multi(db, skip=skip, limit=limit, cursor=cursor, options=options)
+    else:
+        screenplays = crud.screenplay.get_multi_by_owner(
+            db=db, owner_id=current_user.id, skip=skip, limit=limit, cursor=cursor, options=options)
+    return APIResponse(
+        encode_screenplays(screenplays), headers=next_cursor_headers(crud.screenplay, screenplays, limit))
+
+
+@router.get("/summary", response_model=List[schemas.ScreenplaySummary])
+def get_screenplay_summary_list(
+        response: Response,
         db: Session = Depends(deps.get_db),
         skip: int = 0,
         limit: int = 100,
-        current_user: schemas.User = Depends(deps.get_current_active_user),
+        cursor: Optional[str] = None,
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
 ) -> Any:
     """
-    Get screenplay list.
+    Get screenplay list without elements.
     Allow only if user is owner or superuser.
     """
+    options = [crud.screenplay.elements_loader("none")]
     if crud.user.is_superuser(current_user):
-        screenplays = crud.screenplay.get_multi(db, skip=skip, limit=limit)
+        screenplays = crud.screenplay.get_multi(db, skip=skip, limit=limit, cursor=cursor, options=options)
     else:
-        screenplays = crud.screenplay.get_multi_by_owner(db=db, owner_id=current_user.id, skip=skip, limit=limit)
+        screenplays = crud.screenplay.get_multi_by_owner(
+            db=db, owner_id=current_user.id, skip=skip, limit=limit, cursor=cursor, options=options)
+    set_next_cursor(response, crud.screenplay, screenplays, limit)
     return screenplays
 
 
+@router.get("/search", response_model=List[schemas.SearchHit])
+def search_screenplays(
+        *,
+        db: Session = Depends(deps.get_db),
+        q: str = Query(..., min_length=1, max_length=256),
+        mode: schemas.SearchMode = schemas.SearchMode.WORDS,
+        content_type: Optional[schemas.ContentType] = None,
+        owner_id: Optional[int] = None,
+        is_public: Optional[bool] = None,
+        skip: int = 0,
+        limit: int = Query(20, le=100),
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
+) -> Any:
+    """
+    Search screenplay elements, best match first.
+    `q` takes web search syntax: quoted phrases, `or` and `-` to exclude a word.
+    Searches the user's own and public screenplays, or all screenplays for a superuser.
+    """
+    if mode == schemas.SearchMode.SUBSTRING and not settings.SEARCH_TRIGRAM_ENABLED:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Substring search is not enabled")
+    return crud.editor_element.search(
+        db=db,
+        query=q,
+        mode=mode,
+        viewer_id=None if crud.user.is_superuser(current_user) else current_user.id,
+        content_type=content_type,
+        owner_id=owner_id,
+        is_public=is_public,
+        skip=skip,
+        limit=limit,
+    )
+
+
 @router.post("/", response_model=schemas.Screenplay)
 async def create_screenplay(
         *,
-        db: Session = Depends(deps.get_db),
+        db: AnySession = Depends(deps.get_async_db),
         screenplay_in: schemas.ScreenplayCreate,
-        current_user: schemas.User = Depends(deps.get_current_active_user),
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
 ) -> Any:
     """
     Create new screenplay.
@@ -47,89 +122,514 @@ async def create_screenplay(
         "owner_id": current_user.id,
         "elements": screenplay_in.elements
     }
-    return await crud.screenplay.create(db=db, obj_in=data)
+    screenplay = await crud.screenplay.acreate(db=db, obj_in=data)
+    return APIResponse(encode_screenplay(screenplay))
 
 
-@router.get("/{screenplay_id}", response_model=schemas.Screenplay)
-def get_screenplay(
+@router.post("/import", response_model=schemas.ScreenplaySummary)
+def import_screenplay(
         *,
         db: Session = Depends(deps.get_db),
+        file: UploadFile = File(...),
+        name: Optional[str] = Form(None),
+        description: Optional[str] = Form(None),
+        is_public: bool = Form(False),
+        import_format: Optional[schemas.ScreenplayImportFormat] = Form(None, alias="format"),
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
+) -> Any:
+    """
+    Create new screenplay from a Fountain or Final Draft (fdx) file.
+    The format is taken from the file extension unless given. The file is parsed while elements are
+    written in batches, so the upload is never held in memory as a whole.
+    Any registered user can import a screenplay.
+    """
+    stem, extension = os.path.splitext(file.filename or "")
+    if import_format is None:
+        if extension.lstrip(".").lower() not in formats.IMPORT_EXTENSIONS:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Unknown file format")
+        import_format = formats.IMPORT_EXTENSIONS[extension.lstrip(".").lower()]
+    else:
+        import_format = import_format.value
+    try:
+        title, elements = formats.IMPORTERS[import_format](file.file)
+        data = {
+            "name": name or title or stem or "Untitled",
+            "description": description,
+            "is_public": is_public,
+            "owner_id": current_user.id,
+        }
+        return crud.screenplay.create_from_elements(db=db, obj_in=data, elements=elements)
+    except (ParseError, UnicodeDecodeError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="File could not be parsed")
+
+
+@router.get("/{screenplay_id}", response_model=schemas.Screenplay)
+async def get_screenplay(
+        *,
+        request: Request,
+        db: AnySession = Depends(deps.get_async_read_db),
         screenplay_id: int,
-        current_user: schemas.User = Depends(deps.get_current_active_user),
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
 ) -> Any:
     """
     Get screenplay by ID.
+    Answers 304 to `If-None-Match`/`If-Modified-Since` when unchanged, without loading the elements.
     Allow only if user is owner or superuser.
     """
-    screenplay = crud.screenplay.get(db=db, id=screenplay_id)
+    conditional_get = conditional.is_conditional(request)
+    if conditional_get:
+        screenplay = await crud.screenplay.aget_validators(db=db, id=screenplay_id)
+    else:
+        screenplay = await crud.screenplay.aget(
+            db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("joined")])
     if not screenplay:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Project not found")
-    if not crud.user.is_superuser(current_user) or screenplay.owner_id != current_user.id:
+    if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Not enough permissions")
-    return screenplay
+    if conditional_get:
+        if conditional.is_not_modified(request, screenplay):
+            return conditional.not_modified(screenplay)
+        screenplay = await crud.screenplay.aget(
+            db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("joined")])
+    return APIResponse(encode_screenplay(screenplay), headers=conditional.validator_headers(screenplay))
+
+
+@router.get("/{screenplay_id}/meta", response_model=schemas.ScreenplayMeta)
+def get_screenplay_meta(
+        *,
+        request: Request,
+        db: Session = Depends(deps.get_db),
+        screenplay_id: int,
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
+) -> Any:
+    """
+    Get screenplay by ID without its elements, with the number of elements and scenes.
+    Fetch the elements in windows from `/{screenplay_id}/elements`.
+    Answers 304 to `If-None-Match`/`If-Modified-Since` when unchanged.
+    Allow only if user is owner or superuser.
+    """
+    screenplay = crud.screenplay.get(db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("none")])
+    if not screenplay or screenplay.deleted_at:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Project not found")
+    if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Not enough permissions")
+    if conditional.is_not_modified(request, screenplay):
+        return conditional.not_modified(screenplay)
+    meta = schemas.ScreenplayMeta(
+        **schemas.ScreenplaySummary.from_orm(screenplay).dict(),
+        element_count=crud.editor_element.count_by_screenplay(db=db, screenplay_id=screenplay_id),
+        scene_count=crud.scene.count_by_screenplay(db=db, screenplay_id=screenplay_id),
+    )
+    return APIResponse(meta.dict(), headers=conditional.validator_headers(screenplay))
+
+
+@router.get("/{screenplay_id}/elements", response_model=List[schemas.EditorElement])
+def get_screenplay_elements(
+        *,
+        request: Request,
+        db: Session = Depends(deps.get_db),
+        screenplay_id: int,
+        from_position: Optional[int] = None,
+        scene_id: Optional[int] = None,
+        limit: int = Query(500, ge=1, le=5000),
+        cursor: Optional[str] = None,
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
+) -> Any:
+    """
+    Get a window of elements in position order, starting at `from_position`, limited to a scene of the
+    scene index with `scene_id`.
+    Pass the `X-Next-Cursor` response header as `cursor` to get the next window.
+    The ETag is the screenplay's: answers 304 to `If-None-Match`/`If-Modified-Since` when it is unchanged.
+    Allow only if user is owner or superuser.
+    """
+    screenplay = crud.screenplay.get(db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("none")])
+    if not screenplay or screenplay.deleted_at:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Project not found")
+    if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Not enough permissions")
+    if conditional.is_not_modified(request, screenplay):
+        return conditional.not_modified(screenplay)
+    to_position = None
+    if scene_id is not None:
+        scene = crud.scene.get_by_screenplay(db=db, screenplay_id=screenplay_id, id=scene_id)
+        if not scene:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Scene not found")
+        from_position = scene.start_position if from_position is None else max(scene.start_position, from_position)
+        to_position = scene.end_position
+    elements = crud.editor_element.get_window(
+        db=db, screenplay_id=screenplay_id, from_position=from_position, to_position=to_position,
+        limit=limit, cursor=cursor)
+    headers = conditional.validator_headers(screenplay)
+    headers.update(next_cursor_headers(crud.editor_element, elements, limit))
+    return APIResponse([encode_element(element) for element in elements], headers=headers)
 
 
 @router.put("/{screenplay_id}", response_model=schemas.Screenplay)
 def update_screenplay(
         *,
+        request: Request,
         db: Session = Depends(deps.get_db),
         screenplay_id: int,
         screenplay_in: schemas.ScreenplayUpdate,
-        current_user: schemas.User = Depends(deps.get_current_active_user),
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
 ) -> Any:
     """
     Update screenplay.
+    With `If-Match`, fails with 412 unless the screenplay still has that ETag.
     Allow only if user is owner or superuser.
     """
-    screenplay = crud.screenplay.get(db=db, id=screenplay_id)
+    if conditional.has_if_match(request):
+        screenplay = crud.screenplay.get_for_update(db=db, id=screenplay_id)
+    else:
+        screenplay = crud.screenplay.get(db=db, id=screenplay_id)
     if not screenplay:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Project not found")
-    if not crud.user.is_superuser(current_user) or screenplay.owner_id != current_user.id:
+    if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Not enough permissions")
+    conditional.check_if_match(request, screenplay)
+    screenplay = crud.screenplay.update(db=db, db_obj=screenplay, obj_in=screenplay_in)
+    return APIResponse(encode_screenplay(screenplay), headers=conditional.validator_headers(screenplay))
+
+
+# one patch respaces the screenplay at most once, which rebuilds the scene index on top of the usual queries
+@router.patch("/{screenplay_id}/elements",
+              response_model=schemas.EditorElementPatchResult, dependencies=[Depends(QueryBudget(30))])
+def patch_screenplay_elements(
+        *,
+        request: Request,
+        response: Response,
+        db: Session = Depends(deps.get_db),
+        screenplay_id: int,
+        patch_in: schemas.EditorElementPatch,
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
+) -> Any:
+    """
+    Apply element-level insert/update/delete/move operations in one transaction.
+    Only the changed elements are returned.
+    With `If-Match`, fails with 412 unless the screenplay still has that ETag.
+    Allow only if user is owner or superuser.
+    """
+    # lock the screenplay so that concurrent patches, and the collaboration writer, place elements one after another
+    screenplay = crud.screenplay.get_for_update(db=db, id=screenplay_id)
+    if not screenplay or screenplay.deleted_at:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Project not found")
+    if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Not enough permissions")
-    return crud.screenplay.update(db=db, db_obj=screenplay, obj_in=screenplay_in)
+    conditional.check_if_match(request, screenplay)
+    try:
+        result = crud.editor_element.apply_operations(
+            db=db, screenplay_id=screenplay_id, operations=patch_in.operations)
+    except crud.ElementOperationError as e:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail=str(e))
+    conditional.set_validators(response, crud.screenplay.get_validators(db=db, id=screenplay_id))
+    return result
+
+
+@router.websocket("/{screenplay_id}/collaborate")
+async def collaborate_on_screenplay(websocket: WebSocket, screenplay_id: int, token: str) -> None:
+    """
+    Edit a screenplay together with other editors. Browsers cannot set headers on a WebSocket,
+    so the access token is passed as the `token` query parameter.
+    Clients send `{"ref": ..., "operations": [...]}` with the operations of `PATCH /{screenplay_id}/elements`.
+    Every change applied to the screenplay is sent to all editors in order as `{"type": "applied", "version": ...,
+    "elements": [...], "deleted": [...], "acks": [...]}`; the ack with the client's `client_id` and `ref` maps its
+    temporary ids. Rejected operations are answered with `{"type": "error", "ref": ..., "detail": ...}`.
+    Binary frames close the connection with 1003, and it is closed with 1008 once the token is revoked,
+    e.g. when the user is deactivated.
+    Allow only if user is owner or superuser.
+    """
+    authorized = await run_in_threadpool(collaboration.authorize, token, screenplay_id)
+    if not authorized:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    screenplay, current_user = authorized
+
+    await websocket.accept()
+    room, client_id = await collaboration.rooms.join(screenplay_id, websocket)
+    try:
+        await websocket.send_json({"type": "hello", "client_id": client_id, "version": screenplay.version})
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", status.WS_1000_NORMAL_CLOSURE))
+            if frame.get("text") is None:
+                await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+                break
+            try:
+                message = schemas.CollaborationMessage.parse_raw(frame["text"])
+            except ValidationError as e:
+                await websocket.send_json({"type": "error", "ref": None, "detail": e.errors()})
+                continue
+            if await collaboration.token_revoked(current_user):
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                break
+            room.submit(client_id, current_user.id, message.ref, message.operations)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await collaboration.rooms.leave(room, client_id)
+
+
+@router.get("/{screenplay_id}/export", response_class=StreamingResponse)
+def export_screenplay(
+        *,
+        db: Session = Depends(deps.get_db),
+        screenplay_id: int,
+        export_format: schemas.ScreenplayFormat = Query(schemas.ScreenplayFormat.FOUNTAIN, alias="format"),
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
+) -> Any:
+    """
+    Export screenplay as Fountain, Final Draft (fdx) or plain text.
+    The document is streamed while elements are read, so memory use does not grow with the screenplay.
+    Allow only if user is owner or superuser.
+    """
+    screenplay = crud.screenplay.get(db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("none")])
+    if not screenplay or screenplay.deleted_at:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Project not found")
+    if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Not enough permissions")
+    rows = crud.editor_element.iter_content(db=db, screenplay_id=screenplay_id)
+    document = formats.EXPORTERS[export_format.value](screenplay.name, rows)
+    filename = f"screenplay-{screenplay_id}.{formats.EXTENSIONS[export_format.value]}"
+    return StreamingResponse(
+        formats.encode_chunks(document),
+        media_type=formats.MEDIA_TYPES[export_format.value],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/{screenplay_id}/scenes", response_model=List[schemas.Scene])
+def get_screenplay_scenes(
+        *,
+        db: Session = Depends(deps.get_db),
+        screenplay_id: int,
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
+) -> Any:
+    """
+    Get the scene index of a screenplay: heading, position range, element and word count and characters of every
+    scene, in order. Elements before the first heading are returned as a scene without heading.
+    Allow only if user is owner or superuser.
+    """
+    screenplay = crud.screenplay.get(db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("none")])
+    if not screenplay or screenplay.deleted_at:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Project not found")
+    if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Not enough permissions")
+    return crud.scene.get_multi_by_screenplay(db=db, screenplay_id=screenplay_id)
+
+
+@router.get("/{screenplay_id}/characters", response_model=List[schemas.CharacterStat])
+def get_screenplay_characters(
+        *,
+        db: Session = Depends(deps.get_db),
+        screenplay_id: int,
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
+) -> Any:
+    """
+    Get dialogue lines, dialogue words and scene appearances of every character, most lines first.
+    Allow only if user is owner or superuser.
+    """
+    screenplay = crud.screenplay.get(db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("none")])
+    if not screenplay or screenplay.deleted_at:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Project not found")
+    if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Not enough permissions")
+    return crud.character_stat.get_multi_by_screenplay(db=db, screenplay_id=screenplay_id)
+
+
+@router.get("/{screenplay_id}/revisions", response_model=List[schemas.ScreenplayRevision])
+def get_screenplay_revisions(
+        *,
+        db: Session = Depends(deps.get_db),
+        screenplay_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
+) -> Any:
+    """
+    Get the revision history of a screenplay, newest first: one revision per saved change.
+    Pass the `X-Next-Cursor` response header as `cursor` to get the next page.
+    Allow only if user is owner or superuser.
+    """
+    screenplay = crud.screenplay.get(db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("none")])
+    if not screenplay or screenplay.deleted_at:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Project not found")
+    if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Not enough permissions")
+    revisions = crud.revision.get_multi_by_screenplay(
+        db=db, screenplay_id=screenplay_id, skip=skip, limit=limit, cursor=cursor)
+    return APIResponse(
+        [schemas.ScreenplayRevision.from_orm(revision).dict() for revision in revisions],
+        headers=next_cursor_headers(crud.revision, revisions, limit))
+
+
+@router.get("/{screenplay_id}/revisions/{version}", response_model=schemas.ScreenplayAtRevision)
+def get_screenplay_revision(
+        *,
+        db: Session = Depends(deps.get_db),
+        screenplay_id: int,
+        version: int,
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
+) -> Any:
+    """
+    Get a screenplay as it was at a revision. Revisions do not change, so clients may cache them.
+    Allow only if user is owner or superuser.
+    """
+    screenplay = crud.screenplay.get(db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("none")])
+    if not screenplay or screenplay.deleted_at:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Project not found")
+    if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Not enough permissions")
+    document = crud.revision.reconstruct(db=db, screenplay_id=screenplay_id, version=version)
+    if document is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Revision not found")
+    revision = {
+        "id": screenplay_id,
+        "version": version,
+        "name": document["name"],
+        "description": document["description"],
+        "elements": [
+            {"id": _id, "content": content, "content_type": content_type}
+            for _id, content_type, content in document["elements"]
+        ],
+    }
+    return APIResponse(revision, headers={"Cache-Control": "private, max-age=86400, immutable"})
+
+
+@router.get("/{screenplay_id}/pages", response_model=schemas.ScreenplayPages)
+def get_screenplay_pages(
+        *,
+        db: Session = Depends(deps.get_db),
+        screenplay_id: int,
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
+) -> Any:
+    """
+    Get page count and the element starting each page after the first, on standard screenplay pages.
+    Only scenes edited since they were last paginated are laid out again.
+    Allow only if user is owner or superuser.
+    """
+    screenplay = crud.screenplay.get(db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("none")])
+    if not screenplay or screenplay.deleted_at:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Project not found")
+    if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Not enough permissions")
+    rows = [layout.ElementRow(*row) for row in crud.editor_element.get_layout_rows(db=db, screenplay_id=screenplay_id)]
+    pagination = layout.paginate(rows, lambda ids: crud.editor_element.get_contents(db=db, ids=ids))
+    return schemas.ScreenplayPages(
+        page_count=pagination.page_count,
+        breaks=[schemas.PageBreak(**page_break._asdict()) for page_break in pagination.breaks],
+    )
 
 
 @router.delete("/{screenplay_id}", response_model=schemas.ScreenplayDelete)
 def delete_screenplay(
         *,
+        request: Request,
         db: Session = Depends(deps.get_db),
         screenplay_id: int,
-        current_user: schemas.User = Depends(deps.get_current_active_user),
+        current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
 ) -> Any:
     """
     Delete screenplay
+    With `If-Match`, fails with 412 unless the screenplay still has that ETag.
     Allow only if user is owner or superuser.
     """
-    screenplay = crud.screenplay.get(db=db, id=screenplay_id)
+    if conditional.has_if_match(request):
+        screenplay = crud.screenplay.get_for_update(db=db, id=screenplay_id)
+    else:
+        screenplay = crud.screenplay.get(db=db, id=screenplay_id)
     if not screenplay:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Project not found")
-    if not crud.user.is_superuser(current_user) or screenplay.owner_id != current_user.id:
+    if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Not enough permissions")
+    conditional.check_if_match(request, screenplay)
     return crud.screenplay.remove(db=db, id=screenplay_id)
 
 
+@router.get("/public/summary", response_model=List[schemas.ScreenplaySummary])
+def get_public_screenplay_summary_list(
+        *,
+        db: Session = Depends(deps.get_public_db),
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+) -> Any:
+    """
+    Get all public screenplays without elements
+    Pages are served from the cache until a public screenplay changes.
+    """
+    key = cache.public_list_key(cache.public_list_generation(), "summary", skip, limit, cursor)
+    entry = cache.lookup(key)
+    if entry is not None:
+        return caching.json_response(*caching.unpack(entry))
+    screenplays = crud.screenplay.get_multi_public(
+        db=db, skip=skip, limit=limit, cursor=cursor, options=[crud.screenplay.elements_loader("none")])
+    headers = next_cursor_headers(crud.screenplay, screenplays, limit)
+    body = caching.render([schemas.ScreenplaySummary.from_orm(screenplay).dict() for screenplay in screenplays])
+    cache.store(key, caching.pack(headers, body))
+    return caching.json_response(headers, body)
+
+
 @router.get("/public/{screenplay_id}", response_model=schemas.Screenplay)
-def get_public_screenplay(
+async def get_public_screenplay(
         *,
-        db: Session = Depends(deps.get_db),
+        request: Request,
+        db: AnySession = Depends(deps.get_async_public_db),
         screenplay_id: int,
 ) -> Any:
     """
     Get public screenplay by ID
+    Served from the cache until the screenplay changes.
+    Answers 304 to `If-None-Match`/`If-Modified-Since` when unchanged, without loading the elements.
     """
-    screenplay = crud.screenplay.get(db=db, id=screenplay_id)
+    key = cache.public_screenplay_key(screenplay_id)
+    entry = await cache.alookup(key)
+    if entry is not None:
+        cached = caching.unpack(entry)
+        if conditional.headers_not_modified(request, cached.headers):
+            return conditional.not_modified_response(cached.headers)
+        return caching.json_response(*cached)
+
+    conditional_get = conditional.is_conditional(request)
+    if conditional_get:
+        screenplay = await crud.screenplay.aget_validators(db=db, id=screenplay_id)
+    else:
+        screenplay = await crud.screenplay.aget(
+            db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("joined")])
     if not screenplay or not screenplay.is_public:
         raise HTTPException(status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
-    return screenplay
+    if conditional_get:
+        if conditional.is_not_modified(request, screenplay):
+            return conditional.not_modified(screenplay)
+        screenplay = await crud.screenplay.aget(
+            db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("joined")])
+    headers = conditional.validator_headers(screenplay)
+    body = caching.render(encode_screenplay(screenplay))
+    await cache.astore(key, caching.pack(headers, body))
+    return caching.json_response(headers, body)
 
 
 @router.get("/public/", response_model=List[schemas.Screenplay])
 def get_public_screenplay(
         *,
-        db: Session = Depends(deps.get_db)
+        db: Session = Depends(deps.get_public_db),
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
 ) -> Any:
     """
-    Get all public screenplays
+    Get all public screenplays, most recently edited first.
+    Pass the `X-Next-Cursor` response header as `cursor` to get the next page.
+    Pages are served from the cache until a public screenplay changes.
     """
-    screenplay = crud.screenplay.get_multi_public(db=db)
-    return screenplay
+    key = cache.public_list_key(cache.public_list_generation(), "full", skip, limit, cursor)
+    entry = cache.lookup(key)
+    if entry is not None:
+        return caching.json_response(*caching.unpack(entry))
+    screenplay = crud.screenplay.get_multi_public(
+        db=db, skip=skip, limit=limit, cursor=cursor, options=[crud.screenplay.elements_loader("selectin")])
+    headers = next_cursor_headers(crud.screenplay, screenplay, limit)
+    body = caching.render(encode_screenplays(screenplay))
+    cache.store(key, caching.pack(headers, body))
+    return caching.json_response(headers, body)
@@ -1,31 +1,38 @@
-from typing import List, Any
+from typing import List, Any, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Body
 from fastapi.encoders import jsonable_encoder
 from pydantic import EmailStr
 from sqlalchemy.orm import Session
 from starlette import status
+from starlette.responses import Response
 
 import crud
 import models
 import schemas
 from api import deps
+from api.pagination import set_next_cursor
 from core.config import settings
 from core.email import send_new_account_email
+from crud.base import AnySession
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[schemas.User], dependencies=[Depends(deps.get_current_active_superuser)])
 def read_users(
-    db: Session = Depends(deps.get_db),
+    response: Response,
+    db: Session = Depends(deps.get_read_db),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
 ) -> Any:
     """
-    Retrieve users.
+    Retrieve users ordered by id.
+    Pass the `X-Next-Cursor` response header as `cursor` to get the next page.
     """
-    users = crud.user.get_multi(db, skip=skip, limit=limit)
+    users = crud.user.get_multi(db, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(response, crud.user, users, limit)
     return users
 
 
@@ -90,9 +97,9 @@ def read_user_me(
 
 
 @router.post("/create", response_model=schemas.User)
-def create_user_open(
+async def create_user_open(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AnySession = Depends(deps.get_async_db),
     password: str = Body(...),
     email: EmailStr = Body(...),
     first_name: str = Body(None),
@@ -106,21 +113,21 @@ def create_user_open(
             status.HTTP_403_FORBIDDEN,
             detail="Open user registration is forbidden on this server",
         )
-    user = crud.user.get_by_email(db, email=email)
+    user = await crud.user.aget_by_email(db, email=email)
     if user:
         raise HTTPException(
             status.HTTP_400_BAD_REQUEST,
             detail="The user with this username already exists in the system",
         )
     user_in = schemas.UserCreate(password=password, email=email, first_name=first_name, last_name=last_name)
-    user = crud.user.create(db, obj_in=user_in)
+    user = await crud.user.acreate(db, obj_in=user_in)
     return user
 
 
 @router.get("/{user_id}", response_model=schemas.User)
 def read_user_by_id(
     user_id: int,
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: schemas.UserClaims = Depends(deps.get_current_active_claims),
     db: Session = Depends(deps.get_db),
 ) -> Any:
     """
@@ -132,7 +139,7 @@ def read_user_by_id(
             status.HTTP_404_NOT_FOUND,
             detail="The user with this username does not exist in the system",
         )
-    if user == current_user:
+    if user.id == current_user.id:
         return user
     if not crud.user.is_superuser(current_user):
         raise HTTPException(
@@ -0,0 +1,36 @@
+from typing import Any, Dict, NamedTuple
+
+import orjson
+from starlette.responses import Response
+
+from core import middleware
+
+
+class CachedResponse(NamedTuple):
+    headers: Dict[str, str]
+    body: bytes
+
+
+def render(content: Any) -> bytes:
+    """
+    JSON body of `content`, made of dicts, lists and values orjson encodes such as datetimes and enums.
+    """
+    return middleware.encode_json(content)
+
+
+def pack(headers: Dict[str, str], body: bytes) -> bytes:
+    return orjson.dumps(headers) + b"\n" + body
+
+
+def unpack(value: bytes) -> CachedResponse:
+    headers, _, body = value.partition(b"\n")
+    return CachedResponse(orjson.loads(headers), body)
+
+
+def json_response(headers: Dict[str, str], body: bytes) -> Response:
+    """
+    Response with a cached JSON body, in MessagePack if the client asked for it.
+    """
+    if middleware.msgpack_requested():
+        return Response(middleware.transcode(body), media_type=middleware.MSGPACK_MEDIA_TYPE, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,291 @@
+import asyncio
+import itertools
+import logging
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocket
+
+import crud
+import models
+import schemas
+from api import deps
+from core import middleware, pubsub
+from core.config import settings
+from core.security import token_versions
+from database.session import SessionLocal, replicas
+
+logger = logging.getLogger(__name__)
+
+# deleted elements remembered per room to rebase operations that still refer to them
+MAX_TOMBSTONES = 10000
+
+
+class Submission(NamedTuple):
+    client_id: str
+    user_id: int
+    ref: Optional[str]
+    operations: List[schemas.EditorElementOperation]
+
+
+def authorize(token: str, screenplay_id: int) -> Optional[Tuple[models.Screenplay, schemas.UserClaims]]:
+    """
+    The screenplay and the claims of the token, if the access token is valid and its user may edit it.
+    """
+    db = SessionLocal()
+    try:
+        try:
+            current_user = deps.get_claims_from_access_token(db, token)
+        except HTTPException:
+            return None
+        screenplay = crud.screenplay.get(db=db, id=screenplay_id, options=[crud.screenplay.elements_loader("none")])
+        if not screenplay or screenplay.deleted_at or not crud.user.is_active(current_user):
+            return None
+        if not crud.user.is_superuser(current_user) and screenplay.owner_id != current_user.id:
+            return None
+        return screenplay, current_user
+    finally:
+        db.close()
+
+
+def _load_token_version(user_id: int) -> Optional[int]:
+    db = SessionLocal()
+    try:
+        return deps.current_token_version(db, user_id)
+    finally:
+        db.close()
+
+
+async def token_revoked(claims: schemas.UserClaims) -> bool:
+    """
+    Whether the token an editor connected with was revoked since, e.g. because the user was deactivated.
+    Only reads the database when the version is not cached in `token_versions`.
+    """
+    version = token_versions.get(claims.id)
+    if version is None:
+        version = await run_in_threadpool(_load_token_version, claims.id)
+    return version != claims.token_version
+
+
+def channel(screenplay_id: int) -> str:
+    return f"screenplay:{screenplay_id}:elements"
+
+
+def rebase(
+        operations: List[schemas.EditorElementOperation], tombstones: Dict[int, Optional[int]]
+) -> List[schemas.EditorElementOperation]:
+    """
+    Transform operations against elements that were deleted concurrently: an insert or move anchored on a
+    deleted element is anchored on its nearest surviving predecessor, updates, moves and deletes of a
+    deleted element are dropped.
+    """
+    rebased = []
+    for operation in operations:
+        if operation.op != schemas.ElementOperationType.INSERT and operation.id in tombstones:
+            continue
+        after_id = operation.after_id
+        # predecessors were alive when an element was deleted, so the chain ends
+        while after_id in tombstones:
+            after_id = tombstones[after_id]
+        rebased.append(operation.copy(update={"after_id": after_id}) if after_id != operation.after_id else operation)
+    return rebased
+
+
+def namespace(
+        operations: List[schemas.EditorElementOperation], temporary_ids: Dict[int, int], counter: Any
+) -> List[schemas.EditorElementOperation]:
+    """
+    Give the temporary (negative) ids of one client's operations ids that are unique in the batch,
+    so that operations of several clients can be applied together. `temporary_ids` maps the client's ids to them.
+    """
+    namespaced = []
+    for operation in operations:
+        update = {}
+        for field in ("id", "after_id"):
+            value = getattr(operation, field)
+            if value is not None and value < 0:
+                if value not in temporary_ids:
+                    temporary_ids[value] = next(counter)
+                update[field] = temporary_ids[value]
+        namespaced.append(operation.copy(update=update) if update else operation)
+    return namespaced
+
+
+class Room:
+    """
+    Editors connected to one screenplay on this process.
+    Operations are queued and persisted by a single writer task, which applies everything that arrived while
+    the previous transaction ran in one transaction (group commit), then publishes the result. Every process
+    with editors of the screenplay subscribes to its channel and forwards results to its sockets, so all
+    editors see changes in the same order.
+    """
+
+    def __init__(self, screenplay_id: int) -> None:
+        self.screenplay_id = screenplay_id
+        self.clients: Dict[str, WebSocket] = {}
+        self.tombstones: "OrderedDict[int, Optional[int]]" = OrderedDict()
+        self._queue: "asyncio.Queue[Submission]" = asyncio.Queue()
+        self._writer: Optional[asyncio.Task] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._subscription: Optional[pubsub.Subscription] = None
+
+    async def start(self) -> None:
+        self._subscription = await pubsub.subscribe(channel(self.screenplay_id))
+        self._listener = asyncio.create_task(self._listen())
+        self._writer = asyncio.create_task(self._write())
+
+    async def stop(self) -> None:
+        # persist what was submitted before the last editor left
+        await self._queue.join()
+        self._writer.cancel()
+        await self._subscription.close()
+        await asyncio.gather(self._writer, self._listener, return_exceptions=True)
+
+    def submit(
+            self, client_id: str, user_id: int, ref: Optional[str], operations: List[schemas.EditorElementOperation]
+    ) -> None:
+        self._queue.put_nowait(Submission(client_id, user_id, ref, operations))
+
+    def remember_deleted(self, tombstones: Dict[int, Optional[int]]) -> None:
+        self.tombstones.update(tombstones)
+        while len(self.tombstones) > MAX_TOMBSTONES:
+            self.tombstones.popitem(last=False)
+
+    async def send(self, client_id: str, message: Dict[str, Any]) -> None:
+        websocket = self.clients.get(client_id)
+        if websocket is not None:
+            await websocket.send_text(middleware.encode_json(message).decode())
+
+    async def _listen(self) -> None:
+        async for message in self._subscription:
+            applied = orjson.loads(message)
+            self.remember_deleted({int(_id): predecessor for _id, predecessor in applied["tombstones"].items()})
+            text = message.decode()
+            results = await asyncio.gather(
+                *[websocket.send_text(text) for websocket in list(self.clients.values())], return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.debug("Could not forward operations: %s", result)
+        if self._subscription.overflowed:
+            # editors missed changes and have to reload the screenplay
+            for websocket in list(self.clients.values()):
+                await websocket.close(code=1013)
+
+    async def _write(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            operation_count = len(batch[0].operations)
+            while not self._queue.empty() and operation_count < settings.COLLABORATION_MAX_BATCH_OPERATIONS:
+                batch.append(self._queue.get_nowait())
+                operation_count += len(batch[-1].operations)
+            try:
+                messages, errors = await run_in_threadpool(self._persist, batch)
+                if messages and replicas is not None:
+                    # the editors read their own changes from the primary while the replicas catch up
+                    rejected = {id(submission) for submission, _ in errors}
+                    replicas.note_writers({
+                        submission.user_id for submission in batch if id(submission) not in rejected})
+                for message in messages:
+                    await pubsub.publish(channel(self.screenplay_id), middleware.encode_json(message))
+                for submission, detail in errors:
+                    await self.send(submission.client_id, {"type": "error", "ref": submission.ref, "detail": detail})
+            except Exception:
+                logger.exception("Could not apply operations to screenplay %d", self.screenplay_id)
+                for submission in batch:
+                    await self.send(
+                        submission.client_id,
+                        {"type": "error", "ref": submission.ref, "detail": "Operations could not be saved"})
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _persist(self, batch: List[Submission]) -> Tuple[List[Dict[str, Any]], List[Tuple[Submission, str]]]:
+        """
+        Apply a batch of submissions in one transaction, or one by one if some of them fail, so that only
+        the failing ones are rejected. Returns the messages to publish and the rejected submissions with the reason.
+        """
+        db = SessionLocal()
+        try:
+            try:
+                return [self._apply(db, batch)], []
+            except crud.ElementOperationError as e:
+                if len(batch) == 1:
+                    return [], [(batch[0], str(e))]
+            messages, errors = [], []
+            for submission in batch:
+                try:
+                    messages.append(self._apply(db, [submission]))
+                except crud.ElementOperationError as e:
+                    errors.append((submission, str(e)))
+            return messages, errors
+        finally:
+            db.close()
+
+    def _apply(self, db: Any, batch: List[Submission]) -> Dict[str, Any]:
+        # lock the screenplay so that writers on other processes apply their batches one after another
+        screenplay = crud.screenplay.get_for_update(db=db, id=self.screenplay_id)
+        if not screenplay or screenplay.deleted_at:
+            db.rollback()
+            raise crud.ElementOperationError("Project not found")
+
+        counter = itertools.count(-1, -1)
+        operations: List[schemas.EditorElementOperation] = []
+        temporary_ids: List[Dict[int, int]] = []
+        for submission in batch:
+            temporary_ids.append({})
+            operations += namespace(rebase(submission.operations, self.tombstones), temporary_ids[-1], counter)
+
+        deleted_ids = [
+            operation.id for operation in operations
+            if operation.op == schemas.ElementOperationType.DELETE and operation.id > 0
+        ]
+        tombstones = crud.editor_element.get_predecessor_ids(
+            db=db, screenplay_id=self.screenplay_id, ids=deleted_ids) if deleted_ids else {}
+        result = crud.editor_element.apply_operations(db=db, screenplay_id=self.screenplay_id, operations=operations)
+        self.remember_deleted(tombstones)
+        return {
+            "type": "applied",
+            "version": result.version,
+            "elements": [element.dict() for element in result.elements],
+            "deleted": result.deleted,
+            "tombstones": tombstones,
+            "acks": [
+                {
+                    "client_id": submission.client_id,
+                    "ref": submission.ref,
+                    "ids": {
+                        temporary_id: result.ids[batch_id]
+                        for temporary_id, batch_id in ids.items() if batch_id in result.ids
+                    },
+                }
+                for submission, ids in zip(batch, temporary_ids)
+            ],
+        }
+
+
+class Rooms:
+
+    def __init__(self) -> None:
+        self._rooms: Dict[int, Room] = {}
+
+    async def join(self, screenplay_id: int, websocket: WebSocket) -> Tuple[Room, str]:
+        room = self._rooms.get(screenplay_id)
+        if room is None:
+            room = self._rooms[screenplay_id] = Room(screenplay_id)
+            await room.start()
+        client_id = uuid.uuid4().hex
+        room.clients[client_id] = websocket
+        return room, client_id
+
+    async def leave(self, room: Room, client_id: str) -> None:
+        room.clients.pop(client_id, None)
+        if not room.clients and self._rooms.get(room.screenplay_id) is room:
+            del self._rooms[room.screenplay_id]
+            await room.stop()
+
+
+rooms = Rooms()
@@ -0,0 +1,89 @@
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, List
+
+from fastapi import HTTPException
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+def make_etag(obj: Any) -> str:
+    """
+    Strong ETag of a screenplay, changing with its content version and modification time.
+    `obj` may be the model or a row with `id`, `version` and `updated_at`.
+    """
+    updated_at = obj.updated_at.isoformat() if obj.updated_at else ""
+    return '"%s"' % hashlib.blake2b(f"{obj.id}:{obj.version}:{updated_at}".encode(), digest_size=12).hexdigest()
+
+
+def _etags(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def validator_headers(obj: Any) -> Dict[str, str]:
+    """
+    ETag and Last-Modified of `obj`, asking caches to revalidate before reusing the response.
+    """
+    headers = {"ETag": make_etag(obj), "Cache-Control": "no-cache"}
+    if obj.updated_at:
+        headers["Last-Modified"] = format_datetime(obj.updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+
+def headers_not_modified(request: Request, headers: Dict[str, str]) -> bool:
+    """
+    Whether the client's copy of a response with these validator headers is current.
+    `If-None-Match` takes precedence over `If-Modified-Since`; weak ETags match for GET.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag[2:] if tag.startswith("W/") else tag for tag in _etags(if_none_match)]
+        return "*" in tags or headers["ETag"] in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return parsedate_to_datetime(headers["Last-Modified"]) <= since
+    return False
+
+
+def is_not_modified(request: Request, obj: Any) -> bool:
+    return headers_not_modified(request, validator_headers(obj))
+
+
+def set_validators(response: Response, obj: Any) -> None:
+    response.headers.update(validator_headers(obj))
+
+
+def not_modified(obj: Any) -> Response:
+    return not_modified_response(validator_headers(obj))
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def has_if_match(request: Request) -> bool:
+    return "if-match" in request.headers
+
+
+def check_if_match(request: Request, obj: Any) -> None:
+    """
+    Reject a write with 412 when `If-Match` is sent and does not match the current ETag (strong comparison).
+    """
+    if_match = request.headers.get("if-match")
+    if if_match is None:
+        return
+    tags = _etags(if_match)
+    if "*" not in tags and make_etag(obj) not in tags:
+        raise HTTPException(status.HTTP_412_PRECONDITION_FAILED, detail="Project has been modified")
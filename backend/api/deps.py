@@ -1,15 +1,22 @@
-from typing import Generator
+from contextlib import asynccontextmanager, contextmanager
+from typing import Generator, AsyncGenerator, Iterator, Optional
 
 import jwt
 from fastapi import Depends, HTTPException
+from fastapi.security.utils import get_authorization_scheme_param
 from sqlalchemy.orm import Session
 from starlette import status
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
 
 import crud
 import models
 import schemas
+from core import cache
 from core.config import settings
-from core.security import OAuth2PasswordBearerCookie, decode_access_token, decode_refresh_token
+from core.security import OAuth2PasswordBearerCookie, decode_access_token, decode_refresh_token, token_versions
+from database import session
+from database.replicas import READ_PRIMARY_COOKIE, Replica
 from database.session import SessionLocal
 
 reusable_oauth2 = OAuth2PasswordBearerCookie(
@@ -25,18 +32,186 @@ def get_db() -> Generator:
         db.close()
 
 
-def get_current_user(
+async def get_async_db() -> AsyncGenerator:
+    """
+    Session for `async def` routes, to be used with the awaitable `a*` CRUD methods.
+    Yields an AsyncSession when ASYNC_DB_ENABLED is set, otherwise a sync Session
+    whose work the CRUD methods run in the threadpool.
+    """
+    if session.AsyncSessionLocal is not None:
+        async with session.AsyncSessionLocal() as db:
+            yield db
+        return
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        await run_in_threadpool(db.close)
+
+
+def _access_token_user_id(request: Request) -> Optional[int]:
+    """
+    User of the bearer token, if it is a valid access token; the route checks it again.
+    """
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if scheme.lower() != "bearer":
+        return None
+    try:
+        return schemas.TokenPayload(**decode_access_token(token)).sub
+    except jwt.PyJWTError:
+        return None
+
+
+def _read_replica(request: Request) -> Optional[Replica]:
+    if session.replicas is None or READ_PRIMARY_COOKIE in request.cookies:
+        return None
+    # editors whose collaboration changes were committed, which sets no cookie
+    if session.replicas.has_writers():
+        user_id = _access_token_user_id(request)
+        if user_id is not None and session.replicas.wrote_recently(user_id):
+            return None
+    return session.replicas.choose()
+
+
+def _public_replica(request: Request) -> Optional[Replica]:
+    # cached pages are filled from the primary, so that a replica that did not replay a change yet cannot put
+    # back what the change invalidated
+    if not isinstance(cache.cache, cache.NullCache):
+        return None
+    return _read_replica(request)
+
+
+@contextmanager
+def _read_session(replica: Optional[Replica]) -> Iterator[Session]:
+    db = SessionLocal(bind=replica.engine) if replica else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def _async_read_session(replica: Optional[Replica]) -> AsyncGenerator:
+    if session.AsyncSessionLocal is not None:
+        bind = replica.async_engine if replica else session.async_engine
+        async with session.AsyncSessionLocal(bind=bind) as db:
+            yield db
+        return
+    db = SessionLocal(bind=replica.engine) if replica else SessionLocal()
+    try:
+        yield db
+    finally:
+        await run_in_threadpool(db.close)
+
+
+def get_read_db(request: Request) -> Generator:
+    """
+    Session for routes that only read. It is bound to a healthy replica, or to the primary when there is none
+    or the client committed a change within DB_REPLICA_READ_YOUR_WRITES_SECONDS, over HTTP or the collaboration
+    WebSocket.
+    """
+    with _read_session(_read_replica(request)) as db:
+        yield db
+
+
+async def get_async_read_db(request: Request) -> AsyncGenerator:
+    """
+    `get_async_db` for routes that only read, on a replica as with `get_read_db`.
+    """
+    async with _async_read_session(_read_replica(request)) as db:
+        yield db
+
+
+def get_public_db(request: Request) -> Generator:
+    """
+    `get_read_db` for routes that serve public pages from the cache. While a cache is configured, misses are
+    read from the primary, which the cache spares most of the load.
+    """
+    with _read_session(_public_replica(request)) as db:
+        yield db
+
+
+async def get_async_public_db(request: Request) -> AsyncGenerator:
+    """
+    `get_async_read_db` for routes that serve public pages from the cache, on the primary as with `get_public_db`.
+    """
+    async with _async_read_session(_public_replica(request)) as db:
+        yield db
+
+
+def get_current_claims(
     db: Session = Depends(get_db), token: str = Depends(reusable_oauth2)
-) -> models.User:
+) -> schemas.UserClaims:
+    """
+    Authenticate from the access token claims. The user row is not loaded; the token version is checked
+    against `token_versions`, which only reads the database once per user and cache period.
+    """
+    return get_claims_from_access_token(db, token["access_token"])
+
+
+def get_claims_from_access_token(db: Session, token: str) -> schemas.UserClaims:
     try:
-        access_token = decode_access_token(token["access_token"])
+        access_token = decode_access_token(token)
         token_data = schemas.TokenPayload(**access_token)
     except jwt.PyJWTError:
         raise HTTPException(
             status.HTTP_400_BAD_REQUEST,
             detail="Something went wrong, please try to login again",
         )
-    user = crud.user.get(db, id=token_data.sub)
+    if token_data.active is None or token_data.superuser is None or token_data.ver is None:
+        # token issued before claims were added
+        user = crud.user.get(db, id=token_data.sub)
+        if not user:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
+        return schemas.UserClaims(
+            id=user.id,
+            email=user.email,
+            is_active=user.is_active,
+            is_superuser=user.is_superuser,
+            token_version=user.token_version,
+        )
+    version = current_token_version(db, token_data.sub)
+    if version is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
+    if version != token_data.ver:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked")
+    return schemas.UserClaims(
+        id=token_data.sub,
+        email=token_data.email,
+        is_active=token_data.active,
+        is_superuser=token_data.superuser,
+        token_version=token_data.ver,
+    )
+
+
+def current_token_version(db: Session, user_id: int) -> Optional[int]:
+    """
+    Token version of the user from `token_versions`, read from the database when not cached.
+    None if the user does not exist.
+    """
+    version = token_versions.get(user_id)
+    if version is None:
+        version = crud.user.get_token_version(db, id=user_id)
+        if version is not None:
+            token_versions.set(user_id, version)
+    return version
+
+
+def get_current_active_claims(
+    current_user: schemas.UserClaims = Depends(get_current_claims),
+) -> schemas.UserClaims:
+    if not crud.user.is_active(current_user):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, detail="Inactive user")
+    return current_user
+
+
+def get_current_user(
+    db: Session = Depends(get_db), claims: schemas.UserClaims = Depends(get_current_claims)
+) -> models.User:
+    """
+    The full user row, for endpoints that need more than the token claims.
+    """
+    user = crud.user.get(db, id=claims.id)
     if not user:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
@@ -51,8 +226,8 @@ def get_current_active_user(
 
 
 def get_current_active_superuser(
-    current_user: models.User = Depends(get_current_user),
-) -> models.User:
+    current_user: schemas.UserClaims = Depends(get_current_claims),
+) -> schemas.UserClaims:
     if not crud.user.is_superuser(current_user):
         raise HTTPException(
             status.HTTP_403_FORBIDDEN, detail="Permission denied"
@@ -76,5 +251,7 @@ def get_user_with_expired_access_token(
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
     if not crud.user.is_active(user):
         raise HTTPException(status.HTTP_403_FORBIDDEN, detail="Inactive user")
+    if token_data.ver is not None and token_data.ver != user.token_version:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail="Token has been revoked")
 
     return user
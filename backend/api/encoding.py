@@ -0,0 +1,27 @@
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import inspect
+
+import models
+import schemas
+
+ELEMENT_FIELDS = [attribute.key for attribute in inspect(models.EditorElement).column_attrs]
+
+
+def encode_element(element: models.EditorElement) -> Dict[str, Any]:
+    return {field: getattr(element, field) for field in ELEMENT_FIELDS}
+
+
+def encode_screenplay(screenplay: Any) -> Dict[str, Any]:
+    """
+    A screenplay with its elements as `schemas.Screenplay` renders it, ready for orjson or msgpack.
+    Walking thousands of element objects through `jsonable_encoder` costs far more than encoding the result,
+    so elements are read column by column instead.
+    """
+    content = schemas.ScreenplaySummary.from_orm(screenplay).dict()
+    content["elements"] = [encode_element(element) for element in screenplay.elements]
+    return content
+
+
+def encode_screenplays(screenplays: Iterable[Any]) -> List[Dict[str, Any]]:
+    return [encode_screenplay(screenplay) for screenplay in screenplays]
@@ -0,0 +1,20 @@
+from typing import Any, Dict, List
+
+from starlette.responses import Response
+
+from crud.base import CRUDBase
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def next_cursor_headers(crud_obj: CRUDBase, items: List[Any], limit: int) -> Dict[str, str]:
+    if items and len(items) >= limit:
+        return {NEXT_CURSOR_HEADER: crud_obj.encode_cursor(items[-1])}
+    return {}
+
+
+def set_next_cursor(response: Response, crud_obj: CRUDBase, items: List[Any], limit: int) -> None:
+    """
+    Advertise the cursor of the next page in the `X-Next-Cursor` header when the current page is full.
+    """
+    response.headers.update(next_cursor_headers(crud_obj, items, limit))
@@ -0,0 +1,470 @@
+"""
+Load and latency benchmark of the API, run in-process against `main.app` and the configured database.
+
+    python -m benchmarks.api --concurrency 10 --requests 200 --output results.json
+    python -m benchmarks.api --scenario open --scenario autosave --baseline results.json
+
+Seeds users and screenplays (removed afterwards unless --keep), drives every scenario with `--concurrency`
+simultaneous clients and reports throughput, latency percentiles and database queries per request by route.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import orjson
+
+import crud
+import models
+import schemas
+from benchmarks.serialization import CONTENT_TYPES
+from core import metrics, query_budget
+from core.config import settings
+from database import session
+from main import app
+
+EMAIL_DOMAIN = "benchmark.example.com"
+PASSWORD = "benchmark-password"
+API = settings.API_V1 + "/screenplays"
+
+
+class Response(NamedTuple):
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        return orjson.loads(self.body)
+
+
+class Sample(NamedTuple):
+    route: str
+    status: int
+    seconds: float
+    # None for WebSocket messages, whose queries run in the room's writer task
+    queries: Optional[int]
+
+
+class Client:
+    """
+    Minimal HTTP client calling the ASGI app directly, recording a sample for every request.
+    Requests run concurrently on the event loop, sync routes in the threadpool, as under uvicorn.
+    """
+
+    def __init__(self, samples: List[Sample], accept_encoding: str) -> None:
+        self.samples = samples
+        self.accept_encoding = accept_encoding
+
+    async def request(
+            self,
+            route: str,
+            method: str,
+            url: str,
+            *,
+            token: Optional[str] = None,
+            json_body: Any = None,
+            form: Optional[Dict[str, str]] = None,
+    ) -> Response:
+        headers = [(b"accept-encoding", self.accept_encoding.encode())]
+        body = b""
+        if json_body is not None:
+            body = orjson.dumps(json_body)
+            headers.append((b"content-type", b"application/json"))
+        elif form is not None:
+            body = urlencode(form).encode()
+            headers.append((b"content-type", b"application/x-www-form-urlencoded"))
+        if token is not None:
+            headers.append((b"authorization", f"Bearer {token}".encode()))
+        headers.append((b"content-length", str(len(body)).encode()))
+        parts = urlsplit(url)
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": parts.path,
+            "raw_path": parts.path.encode(),
+            "query_string": parts.query.encode(),
+            "root_path": "",
+            "headers": headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        received = False
+        status = 500
+        response_headers: Dict[str, str] = {}
+        chunks: List[bytes] = []
+
+        async def receive() -> Dict[str, Any]:
+            nonlocal received
+            if received:
+                # nothing more to read; wait like a client keeping the connection open
+                await asyncio.Event().wait()
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers.update((k.decode().lower(), v.decode()) for k, v in message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        # counted by the engine hooks of `database.session`, like the queries of the request metrics
+        with metrics.count_queries() as queries:
+            started = time.perf_counter()
+            await app(scope, receive, send)
+            seconds = time.perf_counter() - started
+        self.samples.append(Sample(route, status, seconds, queries.count))
+        body = b"".join(chunks)
+        if response_headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        return Response(status, response_headers, body)
+
+
+class Socket:
+    """
+    WebSocket connection to the ASGI app, in-process like `Client`. Messages are JSON text frames.
+    """
+
+    def __init__(self, url: str) -> None:
+        parts = urlsplit(url)
+        self.scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": parts.path,
+            "raw_path": parts.path.encode(),
+            "query_string": parts.query.encode(),
+            "root_path": "",
+            "headers": [],
+            "subprotocols": [],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        self._incoming: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._outgoing: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def connect(self) -> Any:
+        """
+        Open the connection and return the first message.
+        """
+        self._incoming.put_nowait({"type": "websocket.connect"})
+        self._task = asyncio.create_task(app(self.scope, self._incoming.get, self._outgoing.put))
+        message = await self._outgoing.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"WebSocket closed with code {message.get('code')}")
+        return await self.receive()
+
+    async def send(self, message: Any) -> None:
+        self._incoming.put_nowait({"type": "websocket.receive", "text": orjson.dumps(message).decode()})
+
+    async def receive(self) -> Any:
+        message = await self._outgoing.get()
+        if message["type"] == "websocket.close":
+            raise ConnectionError(f"WebSocket closed with code {message.get('code')}")
+        return orjson.loads(message["text"])
+
+    async def close(self) -> None:
+        self._incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await self._task
+
+
+class Fixture(NamedTuple):
+    emails: List[str]
+    tokens: List[str]
+    # per user: a screenplay of `--elements` elements and a small one for autosaves, with its element ids
+    large_ids: List[int]
+    autosave: List[Tuple[int, List[int]]]
+    public_ids: List[int]
+
+
+class Element(NamedTuple):
+    content: str
+    content_type: Any
+
+
+def elements(count: int) -> List[Element]:
+    return [Element(content, content_type) for content_type, content in (
+        CONTENT_TYPES[i % len(CONTENT_TYPES)] for i in range(count))]
+
+
+async def seed(client: Client, users: int, element_count: int, public_count: int) -> Fixture:
+    db = session.SessionLocal()
+    try:
+        emails = [f"user{i}@{EMAIL_DOMAIN}" for i in range(users)]
+        large_ids, autosave, public_ids = [], [], []
+        for email in emails:
+            user = crud.user.get_by_email(db, email=email) or crud.user.create(
+                db, obj_in=schemas.UserCreate(email=email, password=PASSWORD))
+            data = {"description": "Benchmark", "is_public": False, "owner_id": user.id}
+            large = crud.screenplay.create_from_elements(
+                db, obj_in={**data, "name": "Large"}, elements=elements(element_count))
+            small = crud.screenplay.create_from_elements(
+                db, obj_in={**data, "name": "Autosave"}, elements=elements(200))
+            large_ids.append(large.id)
+            autosave.append((small.id, [_id for _id, in db.query(models.EditorElement.id).filter(
+                models.EditorElement.screenplay_id == small.id).order_by(models.EditorElement.position)]))
+        for i in range(public_count):
+            public = crud.screenplay.create_from_elements(
+                db, obj_in={"name": f"Public {i}", "description": "Benchmark", "is_public": True,
+                            "owner_id": crud.user.get_by_email(db, email=emails[i % users]).id},
+                elements=elements(500))
+            public_ids.append(public.id)
+    finally:
+        db.close()
+
+    tokens = []
+    for email in emails:
+        response = await client.request(
+            "seed", "POST", settings.API_V1 + "/auth/login/access-token",
+            form={"username": email, "password": PASSWORD})
+        tokens.append(response.json()["access_token"])
+    client.samples.clear()
+    return Fixture(emails, tokens, large_ids, autosave, public_ids)
+
+
+def remove_seed() -> None:
+    db = session.SessionLocal()
+    try:
+        # screenplays and their rows go with the users through the foreign key cascades
+        db.query(models.User).filter(models.User.email.like(f"%@{EMAIL_DOMAIN}")).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+# A scenario runs one job of a simulated client: `worker` is the client's number, `n` the job's.
+Scenario = Callable[[Client, Fixture, int, int], Awaitable[None]]
+
+
+async def login(client: Client, fixture: Fixture, worker: int, n: int) -> None:
+    await client.request(
+        "POST /auth/login/access-token", "POST", settings.API_V1 + "/auth/login/access-token",
+        form={"username": fixture.emails[worker % len(fixture.emails)], "password": PASSWORD})
+
+
+async def list_screenplays(client: Client, fixture: Fixture, worker: int, n: int) -> None:
+    token = fixture.tokens[worker % len(fixture.tokens)]
+    await client.request("GET /screenplays/summary", "GET", f"{API}/summary?limit=20", token=token)
+    await client.request("GET /screenplays/", "GET", f"{API}/?limit=20", token=token)
+
+
+async def open_screenplay(client: Client, fixture: Fixture, worker: int, n: int) -> None:
+    user = worker % len(fixture.tokens)
+    await client.request(
+        "GET /screenplays/{id}", "GET", f"{API}/{fixture.large_ids[user]}", token=fixture.tokens[user])
+
+
+def autosave(burst: int) -> Scenario:
+    async def run(client: Client, fixture: Fixture, worker: int, n: int) -> None:
+        # every client types into its own element of its user's screenplay, saving after each keystroke
+        user = worker % len(fixture.tokens)
+        screenplay_id, element_ids = fixture.autosave[user]
+        element_id = element_ids[(worker // len(fixture.tokens) + n) % len(element_ids)]
+        text = ""
+        for keystroke in range(burst):
+            text += "abcdefghij"[keystroke % 10]
+            await client.request(
+                "PATCH /screenplays/{id}/elements", "PATCH", f"{API}/{screenplay_id}/elements",
+                token=fixture.tokens[user],
+                json_body={"operations": [{"op": "update", "id": element_id, "content": text}]})
+    return run
+
+
+def collaborate(burst: int) -> Scenario:
+    async def run(client: Client, fixture: Fixture, worker: int, n: int) -> None:
+        # every client is an editor of the same screenplay, typing into its own element; a keystroke takes until
+        # the change that acknowledges it is broadcast back, after the group commit of the room
+        screenplay_id, element_ids = fixture.autosave[0]
+        socket = Socket(f"{API}/{screenplay_id}/collaborate?token={fixture.tokens[0]}")
+        client_id = (await socket.connect())["client_id"]
+        element_id = element_ids[worker % len(element_ids)]
+        text = ""
+        try:
+            for keystroke in range(burst):
+                text += "abcdefghij"[keystroke % 10]
+                ref = f"{n}-{keystroke}"
+                started = time.perf_counter()
+                await socket.send({"ref": ref, "operations": [{"op": "update", "id": element_id, "content": text}]})
+                while True:
+                    message = await socket.receive()
+                    if message["type"] == "error" and message["ref"] == ref:
+                        status = 400
+                        break
+                    if message["type"] == "applied" and any(
+                            ack["client_id"] == client_id and ack["ref"] == ref for ack in message["acks"]):
+                        status = 200
+                        break
+                client.samples.append(
+                    Sample("WS /screenplays/{id}/collaborate", status, time.perf_counter() - started, None))
+        finally:
+            await socket.close()
+    return run
+
+
+async def public_reads(client: Client, fixture: Fixture, worker: int, n: int) -> None:
+    await client.request("GET /screenplays/public/summary", "GET", f"{API}/public/summary?limit=20")
+    public_id = fixture.public_ids[n % len(fixture.public_ids)]
+    await client.request("GET /screenplays/public/{id}", "GET", f"{API}/public/{public_id}")
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    if not values:
+        return 0.0
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+def summarize(samples: List[Sample], seconds: float) -> Dict[str, Any]:
+    routes: Dict[str, Any] = {}
+    for route in sorted({sample.route for sample in samples}):
+        matching = [sample for sample in samples if sample.route == route]
+        latencies = sorted(sample.seconds * 1000 for sample in matching)
+        routes[route] = {
+            "requests": len(matching),
+            "errors": sum(1 for sample in matching if sample.status >= 400),
+            "throughput": len(matching) / seconds if seconds else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1],
+            "queries_per_request": (
+                sum(sample.queries for sample in matching) / len(matching)
+                if all(sample.queries is not None for sample in matching) else None),
+        }
+    return {
+        "seconds": seconds,
+        "requests": len(samples),
+        "throughput": len(samples) / seconds if seconds else 0.0,
+        "routes": routes,
+    }
+
+
+async def run_scenario(
+        scenario: Scenario, client: Client, fixture: Fixture, jobs: int, concurrency: int
+) -> Dict[str, Any]:
+    client.samples.clear()
+    queue: "asyncio.Queue[int]" = asyncio.Queue()
+    for n in range(jobs):
+        queue.put_nowait(n)
+
+    async def worker(number: int) -> None:
+        while not queue.empty():
+            await scenario(client, fixture, number, queue.get_nowait())
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(number) for number in range(concurrency)])
+    return summarize(list(client.samples), time.perf_counter() - started)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    print(f"{'route':<36}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}")
+    for name, scenario in results["scenarios"].items():
+        print(f"{name} ({scenario['requests']} requests, {scenario['throughput']:.1f} req/s)")
+        for route, stats in scenario["routes"].items():
+            queries = stats["queries_per_request"]
+            line = (
+                f"  {route:<34}{stats['throughput']:>9.1f}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+                f"{stats['p99_ms']:>9.1f}{'-' if queries is None else f'{queries:.1f}':>9}{stats['errors']:>8}"
+            )
+            previous = ((baseline or {}).get("scenarios", {}).get(name, {}).get("routes", {}).get(route))
+            if previous and previous["p95_ms"]:
+                line += f"  p95 {(stats['p95_ms'] / previous['p95_ms'] - 1) * 100:+.0f}%"
+            print(line)
+
+
+SCENARIOS = ("login", "list", "open", "autosave", "collaborate", "public")
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    scenarios: Dict[str, Scenario] = {
+        "login": login,
+        "list": list_screenplays,
+        "open": open_screenplay,
+        "autosave": autosave(args.burst),
+        "collaborate": collaborate(args.burst),
+        "public": public_reads,
+    }
+    client = Client([], args.accept_encoding)
+    fixture = await seed(client, args.users, args.elements, args.public)
+    try:
+        results = {}
+        for name in args.scenario or SCENARIOS:
+            # one untimed round to warm up caches and connections
+            await run_scenario(scenarios[name], client, fixture, args.concurrency, args.concurrency)
+            results[name] = await run_scenario(scenarios[name], client, fixture, args.requests, args.concurrency)
+        return results
+    finally:
+        if not args.keep:
+            remove_seed()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark API throughput and latency on the configured database.")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="scenario to run, all by default")
+    parser.add_argument("--concurrency", type=int, default=10, help="simultaneous clients")
+    parser.add_argument("--requests", type=int, default=100, help="jobs per scenario, some send several requests")
+    parser.add_argument("--users", type=int, default=5, help="seeded users")
+    parser.add_argument("--elements", type=int, default=5000, help="elements of the screenplay each user opens")
+    parser.add_argument("--public", type=int, default=20, help="seeded public screenplays")
+    parser.add_argument("--burst", type=int, default=10, help="keystrokes per autosave and collaborate job")
+    parser.add_argument("--accept-encoding", default="gzip", help="Accept-Encoding header of the requests")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare p95 latencies with")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded data")
+    parser.add_argument(
+        "--check-query-budgets", action="store_true", help="exit with status 1 if requests went over their budget")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "rb") as f:
+            baseline = orjson.loads(f.read())
+
+    started_at = datetime.now().isoformat(timespec="seconds")
+    # logged rather than raised, so that every scenario runs to the end
+    checked = query_budget.enforce("log") if args.check_query_budgets else nullcontext([])
+    with checked as exceeded:
+        scenarios = asyncio.run(benchmark(args))
+    results = {
+        "started_at": started_at,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "options": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "scenarios": scenarios,
+    }
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+    for recorder in exceeded:
+        print(f"over query budget: {recorder.method} {recorder.path}: {'; '.join(recorder.violations())}")
+    return 1 if args.check_query_budgets and exceeded else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Time the encoding and compression of a GET /screenplays/{id} response body.
+
+    python -m benchmarks.serialization --elements 5000
+"""
+import argparse
+import gzip
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+import models
+import schemas
+from api.encoding import encode_screenplay
+from core import middleware
+from models.editor_elements import ContentType
+
+CONTENT_TYPES = [
+    (ContentType.HEADING, "INT. APARTMENT - NIGHT"),
+    (ContentType.ACTION, "Rain hammers the window. A phone buzzes on the table, unanswered, again and again."),
+    (ContentType.CHARACTER, "MARGARET"),
+    (ContentType.PARENTHETICAL, "(not looking up)"),
+    (ContentType.DIALOGUE, "If that's him again, tell him I moved to Lisbon and took the cat with me."),
+]
+
+
+def make_screenplay(element_count: int) -> schemas.Screenplay:
+    now = datetime.now()
+    elements = [
+        models.EditorElement(
+            id=i + 1, screenplay_id=1, content=CONTENT_TYPES[i % len(CONTENT_TYPES)][1],
+            content_type=CONTENT_TYPES[i % len(CONTENT_TYPES)][0], position=(i + 1) * 1024,
+            created_at=now, updated_at=now, deleted_at=None)
+        for i in range(element_count)
+    ]
+    return schemas.Screenplay(
+        id=1, name="Benchmark", description="Synthetic screenplay", is_public=True, owner_id=1, version=1,
+        created_at=now, updated_at=now, elements=elements)
+
+
+def measure(func: Callable[[], Any], repeat: int) -> float:
+    """
+    Best of `repeat` runs, in milliseconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark response encoding and compression.")
+    parser.add_argument("--elements", type=int, default=5000, help="elements of the screenplay")
+    parser.add_argument("--repeat", type=int, default=10, help="runs of every measurement, the best is reported")
+    args = parser.parse_args(argv)
+
+    screenplay = make_screenplay(args.elements)
+    body = middleware.encode_json(encode_screenplay(screenplay))
+    print(f"{args.elements} elements, {len(body)} bytes of JSON\n")
+
+    encoders = [
+        # FastAPI's default: jsonable_encoder and JSONResponse
+        ("jsonable_encoder + json", lambda: JSONResponse(jsonable_encoder(screenplay)).body),
+        ("jsonable_encoder + orjson", lambda: middleware.encode_json(jsonable_encoder(screenplay))),
+        ("encode_screenplay + orjson", lambda: middleware.encode_json(encode_screenplay(screenplay))),
+    ]
+    if middleware.msgpack is not None:
+        encoders.append(("encode_screenplay + msgpack", lambda: middleware.encode_msgpack(encode_screenplay(screenplay))))
+    print(f"{'encoder':<30}{'ms':>10}{'bytes':>12}")
+    for name, encode in encoders:
+        print(f"{name:<30}{measure(encode, args.repeat):>10.2f}{len(encode()):>12}")
+
+    compressors = [(f"gzip {level}", lambda level=level: gzip.compress(body, compresslevel=level)) for level in (1, 6, 9)]
+    if middleware.brotli is not None:
+        compressors += [
+            (f"brotli {quality}", lambda quality=quality: middleware.brotli.compress(body, quality=quality))
+            for quality in (1, 4, 6)
+        ]
+    print(f"\n{'compression':<30}{'ms':>10}{'bytes':>12}{'ratio':>8}")
+    for name, compress in compressors:
+        size = len(compress())
+        print(f"{name:<30}{measure(compress, args.repeat):>10.2f}{size:>12}{len(body) / size:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
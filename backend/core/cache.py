@@ -0,0 +1,229 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from core.config import settings
+
+PUBLIC_LIST_GENERATION_KEY = "public:list:generation"
+
+
+class CacheBackend(ABC):
+    """
+    Byte string cache. Subclasses implement `get`, `set`, `delete` and `incr`; the awaitable variants run
+    them in the threadpool when the backend does network I/O.
+    """
+    blocking = False
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        pass
+
+    def lookup(self, key: str) -> Optional[bytes]:
+        """
+        `get` that counts hits and misses.
+        """
+        value = self.get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    async def alookup(self, key: str) -> Optional[bytes]:
+        if self.blocking:
+            return await run_in_threadpool(self.lookup, key)
+        return self.lookup(key)
+
+    async def aset(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        if self.blocking:
+            return await run_in_threadpool(self.set, key, value, ttl)
+        return self.set(key, value, ttl)
+
+    async def aget(self, key: str) -> Optional[bytes]:
+        if self.blocking:
+            return await run_in_threadpool(self.get, key)
+        return self.get(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        return {"hits": hits, "misses": misses, "hit_ratio": hits / (hits + misses) if hits + misses else 0.0}
+
+
+class NullCache(CacheBackend):
+    """
+    Caching disabled: every lookup is a miss.
+    """
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def incr(self, key: str) -> int:
+        return 0
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process LRU cache with expiry. Every worker process has its own copy, so writes handled by
+    another process only become visible here when the entry expires.
+    """
+
+    def __init__(self, maxsize: int, ttl: int) -> None:
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # counters are kept apart, so that they neither expire nor are evicted by the entries
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key in self._counters:
+                return str(self._counters[key]).encode()
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+            self._counters.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache shared by all processes in a Redis server, or anything speaking its protocol.
+    `client` needs the `get`, `set(ex=)`, `delete` and `incr` methods of a `redis.Redis` client.
+    """
+    blocking = True
+
+    def __init__(self, client: Any, ttl: int, prefix: str = "screenplay:") -> None:
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, ttl: int) -> "RedisCache":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package")
+        return cls(redis.Redis.from_url(url), ttl)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        self.client.set(self.prefix + key, value, ex=ttl or self.ttl)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(self.prefix + key))
+
+
+def create_cache() -> CacheBackend:
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCache.from_url(settings.CACHE_REDIS_URL, settings.CACHE_TTL_SECONDS)
+    if settings.CACHE_BACKEND == "memory":
+        return MemoryCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+    return NullCache()
+
+
+cache = create_cache()
+
+
+def lookup(key: str) -> Optional[bytes]:
+    return cache.lookup(key)
+
+
+async def alookup(key: str) -> Optional[bytes]:
+    return await cache.alookup(key)
+
+
+def store(key: str, value: bytes) -> None:
+    cache.set(key, value)
+
+
+async def astore(key: str, value: bytes) -> None:
+    await cache.aset(key, value)
+
+
+def public_screenplay_key(screenplay_id: int) -> str:
+    return f"public:screenplay:{screenplay_id}"
+
+
+def public_list_key(generation: int, *parts: Any) -> str:
+    """
+    Key of a page of public screenplays. Pages are not deleted one by one; bumping the generation
+    makes all of them unreachable at once.
+    """
+    return f"public:list:{generation}:" + ":".join(str(part) for part in parts)
+
+
+def public_list_generation() -> int:
+    value = cache.get(PUBLIC_LIST_GENERATION_KEY)
+    return int(value) if value is not None else 0
+
+
+async def apublic_list_generation() -> int:
+    value = await cache.aget(PUBLIC_LIST_GENERATION_KEY)
+    return int(value) if value is not None else 0
+
+
+def invalidate_public_screenplay(screenplay_id: Optional[int] = None) -> None:
+    """
+    Drop the cached copy of a screenplay, if given, and every cached page of public screenplays.
+    """
+    if screenplay_id is not None:
+        cache.delete(public_screenplay_key(screenplay_id))
+    cache.incr(PUBLIC_LIST_GENERATION_KEY)
@@ -8,6 +8,10 @@ from pydantic import BaseSettings, AnyHttpUrl, PostgresDsn, validator, EmailStr
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def replica_hosts(value: Optional[str]) -> List[str]:
+    return [host.strip() for host in (value or "").split(",") if host.strip()]
+
+
 class Settings(BaseSettings):
     SECRET_KEY: str = secrets.token_urlsafe(32)
 
@@ -29,6 +33,73 @@ class Settings(BaseSettings):
     DB_NAME: str
     DB_PASSWORD: str
     SQLALCHEMY_DATABASE_URI: Optional[PostgresDsn] = None
+    # Routes written against `deps.get_async_db` use the asyncpg engine when enabled,
+    # otherwise they run the sync session in the threadpool.
+    ASYNC_DB_ENABLED: bool = False
+    SQLALCHEMY_ASYNC_DATABASE_URI: Optional[PostgresDsn] = None
+    # read replicas as comma-separated host:port, with the credentials and database name of the primary;
+    # read-only routes are spread over the replicas that answer and lag at most DB_REPLICA_MAX_LAG_SECONDS
+    # behind, checked every DB_REPLICA_CHECK_SECONDS, and clients that committed a change read from the primary
+    # for DB_REPLICA_READ_YOUR_WRITES_SECONDS. A string because pydantic only accepts JSON lists from the environment.
+    DB_REPLICA_HOSTS: str = ""
+    SQLALCHEMY_REPLICA_URIS: List[PostgresDsn] = []
+    SQLALCHEMY_ASYNC_REPLICA_URIS: List[PostgresDsn] = []
+    DB_REPLICA_MAX_LAG_SECONDS: float = 10
+    DB_REPLICA_CHECK_SECONDS: int = 5
+    DB_REPLICA_READ_YOUR_WRITES_SECONDS: int = 10
+
+    # rows per multi-row INSERT when screenplay elements are created in bulk
+    ELEMENT_INSERT_BATCH_SIZE: int = 1000
+    # rows fetched per round trip when streaming elements out of the database
+    EXPORT_FETCH_SIZE: int = 1000
+    # lines of 12pt Courier on a screenplay page, between the top and bottom margins
+    LAYOUT_LINES_PER_PAGE: int = 55
+    # laid out scenes kept in memory for pagination
+    LAYOUT_CACHE_SIZE: int = 10000
+    # substring search; needs the pg_trgm index, created by the search index migration when this is set
+    SEARCH_TRIGRAM_ENABLED: bool = False
+
+    # cache of public screenplays and listings: "memory" (per process), "redis" or "none"
+    CACHE_BACKEND: str = "memory"
+    CACHE_REDIS_URL: Optional[str] = None
+    CACHE_TTL_SECONDS: int = 30
+    CACHE_MAX_ENTRIES: int = 1024
+
+    # responses of at least COMPRESSION_MINIMUM_SIZE bytes are compressed; brotli needs the brotli package
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_ENABLED: bool = False
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    # MessagePack responses to requests accepting application/msgpack; needs the msgpack package
+    MSGPACK_ENABLED: bool = False
+
+    # fan-out of collaborative edits: "memory" for a single process, "redis" across processes
+    PUBSUB_BACKEND: str = "memory"
+    PUBSUB_REDIS_URL: Optional[str] = None
+    # messages a subscriber may fall behind before it is disconnected
+    PUBSUB_MAX_PENDING: int = 1000
+    # element operations persisted together in one transaction
+    COLLABORATION_MAX_BATCH_OPERATIONS: int = 1000
+
+    # revision history: a full snapshot is stored once this many operations were logged since the last one,
+    # so that rebuilding a revision replays at most about this many operations
+    REVISION_SNAPSHOT_INTERVAL: int = 500
+
+    # screenplays soft-deleted for longer than this are deleted for good, PURGE_BATCH_SIZE per transaction,
+    # every PURGE_INTERVAL_SECONDS by each worker (0 to leave it to purge_deleted.py)
+    PURGE_RETENTION_DAYS: int = 30
+    PURGE_BATCH_SIZE: int = 100
+    PURGE_INTERVAL_SECONDS: int = 3600
+
+    # Prometheus metrics of each worker process at /metrics
+    METRICS_ENABLED: bool = True
+    # query budget of requests: "off", "log" a warning or "raise" (for tests) when a route issues more than
+    # QUERY_BUDGET_MAX_QUERIES queries, or one statement more than QUERY_BUDGET_MAX_REPEATS times;
+    # routers declare their own budgets in api/api_v1/api.py
+    QUERY_BUDGET_MODE: str = "off"
+    QUERY_BUDGET_MAX_QUERIES: int = 50
+    QUERY_BUDGET_MAX_REPEATS: int = 5
 
     SMTP_TLS: bool = True
     SMTP_PORT: Optional[int] = None
@@ -60,6 +131,14 @@ class Settings(BaseSettings):
     REFRESH_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
 
+    # bcrypt cost factor; existing hashes with another cost are upgraded on the next login
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    # threads hashing and verifying passwords, per worker process
+    PASSWORD_HASH_WORKERS: int = 2
+
+    # how long a worker trusts its cached token version of a user before re-reading it
+    TOKEN_VERSION_CACHE_SECONDS: int = 30
+
     JWT_ACCESS_TOKEN_SECRET: str = SECRET_KEY + "access-token"
     JWT_REFRESH_TOKEN_SECRET: str = SECRET_KEY + "refresh-token"
 
@@ -82,6 +161,48 @@ class Settings(BaseSettings):
         )
         return db_connection
 
+    @validator("SQLALCHEMY_ASYNC_DATABASE_URI", pre=True)
+    def assemble_async_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
+        if isinstance(v, str):
+            return v
+        return PostgresDsn.build(
+            scheme="postgresql+asyncpg",
+            user=values.get("DB_USER"),
+            password=values.get("DB_PASSWORD"),
+            host=values.get("DB_HOST"),
+            path=f"/{values.get('DB_NAME') or ''}",
+        )
+
+    @validator("SQLALCHEMY_REPLICA_URIS", pre=True)
+    def assemble_replica_connections(cls, v: Optional[List[str]], values: Dict[str, Any]) -> Any:
+        if v:
+            return v
+        return [
+            PostgresDsn.build(
+                scheme="postgresql",
+                user=values.get("DB_USER"),
+                password=values.get("DB_PASSWORD"),
+                host=host,
+                path=f"/{values.get('DB_NAME') or ''}",
+            )
+            for host in replica_hosts(values.get("DB_REPLICA_HOSTS"))
+        ]
+
+    @validator("SQLALCHEMY_ASYNC_REPLICA_URIS", pre=True)
+    def assemble_async_replica_connections(cls, v: Optional[List[str]], values: Dict[str, Any]) -> Any:
+        if v:
+            return v
+        return [
+            PostgresDsn.build(
+                scheme="postgresql+asyncpg",
+                user=values.get("DB_USER"),
+                password=values.get("DB_PASSWORD"),
+                host=host,
+                path=f"/{values.get('DB_NAME') or ''}",
+            )
+            for host in replica_hosts(values.get("DB_REPLICA_HOSTS"))
+        ]
+
     @validator("BACKEND_CORS_ORIGINS", pre=True)
     def assemble_cors_origins(cls, v: Union[str, List[str]]) -> Union[List[str], str]:
         if isinstance(v, str) and not v.startswith("["):
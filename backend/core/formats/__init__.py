@@ -0,0 +1,54 @@
+import codecs
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from core.formats import fdx, fountain, text
+from core.formats.base import ParsedElement
+from models.editor_elements import ContentType
+
+ElementRow = Tuple[ContentType, str]
+
+EXPORTERS: Dict[str, Callable[[str, Iterable[ElementRow]], Iterator[str]]] = {
+    "fountain": fountain.export_fountain,
+    "fdx": fdx.export_fdx,
+    "txt": text.export_text,
+}
+
+IMPORTERS: Dict[str, Callable[[BinaryIO], Tuple[Optional[str], Iterator[ParsedElement]]]] = {
+    "fountain": lambda source: fountain.parse_fountain(codecs.iterdecode(source, "utf-8-sig")),
+    "fdx": fdx.parse_fdx,
+}
+
+IMPORT_EXTENSIONS = {
+    "fountain": "fountain",
+    "spmd": "fountain",
+    "txt": "fountain",
+    "fdx": "fdx",
+}
+
+MEDIA_TYPES = {
+    "fountain": "text/plain",
+    "fdx": "application/xml",
+    "txt": "text/plain",
+}
+
+EXTENSIONS = {
+    "fountain": "fountain",
+    "fdx": "fdx",
+    "txt": "txt",
+}
+
+
+def encode_chunks(parts: Iterable[str], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Join the small strings produced by an exporter into chunks of about `chunk_size` bytes for streaming.
+    """
+    buffer, size = [], 0
+    for part in parts:
+        data = part.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
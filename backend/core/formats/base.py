@@ -0,0 +1,8 @@
+from typing import NamedTuple
+
+from models.editor_elements import ContentType
+
+
+class ParsedElement(NamedTuple):
+    content_type: ContentType
+    content: str
@@ -0,0 +1,68 @@
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+from core.formats.base import ParsedElement
+from models.editor_elements import ContentType
+
+PARAGRAPH_TYPES = {
+    ContentType.HEADING: "Scene Heading",
+    ContentType.ACTION: "Action",
+    ContentType.CHARACTER: "Character",
+    ContentType.PARENTHETICAL: "Parenthetical",
+    ContentType.DIALOGUE: "Dialogue",
+    ContentType.SHOT: "Shot",
+    ContentType.TRANSITION: "Transition",
+    ContentType.TEXT: "General",
+}
+CONTENT_TYPES = {paragraph_type: content_type for content_type, paragraph_type in PARAGRAPH_TYPES.items()}
+
+
+def export_fdx(title: str, rows: Iterable[Tuple[ContentType, Optional[str]]]) -> Iterator[str]:
+    """
+    Render elements as a Final Draft (.fdx) document, one `Paragraph` per element.
+    """
+    yield '<?xml version="1.0" encoding="UTF-8" standalone="no" ?>\n'
+    yield '<FinalDraft DocumentType="Script" Template="No" Version="4">\n'
+    yield "  <Content>\n"
+    for content_type, content in rows:
+        paragraph_type = PARAGRAPH_TYPES.get(content_type, "General")
+        yield f"    <Paragraph Type={quoteattr(paragraph_type)}>\n"
+        yield f"      <Text>{escape(content or '')}</Text>\n"
+        yield "    </Paragraph>\n"
+    yield "  </Content>\n"
+    yield "  <TitlePage>\n    <Content>\n"
+    yield f'      <Paragraph Alignment="Center" Type="General">\n        <Text>{escape(title)}</Text>\n'
+    yield "      </Paragraph>\n    </Content>\n  </TitlePage>\n"
+    yield "</FinalDraft>\n"
+
+
+def parse_fdx(source: BinaryIO) -> Tuple[Optional[str], Iterator[ParsedElement]]:
+    """
+    Parse a Final Draft document with `iterparse`, dropping each paragraph from the tree once it has been read,
+    so that memory does not grow with the document.
+    The title page follows the script body in .fdx files, so no title is returned up front.
+    """
+
+    def elements() -> Iterator[ParsedElement]:
+        depth = 0  # nesting inside TitlePage, whose paragraphs are not part of the script
+        parents: List[ElementTree.Element] = []  # elements being built, the root first
+        for event, element in ElementTree.iterparse(source, events=("start", "end")):
+            if element.tag == "TitlePage":
+                depth += 1 if event == "start" else -1
+            if event == "start":
+                parents.append(element)
+                continue
+            parents.pop()
+            if element.tag != "Paragraph":
+                continue
+            texts = element.findall("Text")
+            # dual dialogue wraps its own paragraphs, which have already been read
+            if texts and not depth:
+                content_type = CONTENT_TYPES.get(element.get("Type"), ContentType.ACTION)
+                yield ParsedElement(content_type, "".join(text.text or "" for text in texts))
+            element.clear()
+            if parents:
+                parents[-1].remove(element)
+
+    return None, elements()
@@ -0,0 +1,171 @@
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from core.formats.base import ParsedElement
+from models.editor_elements import ContentType
+
+SCENE_HEADING_PREFIXES = ("INT", "EXT", "EST", "I/E", "INT./EXT", "INT/EXT")
+DIALOGUE_TYPES = (ContentType.CHARACTER, ContentType.PARENTHETICAL, ContentType.DIALOGUE)
+
+
+def _paragraph(content: str) -> str:
+    # a blank line inside an element would end it, Fountain keeps it with two spaces
+    return "\n".join(line if line.strip() else "  " for line in content.splitlines()) if content else ""
+
+
+def _format(content_type: ContentType, content: str) -> str:
+    content = _paragraph(content.strip())
+    if content_type == ContentType.HEADING:
+        if content.upper().startswith(SCENE_HEADING_PREFIXES):
+            return content.upper()
+        return "." + content
+    if content_type == ContentType.CHARACTER:
+        return content if content == content.upper() else "@" + content
+    if content_type == ContentType.PARENTHETICAL:
+        return content if content.startswith("(") else f"({content})"
+    if content_type == ContentType.DIALOGUE:
+        return content
+    if content_type == ContentType.TRANSITION:
+        return content if content == content.upper() and content.endswith("TO:") else "> " + content
+    # action, shots and plain text: force action where the paragraph would otherwise read as another element,
+    # e.g. a heading or transition line, or a first line in capitals followed by more, which reads as dialogue
+    lines = content.split("\n")
+    first = lines[0]
+    if content.strip() and (first.startswith(("!", ".", ">")) or SCENE_HEADING.match(first)
+                            or (content == content.upper() if len(lines) == 1 else _is_character(first))):
+        return "!" + content
+    return content
+
+
+def export_fountain(title: str, rows: Iterable[Tuple[ContentType, Optional[str]]]) -> Iterator[str]:
+    """
+    Render elements as Fountain (https://fountain.io). Elements are separated by blank lines,
+    except within a dialogue block (character, parentheticals and dialogue).
+    Fountain has no character cue without dialogue, such a character element reads back as action.
+    """
+    yield f"Title: {title}\n\n"
+    previous = None
+    for content_type, content in rows:
+        if previous is not None:
+            in_dialogue = content_type in DIALOGUE_TYPES[1:] and previous in DIALOGUE_TYPES
+            yield "\n" if in_dialogue else "\n\n"
+        yield _format(content_type, content or "")
+        previous = content_type
+    yield "\n"
+
+
+SCENE_HEADING = re.compile(r"^(INT|EXT|EST|INT\./EXT|INT/EXT|I/E)[. ]", re.IGNORECASE)
+SCENE_NUMBER = re.compile(r"\s*#[^#]*#\s*$")
+TITLE_PAGE_KEY = re.compile(r"^([A-Za-z][A-Za-z ]*):(.*)$")
+NOTE = re.compile(r"\[\[.*?\]\]", re.DOTALL)
+
+
+def _paragraphs(lines: Iterable[str]) -> Iterator[List[str]]:
+    """
+    Group lines into blank-line separated paragraphs, dropping boneyard (/* */) sections.
+    A line of two spaces is kept as an intentional blank line inside a paragraph.
+    """
+    paragraph: List[str] = []
+    in_boneyard = False
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if in_boneyard:
+            if "*/" not in line:
+                continue
+            in_boneyard = False
+            line = line.split("*/", 1)[1]
+            if not line.strip():
+                continue
+        if "/*" in line:
+            before, after = line.split("/*", 1)
+            in_boneyard = "*/" not in after
+            line = before if in_boneyard else before + after.split("*/", 1)[1]
+            if not line.strip():
+                continue
+        if line.strip() or line == "  ":
+            paragraph.append(line)
+        elif paragraph:
+            yield paragraph
+            paragraph = []
+    if paragraph:
+        yield paragraph
+
+
+def _is_character(line: str) -> bool:
+    if line.startswith("@"):
+        return True
+    name = line.split("(")[0].rstrip(" ^")
+    return any(c.isalpha() for c in name) and name == name.upper()
+
+
+def _classify(paragraph: List[str]) -> Iterator[ParsedElement]:
+    text = NOTE.sub("", "\n".join(paragraph)).strip("\n")
+    lines = [line if line != "  " else "" for line in text.split("\n")]
+    if not lines or not any(line.strip() for line in lines):
+        return
+    first = lines[0].strip()
+    if first.startswith(("#", "=")) and (len(lines) == 1 or first.startswith("===")):
+        # sections, synopses and page breaks carry no screenplay content
+        return
+    if first.startswith("!"):
+        yield ParsedElement(ContentType.ACTION, "\n".join([first[1:]] + lines[1:]))
+        return
+    if len(lines) == 1:
+        if first.startswith(".") and not first.startswith(".."):
+            yield ParsedElement(ContentType.HEADING, SCENE_NUMBER.sub("", first[1:]).strip())
+            return
+        if SCENE_HEADING.match(first):
+            yield ParsedElement(ContentType.HEADING, SCENE_NUMBER.sub("", first).strip())
+            return
+        if first.startswith(">") and not first.endswith("<"):
+            yield ParsedElement(ContentType.TRANSITION, first[1:].strip())
+            return
+        if first == first.upper() and first.endswith("TO:"):
+            yield ParsedElement(ContentType.TRANSITION, first)
+            return
+    if len(lines) > 1 and _is_character(first):
+        yield ParsedElement(ContentType.CHARACTER, first.lstrip("@").rstrip(" ^"))
+        dialogue: List[str] = []
+        for line in lines[1:]:
+            if line.strip().startswith("("):
+                if dialogue:
+                    yield ParsedElement(ContentType.DIALOGUE, "\n".join(dialogue))
+                    dialogue = []
+                yield ParsedElement(ContentType.PARENTHETICAL, line.strip())
+            else:
+                dialogue.append(line.strip())
+        if dialogue:
+            yield ParsedElement(ContentType.DIALOGUE, "\n".join(dialogue))
+        return
+    if first.startswith(">") and first.endswith("<"):
+        lines[0] = first[1:-1].strip()
+    yield ParsedElement(ContentType.ACTION, "\n".join(lines))
+
+
+def parse_fountain(lines: Iterable[str]) -> Tuple[Optional[str], Iterator[ParsedElement]]:
+    """
+    Parse Fountain text one paragraph at a time. The title page is read right away, the returned
+    iterator parses the rest of the document lazily.
+    """
+    paragraphs = _paragraphs(lines)
+    first = next(paragraphs, None)
+    title = None
+    if first is not None and TITLE_PAGE_KEY.match(first[0]) and not SCENE_HEADING.match(first[0]):
+        current_key = None
+        for line in first:
+            match = TITLE_PAGE_KEY.match(line)
+            if match:
+                current_key = match.group(1).strip().lower()
+                if current_key == "title" and match.group(2).strip():
+                    title = match.group(2).strip()
+            elif current_key == "title" and title is None and line.strip():
+                title = line.strip()
+        first = None
+
+    def elements() -> Iterator[ParsedElement]:
+        if first is not None:
+            yield from _classify(first)
+        for paragraph in paragraphs:
+            yield from _classify(paragraph)
+
+    return title, elements()
@@ -0,0 +1,47 @@
+import textwrap
+from typing import Iterable, Iterator, Optional, Tuple
+
+from models.editor_elements import ContentType
+
+# (indent, width) in characters of 12pt Courier, measured from the left margin, for a standard screenplay page
+LAYOUT = {
+    ContentType.HEADING: (0, 60),
+    ContentType.ACTION: (0, 60),
+    ContentType.CHARACTER: (22, 38),
+    ContentType.PARENTHETICAL: (16, 25),
+    ContentType.DIALOGUE: (10, 35),
+    ContentType.SHOT: (0, 60),
+    ContentType.TRANSITION: (45, 15),
+    ContentType.TEXT: (0, 60),
+}
+UPPERCASE_TYPES = (ContentType.HEADING, ContentType.CHARACTER, ContentType.SHOT, ContentType.TRANSITION)
+DIALOGUE_TYPES = (ContentType.CHARACTER, ContentType.PARENTHETICAL, ContentType.DIALOGUE)
+
+
+def wrap(content_type: ContentType, content: str) -> Iterator[str]:
+    """
+    Lines of an element as they appear on the page, without indentation.
+    """
+    _, width = LAYOUT.get(content_type, LAYOUT[ContentType.TEXT])
+    if content_type in UPPERCASE_TYPES:
+        content = content.upper()
+    elif content_type == ContentType.PARENTHETICAL and not content.startswith("("):
+        content = f"({content})"
+    for paragraph in content.splitlines() or [""]:
+        yield from textwrap.wrap(paragraph, width) or [""]
+
+
+def export_text(title: str, rows: Iterable[Tuple[ContentType, Optional[str]]]) -> Iterator[str]:
+    """
+    Render elements as plain text laid out like a screenplay page, in a monospaced font.
+    """
+    yield f"{title.upper()}\n\n"
+    previous = None
+    for content_type, content in rows:
+        if previous is not None:
+            in_dialogue = content_type in DIALOGUE_TYPES[1:] and previous in DIALOGUE_TYPES
+            yield "\n" if in_dialogue else "\n\n"
+        indent = " " * LAYOUT.get(content_type, LAYOUT[ContentType.TEXT])[0]
+        yield "\n".join(indent + line for line in wrap(content_type, content or ""))
+        previous = content_type
+    yield "\n"
@@ -0,0 +1,123 @@
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Operations of the revision log, as compact lists:
+#   [INSERT, id, after_id, content_type, content]
+#   [UPDATE, id, content_type or None, splice of the content or None]
+#   [DELETE, id]
+#   [MOVE, id, after_id]
+#   [METADATA, {"name": ..., "description": ...}] with the changed fields only
+# Inserts and moves are anchored on element ids like `EditorElementOperation`, positions are not logged.
+INSERT = "i"
+UPDATE = "u"
+DELETE = "d"
+MOVE = "m"
+METADATA = "n"
+
+# payloads smaller than this are stored as plain JSON, compression would not make them smaller
+COMPRESSION_MINIMUM_SIZE = 128
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 9
+
+
+def pack(value: Any) -> Tuple[str, bytes]:
+    """
+    JSON encode and compress a snapshot or a list of operations, with zstd if the zstandard package is
+    installed and zlib otherwise. Returns the encoding, to be stored next to the data, and the data.
+    """
+    data = orjson.dumps(value)
+    if len(data) < COMPRESSION_MINIMUM_SIZE:
+        return "json", data
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, ZLIB_LEVEL)
+
+
+def unpack(encoding: str, data: bytes) -> Any:
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading zstd compressed revisions requires the zstandard package")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == "zlib":
+        data = zlib.decompress(data)
+    return orjson.loads(data)
+
+
+def splice(old: Optional[str], new: str) -> List[Any]:
+    """
+    `[start, deleted, inserted]` turning `old` into `new`: the characters between their common prefix and
+    suffix. Typing in a long element logs only the typed text.
+    """
+    old = old or ""
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[-end - 1] == new[-end - 1]:
+        end += 1
+    return [start, len(old) - start - end, new[start:len(new) - end]]
+
+
+def apply_splice(old: Optional[str], change: List[Any]) -> str:
+    old = old or ""
+    start, deleted, inserted = change
+    return old[:start] + inserted + old[start + deleted:]
+
+
+def document(name: str, description: Optional[str], elements: List[List[Any]]) -> Dict[str, Any]:
+    """
+    Snapshot of a screenplay: its metadata and `[id, content_type, content]` of its elements in position order.
+    """
+    return {"name": name, "description": description, "elements": elements}
+
+
+def replay(snapshot: Dict[str, Any], operations: List[List[Any]]) -> Dict[str, Any]:
+    """
+    Apply logged operations to a snapshot, in place.
+    """
+    elements = snapshot["elements"]
+    # updates, the bulk of the log, find their element without scanning the list
+    by_id = {element[0]: element for element in elements}
+
+    def index(element_id: int) -> int:
+        for i, element in enumerate(elements):
+            if element[0] == element_id:
+                return i
+        raise ValueError(f"Element {element_id} is not in the revision")
+
+    def after(after_id: Optional[int]) -> int:
+        return 0 if after_id is None else index(after_id) + 1
+
+    for operation in operations:
+        code = operation[0]
+        if code == INSERT:
+            _, element_id, after_id, content_type, content = operation
+            element = [element_id, content_type, content]
+            elements.insert(after(after_id), element)
+            by_id[element_id] = element
+        elif code == UPDATE:
+            _, element_id, content_type, change = operation
+            element = by_id.get(element_id)
+            if element is None:
+                raise ValueError(f"Element {element_id} is not in the revision")
+            if content_type is not None:
+                element[1] = content_type
+            if change is not None:
+                element[2] = apply_splice(element[2], change)
+        elif code == DELETE:
+            del elements[index(operation[1])]
+            del by_id[operation[1]]
+        elif code == MOVE:
+            element = elements.pop(index(operation[1]))
+            elements.insert(after(operation[2]), element)
+        elif code == METADATA:
+            snapshot.update(operation[1])
+    return snapshot
@@ -0,0 +1,234 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from core.config import settings
+from core.formats.text import DIALOGUE_TYPES, wrap
+from models.editor_elements import ContentType
+
+# element types that may run over onto the next page; the others move to the next page as a whole
+SPLITTABLE_TYPES = (ContentType.ACTION, ContentType.TEXT)
+# element types that must not end a page
+KEEP_WITH_NEXT_TYPES = (ContentType.HEADING, ContentType.SHOT)
+
+
+class ElementRow(NamedTuple):
+    id: int
+    content_type: ContentType
+    updated_at: Optional[datetime]
+    position: Optional[int]
+
+
+class Block(NamedTuple):
+    """
+    Elements that are laid out together: a dialogue group (character, parentheticals and dialogue)
+    or a single element. `parts` holds the id, type and number of lines of each element.
+    """
+    parts: Tuple[Tuple[int, ContentType, int], ...]
+    height: int
+    dialogue: bool
+
+
+class PageBreak(NamedTuple):
+    page: int
+    element_id: int
+    position: Optional[int]
+    # lines of the element that are on the previous page
+    line: int
+    # dialogue continued with (MORE) and (CONT'D)
+    continued: bool
+
+
+class Pagination(NamedTuple):
+    page_count: int
+    breaks: List[PageBreak]
+
+
+class LayoutCache:
+    """
+    Thread-safe LRU cache of laid out scenes, keyed by `scene_key`.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._items: "OrderedDict[str, List[Block]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[Block]]:
+        with self._lock:
+            blocks = self._items.get(key)
+            if blocks is not None:
+                self._items.move_to_end(key)
+            return blocks
+
+    def set(self, key: str, blocks: List[Block]) -> None:
+        with self._lock:
+            self._items[key] = blocks
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+scene_cache = LayoutCache(settings.LAYOUT_CACHE_SIZE)
+
+
+def split_scenes(rows: Iterable[ElementRow]) -> List[List[ElementRow]]:
+    """
+    Group elements into scenes, each starting at a HEADING. Elements before the first heading form a scene of their own.
+    """
+    scenes: List[List[ElementRow]] = []
+    for row in rows:
+        if not scenes or row.content_type == ContentType.HEADING:
+            scenes.append([])
+        scenes[-1].append(row)
+    return scenes
+
+
+def scene_key(scene: Sequence[ElementRow]) -> str:
+    """
+    Changes whenever an element of the scene is added, removed, reordered or edited.
+    Positions are left out so that respacing a screenplay keeps its layout cached.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for row in scene:
+        updated_at = row.updated_at.isoformat() if row.updated_at else ""
+        digest.update(f"{row.id}:{row.content_type.value}:{updated_at};".encode())
+    return digest.hexdigest()
+
+
+def layout_scene(elements: Iterable[Tuple[int, ContentType, Optional[str]]]) -> List[Block]:
+    """
+    Wrap the elements of a scene into lines and group them into blocks.
+    """
+    blocks: List[Block] = []
+    group: List[Tuple[int, ContentType, int]] = []
+    for element_id, content_type, content in elements:
+        part = (element_id, content_type, len(list(wrap(content_type, content or ""))))
+        if content_type in DIALOGUE_TYPES[1:] and group:
+            group.append(part)
+            continue
+        if group:
+            blocks.append(_block(group, dialogue=True))
+            group = []
+        if content_type in DIALOGUE_TYPES:
+            group.append(part)
+        else:
+            blocks.append(_block([part], dialogue=False))
+    if group:
+        blocks.append(_block(group, dialogue=True))
+    return blocks
+
+
+def _block(parts: List[Tuple[int, ContentType, int]], dialogue: bool) -> Block:
+    return Block(tuple(parts), sum(part[2] for part in parts), dialogue)
+
+
+def _lines(parts: Iterable[Tuple[int, ContentType, int]]) -> List[Tuple[int, ContentType, int, int]]:
+    # (element id, type, line index, line count) for every line of a block
+    return [(element_id, content_type, index, count)
+            for element_id, content_type, count in parts for index in range(count)]
+
+
+def _can_break(lines: List[Tuple[int, ContentType, int, int]], k: int, dialogue: bool) -> bool:
+    """
+    Whether a page may end after the first `k` lines of a block.
+    """
+    before, after = lines[k - 1], lines[k]
+    if before[0] == after[0] and (after[2] < 2 or after[3] - after[2] < 2):
+        # at least two lines of a split element on either page
+        return False
+    if dialogue:
+        return before[1] == ContentType.DIALOGUE
+    return before[0] != after[0] or before[1] in SPLITTABLE_TYPES
+
+
+def flow(blocks: Sequence[Block], lines_per_page: int) -> List[Tuple[int, int, int, bool]]:
+    """
+    Fill pages with blocks, separated by one blank line. A page is ended early rather than leave a
+    heading at its bottom, split an element before its second or last two lines, or break dialogue
+    anywhere but inside or after a line of dialogue; broken dialogue costs a (MORE) line at the bottom
+    of the page and a CHARACTER (CONT'D) line at the top of the next one.
+    Returns `(page, element id, line, continued)` for the first line of every page after the first.
+    """
+    breaks = []
+    page, used = 1, 0
+    for i, block in enumerate(blocks):
+        gap = 1 if used else 0
+        need = block.height
+        if block.parts[-1][1] in KEEP_WITH_NEXT_TYPES and i + 1 < len(blocks):
+            following = blocks[i + 1]
+            need += 1 + min(following.height, 2)
+        if used + gap + need <= lines_per_page:
+            used += gap + block.height
+            continue
+        if used and block.height <= lines_per_page and block.parts[0][1] not in SPLITTABLE_TYPES + DIALOGUE_TYPES:
+            page += 1
+            breaks.append((page, block.parts[0][0], 0, False))
+            used = block.height
+            continue
+        lines = _lines(block.parts)
+        continued = False
+        # nothing on the page yet but a CONT'D line
+        fresh = not used
+        while True:
+            gap = 0 if fresh else 1
+            room = lines_per_page - used - gap
+            if len(lines) <= room:
+                used += gap + len(lines)
+                break
+            more = 1 if block.dialogue and block.parts[0][1] == ContentType.CHARACTER else 0
+            k = next((k for k in range(min(room - more, len(lines) - 1), 0, -1)
+                      if _can_break(lines, k, block.dialogue)), None)
+            if k is None and fresh:
+                # does not fit on an empty page either, cut it where it overflows
+                k = max(room - more, 1)
+            if k is None:
+                page += 1
+                breaks.append((page, lines[0][0], lines[0][2], continued))
+            else:
+                page += 1
+                continued = bool(more)
+                breaks.append((page, lines[k][0], lines[k][2], continued))
+                lines = lines[k:]
+            used = 1 if continued else 0
+            fresh = True
+    return breaks
+
+
+def paginate(
+        rows: Sequence[ElementRow],
+        load_content: Callable[[List[int]], Dict[int, Optional[str]]],
+        *,
+        lines_per_page: Optional[int] = None,
+        cache: LayoutCache = scene_cache,
+) -> Pagination:
+    """
+    Paginate a screenplay given its elements in order, without their content. Scenes whose key is cached
+    are not laid out again; `load_content` is called once with the ids of the elements of all other scenes.
+    """
+    lines_per_page = lines_per_page or settings.LAYOUT_LINES_PER_PAGE
+    if not rows:
+        return Pagination(0, [])
+    scenes = [(scene_key(scene), scene) for scene in split_scenes(rows)]
+    layouts = {key: cache.get(key) for key, _ in scenes}
+    missing = [row.id for key, scene in scenes if layouts[key] is None for row in scene]
+    if missing:
+        contents = load_content(missing)
+        for key, scene in scenes:
+            if layouts[key] is None:
+                layouts[key] = layout_scene((row.id, row.content_type, contents.get(row.id)) for row in scene)
+                cache.set(key, layouts[key])
+
+    blocks = [block for key, _ in scenes for block in layouts[key]]
+    positions = {row.id: row.position for row in rows}
+    breaks = [
+        PageBreak(page, element_id, positions.get(element_id), line, continued)
+        for page, element_id, line, continued in flow(blocks, lines_per_page)
+    ]
+    return Pagination(breaks[-1].page if breaks else 1, breaks)
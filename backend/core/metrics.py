@@ -0,0 +1,193 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# requests that did not match a route share one label value, so that scanners cannot inflate the series count
+UNMATCHED_ROUTE = "unmatched"
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to respond to HTTP requests, by route template.", ["method", "route"])
+REQUESTS = Counter("http_requests_total", "HTTP requests answered, by route template and status.",
+                   ["method", "route", "status"])
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served.")
+
+REQUEST_QUERIES = Histogram(
+    "db_request_queries", "Database queries executed per HTTP request.", ["method", "route"], buckets=QUERY_BUCKETS)
+REQUEST_DB_SECONDS = Histogram(
+    "db_request_seconds", "Time spent executing database queries per HTTP request.", ["method", "route"])
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time to get a connection from the pool, opening one included.", ["pool"],
+    buckets=FAST_BUCKETS)
+
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds", "Time bcrypt spends hashing or verifying a password, queueing excluded.",
+    ["operation"])
+PASSWORD_HASH_QUEUE = Gauge("password_hash_queue_depth", "Password hash and verify operations not finished yet.")
+SERIALIZATION_SECONDS = Histogram(
+    "serialization_seconds", "Time to encode response bodies and messages.", ["format"], buckets=FAST_BUCKETS)
+
+
+class QueryStats:
+    __slots__ = ("count", "seconds", "parent")
+
+    def __init__(self, parent: Optional["QueryStats"] = None) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        # queries counted here count in the enclosing stats too, e.g. a benchmark's around the middleware's
+        self.parent = parent
+
+
+# the object is shared with the threadpool, where sync routes run, through the copied context
+_request_queries: ContextVar[Optional[QueryStats]] = ContextVar("request_queries", default=None)
+
+
+def record_query(seconds: float) -> None:
+    """
+    Account a query to the current request. Called by the engine event hooks of `database.session`.
+    """
+    stats = _request_queries.get()
+    while stats is not None:
+        stats.count += 1
+        stats.seconds += seconds
+        stats = stats.parent
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """
+    Count the queries executed in the block, in this context and the tasks and threads started from it.
+    """
+    stats = QueryStats(_request_queries.get())
+    token = _request_queries.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_queries.reset(token)
+
+
+def record_pool_checkout(pool: str, seconds: float) -> None:
+    POOL_CHECKOUT_WAIT.labels(pool).observe(seconds)
+
+
+class PoolCollector:
+    """
+    Size, connections in use and overflow of SQLAlchemy connection pools, read when scraped.
+    """
+
+    def __init__(self) -> None:
+        self.pools: Dict[str, Any] = {}
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        families = {
+            "size": GaugeMetricFamily("db_pool_size", "Connections the pool keeps open.", labels=["pool"]),
+            "checkedout": GaugeMetricFamily("db_pool_checked_out", "Connections in use.", labels=["pool"]),
+            "overflow": GaugeMetricFamily(
+                "db_pool_overflow", "Connections opened beyond the pool size; negative while the pool fills up.",
+                labels=["pool"]),
+        }
+        for name, engine in self.pools.items():
+            pool = engine.pool
+            for attribute, family in families.items():
+                method = getattr(pool, attribute, None)
+                if method is not None:
+                    family.add_metric([name], method())
+        return list(families.values())
+
+
+class StatsCollector:
+    """
+    Exposes the numeric values of a `stats()` dict, e.g. of the cache or the purge, as gauges named `prefix_key`.
+    """
+
+    def __init__(self, prefix: str, stats: Callable[[], Dict[str, Any]], documentation: str) -> None:
+        self.prefix = prefix
+        self.stats = stats
+        self.documentation = documentation
+
+    def collect(self) -> List[GaugeMetricFamily]:
+        return [
+            GaugeMetricFamily(f"{self.prefix}_{key}", f"{self.documentation}: {key}.", value=value)
+            for key, value in self.stats().items() if isinstance(value, (int, float))
+        ]
+
+
+pool_collector = PoolCollector()
+REGISTRY.register(pool_collector)
+
+
+def register_pool(name: str, engine: Any) -> None:
+    pool_collector.pools[name] = engine
+
+
+def register_stats(prefix: str, stats: Callable[[], Dict[str, Any]], documentation: str) -> None:
+    REGISTRY.register(StatsCollector(prefix, stats, documentation))
+
+
+class MetricsMiddleware:
+    """
+    Latency, status, in-flight requests and database queries of HTTP requests, labelled with the route template
+    (e.g. `/api/v1/screenplays/{id}`) rather than the path. Should be the outermost middleware, so that
+    compression is part of the latency.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._routes: Dict[Any, str] = {}
+
+    def route(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        if endpoint not in self._routes:
+            # the router records the matched endpoint in the scope, routes are looked up once per endpoint
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    self._routes[endpoint] = route.path
+                    break
+            else:
+                return UNMATCHED_ROUTE
+        return self._routes[endpoint]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            with count_queries() as queries:
+                await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started
+            REQUESTS_IN_PROGRESS.dec()
+            method, route = scope["method"], self.route(scope)
+            REQUEST_DURATION.labels(method, route).observe(duration)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            REQUEST_QUERIES.labels(method, route).observe(queries.count)
+            REQUEST_DB_SECONDS.labels(method, route).observe(queries.seconds)
+
+
+async def scrape(request: Request) -> Response:
+    """
+    Prometheus exposition of the metrics of this worker process.
+    """
+    # CONTENT_TYPE_LATEST names the charset already
+    return Response(generate_latest(REGISTRY), headers={"Content-Type": CONTENT_TYPE_LATEST})
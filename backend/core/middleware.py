@@ -0,0 +1,259 @@
+import zlib
+from contextvars import ContextVar
+from datetime import date, datetime, time
+from enum import Enum
+from typing import Any, Mapping, Optional
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+COMPRESSIBLE_MEDIA_TYPES = ("application/json", "application/xml", MSGPACK_MEDIA_TYPE, "text/")
+# bodies at least this large are compressed in the threadpool instead of blocking the event loop
+THREADPOOL_COMPRESSION_SIZE = 256 * 1024
+
+_msgpack_requested: ContextVar[bool] = ContextVar("msgpack_requested", default=False)
+
+
+def msgpack_requested() -> bool:
+    """
+    Whether the current request prefers MessagePack over JSON, as negotiated by `ContentNegotiationMiddleware`.
+    """
+    return _msgpack_requested.get()
+
+
+def encode_json(content: Any) -> bytes:
+    # integer keys, e.g. temporary element ids, become strings as with the stdlib encoder
+    with metrics.SERIALIZATION_SECONDS.labels("json").time():
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _msgpack_default(value: Any) -> Any:
+    # the same representation as in JSON
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not MessagePack serializable")
+
+
+def encode_msgpack(content: Any) -> bytes:
+    with metrics.SERIALIZATION_SECONDS.labels("msgpack").time():
+        return msgpack.packb(content, use_bin_type=True, default=_msgpack_default)
+
+
+def transcode(body: bytes) -> bytes:
+    """
+    MessagePack encoding of a JSON document.
+    """
+    return encode_msgpack(orjson.loads(body))
+
+
+class APIResponse(ORJSONResponse):
+    """
+    Default response class: JSON encoded with orjson, or MessagePack when the client asked for it.
+    """
+
+    def __init__(
+            self,
+            content: Any = None,
+            status_code: int = 200,
+            headers: Optional[Mapping[str, str]] = None,
+            media_type: Optional[str] = None,
+            background: Optional[BackgroundTask] = None,
+    ) -> None:
+        if media_type is None and msgpack_requested():
+            media_type = MSGPACK_MEDIA_TYPE
+        super().__init__(content, status_code, headers, media_type, background)
+
+    def render(self, content: Any) -> bytes:
+        if self.media_type == MSGPACK_MEDIA_TYPE:
+            return encode_msgpack(content)
+        return encode_json(content)
+
+
+def _accepted(header: str) -> Mapping[str, float]:
+    """
+    Quality of every item of an `Accept` or `Accept-Encoding` header.
+    """
+    accepted = {}
+    for item in header.split(","):
+        value, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if value:
+            accepted[value.lower()] = max(quality, accepted.get(value.lower(), 0.0))
+    return accepted
+
+
+def prefers_msgpack(accept: str) -> bool:
+    accepted = _accepted(accept)
+    msgpack_quality = max((accepted.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES), default=0.0)
+    json_quality = max(accepted.get(media_type, 0.0) for media_type in ("application/json", "application/*", "*/*"))
+    return msgpack_quality > 0 and msgpack_quality >= json_quality
+
+
+class ContentNegotiationMiddleware:
+    """
+    Let `APIResponse` answer in MessagePack to requests that prefer it in their `Accept` header.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        if msgpack is None:
+            raise RuntimeError("MSGPACK_ENABLED requires the msgpack package")
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_vary(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).add_vary_header("Accept")
+            await send(message)
+
+        token = _msgpack_requested.set(prefers_msgpack(Headers(scope=scope).get("accept", "")))
+        try:
+            await self.app(scope, receive, send_with_vary)
+        finally:
+            _msgpack_requested.reset(token)
+
+
+class _BrotliCompressor:
+
+    def __init__(self, quality: int) -> None:
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compress responses of at least `minimum_size` bytes with brotli, if enabled with `brotli_quality`, or gzip,
+    whichever the client accepts. Streaming responses are compressed chunk by chunk.
+    """
+
+    def __init__(
+            self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: Optional[int] = None
+    ) -> None:
+        if brotli_quality is not None and brotli is None:
+            raise RuntimeError("COMPRESSION_BROTLI_ENABLED requires the brotli package")
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = _accepted(accept_encoding)
+        if self.brotli_quality is not None and accepted.get("br", 0.0) > 0:
+            return "br"
+        if accepted.get("gzip", 0.0) > 0:
+            return "gzip"
+        return None
+
+    def compressor(self, encoding: str) -> Any:
+        if encoding == "br":
+            return _BrotliCompressor(self.brotli_quality)
+        return zlib.compressobj(self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = None
+        if scope["type"] == "http":
+            encoding = self.choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await CompressionResponder(self, encoding, send)(scope, receive)
+
+
+class CompressionResponder:
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.initial_message: Message = {}
+        self.compressor: Any = None
+        self.started = False
+
+    async def __call__(self, scope: Scope, receive: Receive) -> None:
+        await self.middleware.app(scope, receive, self.send_compressed)
+
+    def _compressible(self, body: bytes, more_body: bool) -> bool:
+        headers = Headers(raw=self.initial_message["headers"])
+        if "content-encoding" in headers or self.initial_message["status"] in (204, 304):
+            return False
+        if not headers.get("content-type", "").startswith(COMPRESSIBLE_MEDIA_TYPES):
+            return False
+        return more_body or len(body) >= self.middleware.minimum_size
+
+    def _compress_all(self, body: bytes) -> bytes:
+        return self.compressor.compress(body) + self.compressor.flush()
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # hold the headers back until the first body chunk shows whether to compress
+            self.initial_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if not self.started:
+            self.started = True
+            if not self._compressible(body, more_body):
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+            self.compressor = self.middleware.compressor(self.encoding)
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                message["body"] = self.compressor.compress(body)
+            else:
+                if len(body) >= THREADPOOL_COMPRESSION_SIZE:
+                    body = await run_in_threadpool(self._compress_all, body)
+                else:
+                    body = self._compress_all(body)
+                headers["Content-Length"] = str(len(body))
+                message["body"] = body
+            await self.send(self.initial_message)
+            await self.send(message)
+        elif self.compressor is None:
+            await self.send(message)
+        else:
+            message["body"] = self.compressor.compress(body)
+            if not more_body:
+                message["body"] += self.compressor.flush()
+            await self.send(message)
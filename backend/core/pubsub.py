@@ -0,0 +1,157 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Set
+
+from core.config import settings
+
+
+class Subscription:
+    """
+    Messages published to a channel after subscribing, in order, as an async iterator.
+    A subscriber that falls `maxsize` messages behind is dropped: iteration ends and `overflowed` is set,
+    and the subscriber has to catch up by other means.
+    """
+
+    def __init__(self, bus: "PubSub", channel: str, maxsize: int) -> None:
+        self.bus = bus
+        self.channel = channel
+        self.overflowed = False
+        self._queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize + 1)
+        self._maxsize = maxsize
+        self._closed = False
+
+    def deliver(self, message: bytes) -> None:
+        if self._closed:
+            return
+        if self._queue.qsize() >= self._maxsize:
+            self.overflowed = True
+            self._end()
+            return
+        self._queue.put_nowait(message)
+
+    def _end(self) -> None:
+        # the queue has room for one more item, the end marker
+        self._closed = True
+        self._queue.put_nowait(None)
+
+    async def close(self) -> None:
+        if not self._closed:
+            self._end()
+        await self.bus.unsubscribe(self)
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> bytes:
+        message = await self._queue.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+
+class PubSub(ABC):
+    """
+    Fan-out of byte string messages to the subscribers of a channel.
+    """
+
+    def __init__(self, maxsize: int = 1000) -> None:
+        self.maxsize = maxsize
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+
+    @abstractmethod
+    async def publish(self, channel: str, message: bytes) -> None:
+        pass
+
+    async def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(self, channel, self.maxsize)
+        self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.channel, set())
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            self._subscriptions.pop(subscription.channel, None)
+
+    def deliver(self, channel: str, message: bytes) -> None:
+        for subscription in list(self._subscriptions.get(channel, ())):
+            subscription.deliver(message)
+
+
+class MemoryPubSub(PubSub):
+    """
+    Delivers to the subscribers of this process only, for a single node.
+    """
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        self.deliver(channel, message)
+
+
+class RedisPubSub(PubSub):
+    """
+    Delivers to the subscribers of every process through Redis pub/sub, or anything speaking its protocol.
+    `client` needs the `publish` and `pubsub` methods of a `redis.asyncio.Redis` client. The process holds one
+    Redis subscription per channel with local subscribers and dispatches its messages to them.
+    """
+
+    def __init__(self, client: Any, maxsize: int = 1000, prefix: str = "screenplay:") -> None:
+        super().__init__(maxsize)
+        self.client = client
+        self.prefix = prefix
+        self._pubsub: Any = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_url(cls, url: str, maxsize: int) -> "RedisPubSub":
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError("PUBSUB_BACKEND=redis requires the redis package")
+        return cls(redis.asyncio.Redis.from_url(url), maxsize)
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self.client.publish(self.prefix + channel, message)
+
+    async def subscribe(self, channel: str) -> Subscription:
+        async with self._lock:
+            if self._pubsub is None:
+                self._pubsub = self.client.pubsub()
+            if channel not in self._subscriptions:
+                await self._pubsub.subscribe(self.prefix + channel)
+            subscription = await super().subscribe(channel)
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read())
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        async with self._lock:
+            await super().unsubscribe(subscription)
+            if subscription.channel not in self._subscriptions:
+                await self._pubsub.unsubscribe(self.prefix + subscription.channel)
+
+    async def _read(self) -> None:
+        # ends when the last channel is unsubscribed
+        async for message in self._pubsub.listen():
+            if message["type"] == "message":
+                channel = message["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                self.deliver(channel[len(self.prefix):], message["data"])
+
+
+def create_bus() -> PubSub:
+    if settings.PUBSUB_BACKEND == "redis":
+        return RedisPubSub.from_url(settings.PUBSUB_REDIS_URL, settings.PUBSUB_MAX_PENDING)
+    return MemoryPubSub(settings.PUBSUB_MAX_PENDING)
+
+
+bus = create_bus()
+
+
+async def publish(channel: str, message: bytes) -> None:
+    await bus.publish(channel, message)
+
+
+async def subscribe(channel: str) -> Subscription:
+    return await bus.subscribe(channel)
@@ -0,0 +1,191 @@
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Set, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# fingerprints longer than this are shortened in reports
+FINGERPRINT_REPORT_LENGTH = 200
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|\$\d+|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    The statement with parameters, literals and expanded IN lists replaced, so that executions of the same query
+    with different values, e.g. a lazy load per row, share a fingerprint.
+    """
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _VALUE_LIST.sub("(?)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class QueryBudgetExceeded(Exception):
+
+    def __init__(self, recorder: "QueryRecorder", violations: List[str]) -> None:
+        self.recorder = recorder
+        self.violations = violations
+        super().__init__(f"{recorder.method} {recorder.path}: " + "; ".join(violations))
+
+
+class QueryRecorder:
+    """
+    Statements issued during one request, and the budget the route declared with `QueryBudget`.
+    """
+
+    def __init__(self, method: str, path: str, max_queries: int, max_repeats: int) -> None:
+        self.method = method
+        self.path = path
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.statements: List[str] = []
+        # statements recorded in the current `batches` block
+        self.batched: Optional[Set[str]] = None
+
+    def fingerprints(self) -> List[Tuple[str, int]]:
+        """
+        Fingerprints of the statements with their number of executions, most repeated first.
+        """
+        return Counter(fingerprint(statement) for statement in self.statements).most_common()
+
+    def violations(self) -> List[str]:
+        violations = []
+        if len(self.statements) > self.max_queries:
+            violations.append(f"{len(self.statements)} queries, budget {self.max_queries}")
+        for statement, count in self.fingerprints():
+            if count <= self.max_repeats:
+                break
+            violations.append(
+                f"{count} executions of {statement[:FINGERPRINT_REPORT_LENGTH]}, allowed {self.max_repeats}")
+        return violations
+
+
+_recorder: ContextVar[Optional[QueryRecorder]] = ContextVar("query_recorder", default=None)
+# modes of the enclosing `enforce` blocks with the requests they caught, innermost last; process-wide rather than a
+# context variable, because the test client serves requests on another thread
+_enforced: List[Tuple[str, List[QueryRecorder]]] = []
+
+
+def record(statement: str) -> None:
+    """
+    Add a statement to the current request. Called by the engine event hooks of `database.session`.
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        return
+    if recorder.batched is not None:
+        if statement in recorder.batched:
+            return
+        recorder.batched.add(statement)
+    recorder.statements.append(statement)
+
+
+@contextmanager
+def batches() -> Iterator[None]:
+    """
+    Count each statement executed in the block once, e.g. the INSERT run for every batch of rows of a bulk insert,
+    whose executions grow with the input by design rather than through an N+1 pattern.
+    """
+    recorder = _recorder.get()
+    if recorder is None or recorder.batched is not None:
+        yield
+        return
+    recorder.batched = set()
+    try:
+        yield
+    finally:
+        recorder.batched = None
+
+
+class QueryBudget:
+    """
+    Dependency declaring how many queries the routes of a router may issue, e.g.
+    `include_router(router, dependencies=[Depends(QueryBudget(10))])`, and how often the same statement may be
+    repeated, which beyond a few executions usually is an N+1 pattern. A budget declared on a route overrides
+    that of its router. Without `QueryBudgetMiddleware` it does nothing.
+    """
+
+    def __init__(self, max_queries: int, max_repeats: Optional[int] = None) -> None:
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+
+    async def __call__(self) -> None:
+        recorder = _recorder.get()
+        if recorder is not None:
+            recorder.max_queries = self.max_queries
+            if self.max_repeats is not None:
+                recorder.max_repeats = self.max_repeats
+
+
+@contextmanager
+def enforce(mode: str = "raise") -> Iterator[List[QueryRecorder]]:
+    """
+    Check the budgets of the requests served in the block in `mode`, whatever `QUERY_BUDGET_MODE` is, and collect
+    the recorders of those over budget, e.g. in tests:
+
+        with query_budget.enforce():
+            client.patch(...)  # raises QueryBudgetExceeded if the route went over its budget
+    """
+    if mode not in ("log", "raise"):
+        raise ValueError(f"Unknown query budget mode {mode!r}")
+    exceeded: List[QueryRecorder] = []
+    _enforced.append((mode, exceeded))
+    try:
+        yield exceeded
+    finally:
+        _enforced.pop()
+
+
+class QueryBudgetMiddleware:
+    """
+    Record the statements of every HTTP request and, once the response starts, log a warning or raise
+    `QueryBudgetExceeded` if the route went over its budget. Raising turns the response into a 500 and makes
+    the test client re-raise the exception, so that tests fail on query count regressions. In mode "off"
+    requests are only checked within `enforce`.
+    Queries of streaming bodies and background tasks are not checked.
+    """
+
+    def __init__(self, app: ASGIApp, mode: str = "log", max_queries: int = 50, max_repeats: int = 5) -> None:
+        if mode not in ("off", "log", "raise"):
+            raise ValueError(f"Unknown query budget mode {mode!r}")
+        self.app = app
+        self.mode = mode
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        mode, exceeded = _enforced[-1] if _enforced else (self.mode, None)
+        if scope["type"] != "http" or mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        recorder = QueryRecorder(scope["method"], scope["path"], self.max_queries, self.max_repeats)
+
+        async def send_checked(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                self.check(recorder, mode, exceeded)
+            await send(message)
+
+        token = _recorder.set(recorder)
+        try:
+            await self.app(scope, receive, send_checked)
+        finally:
+            _recorder.reset(token)
+
+    @staticmethod
+    def check(recorder: QueryRecorder, mode: str, exceeded: Optional[List[QueryRecorder]] = None) -> None:
+        violations = recorder.violations()
+        if not violations:
+            return
+        if exceeded is not None:
+            exceeded.append(recorder)
+        if mode == "raise":
+            raise QueryBudgetExceeded(recorder, violations)
+        logger.warning("Query budget exceeded by %s %s: %s", recorder.method, recorder.path, "; ".join(violations))
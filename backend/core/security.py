@@ -1,5 +1,9 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import timedelta, datetime
-from typing import Union, Any, Optional
+from typing import Union, Any, Optional, Dict, Tuple, Callable
 
 import jwt
 from fastapi import HTTPException
@@ -12,23 +16,26 @@ from starlette import status
 from starlette.requests import Request
 
 import crud
+from core import metrics
 from core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# hashes made with a different cost are reported by verify_and_update() and rehashed on login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS)
 ALGORITHM = "HS256"
 
 
 def create_access_token(
-    user_id: int, expires_delta: timedelta = None, db: Session = None
+    user_id: int, expires_delta: timedelta = None, db: Session = None, user: Any = None
 ) -> str:
     return encode_auth_data(
-        user_id, db, expires_delta, settings.ACCESS_TOKEN_EXPIRE_MINUTES, settings.JWT_ACCESS_TOKEN_SECRET)
+        user_id, db, expires_delta, settings.ACCESS_TOKEN_EXPIRE_MINUTES, settings.JWT_ACCESS_TOKEN_SECRET,
+        user=user)
 
 
 def create_refresh_token(
-    user_id: int, expires_delta: timedelta = None, db: Session = None
+    user_id: int, expires_delta: timedelta = None, db: Session = None, user: Any = None
 ) -> str:
-    return encode_auth_data(user_id, db, expires_delta)
+    return encode_auth_data(user_id, db, expires_delta, user=user)
 
 
 def decode_access_token(token: str) -> Union[dict, Any]:
@@ -58,9 +65,10 @@ def encode_auth_data(
         db: Session = None,
         expires_delta: timedelta = None,
         default_exp_time: int = settings.REFRESH_TOKEN_EXPIRE_MINUTES,
-        secret: str = settings.JWT_REFRESH_TOKEN_SECRET
+        secret: str = settings.JWT_REFRESH_TOKEN_SECRET,
+        user: Any = None,
 ) -> str:
-    if not db:
+    if not db and not user:
         raise Exception("No database session provided")
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -72,7 +80,8 @@ def encode_auth_data(
         token_type = "refresh"
     else:
         token_type = "access"
-    user = crud.user.get(db, id=user_id)
+    if user is None:
+        user = crud.user.get(db, id=user_id)
     if not user:
         raise Exception("User not found")
     payload = {
@@ -81,17 +90,124 @@ def encode_auth_data(
         "exp": expire,
         "sub": user.id,
         "type": token_type,
+        "active": user.is_active,
+        "superuser": user.is_superuser,
+        "ver": user.token_version,
     }
     encoded_jwt = jwt.encode(payload, secret, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+class TokenVersionCache:
+    """
+    In-process cache of the current token version of users, so that token claims can be trusted
+    without loading the user on every request. Entries expire after `ttl` seconds, which bounds how long
+    other worker processes keep accepting tokens revoked through this one.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._versions: Dict[int, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[int]:
+        with self._lock:
+            entry = self._versions.get(user_id)
+            if entry is None:
+                return None
+            version, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._versions[user_id]
+                return None
+            return version
+
+    def set(self, user_id: int, version: int) -> None:
+        with self._lock:
+            self._versions[user_id] = (version, time.monotonic() + self.ttl)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._versions.pop(user_id, None)
+
+
+token_versions = TokenVersionCache(settings.TOKEN_VERSION_CACHE_SECONDS)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a bounded thread pool (bcrypt releases the GIL while hashing), so that bursts of logins
+    queue up here instead of occupying the threads that serve requests.
+    The sync methods block the calling thread until their turn, the `a*` methods await it.
+    """
+
+    def __init__(self, context: CryptContext, workers: int):
+        self.context = context
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hasher")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of hash and verify operations submitted and not finished yet, running ones included.
+        """
+        return self._pending
+
+    def _submit(self, operation: str, fn: Callable, *args: Any) -> Future:
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(self._timed, operation, fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    @staticmethod
+    def _timed(operation: str, fn: Callable, *args: Any) -> Any:
+        with metrics.PASSWORD_HASH_SECONDS.labels(operation).time():
+            return fn(*args)
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def hash(self, password: str) -> str:
+        return self._submit("hash", self.context.hash, password).result()
+
+    def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return self._submit("verify", self.context.verify_and_update, password, hashed_password).result()
+
+    async def ahash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit("hash", self.context.hash, password))
+
+    async def averify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await asyncio.wrap_future(
+            self._submit("verify", self.context.verify_and_update, password, hashed_password))
+
+
+password_hasher = PasswordHasher(pwd_context, settings.PASSWORD_HASH_WORKERS)
+metrics.PASSWORD_HASH_QUEUE.set_function(lambda: password_hasher.queue_depth)
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify_and_update(plain_password, hashed_password)[0]
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and return a new hash for it if the stored one was made with outdated settings.
+    """
+    return password_hasher.verify_and_update(plain_password, hashed_password)
+
+
+async def averify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await password_hasher.averify_and_update(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
+
+
+async def aget_password_hash(password: str) -> str:
+    return await password_hasher.ahash(password)
 
 
 class OAuth2PasswordBearerCookie(OAuth2):
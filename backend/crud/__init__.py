@@ -1,3 +1,7 @@
+from .base import InvalidCursorError
 from .crud_user import user
 from .crud_screenplay import screenplay
-from .crud_editor_elements import editor_element
+from .crud_editor_elements import editor_element, ElementOperationError
+from .crud_scene import scene
+from .crud_character_stat import character_stat
+from .crud_revision import revision
@@ -1,18 +1,51 @@
+import base64
+import json
 from datetime import datetime
-from typing import TypeVar, Generic, Type, List, Any, Optional, Union, Dict
+from itertools import islice
+from typing import TypeVar, Generic, Type, List, Any, Optional, Union, Dict, Sequence, Iterable, Iterator
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import tuple_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, Query
+from starlette.concurrency import run_in_threadpool
 
 from database.base_class import Base
 
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
+QueryType = TypeVar("QueryType")
+
+# Session accepted by the awaitable `a*` methods: an AsyncSession is used natively,
+# a sync Session has the matching sync method run in the threadpool.
+AnySession = Union[Session, AsyncSession]
+
+
+def batched(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Split an iterable into lists of `size` items, consuming it lazily.
+    """
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+class InvalidCursorError(ValueError):
+    """
+    Raised when a pagination cursor cannot be decoded.
+    """
 
 
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    # Stable ordering of list queries, also used as the keyset of cursor pagination.
+    # The last column must be unique.
+    order_by: Sequence[str] = ("id",)
+    order_desc: bool = False
+
     def __init__(self, model: Type[ModelType]):
         """
         CRUD object with default methods to Create, Read, Update, Delete (CRUD).
@@ -24,20 +57,104 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """
         self.model = model
 
-    def get(self, db: Session, id: Any) -> Optional[ModelType]:
-        return db.query(self.model).filter(self.model.id == id).first()
+    def get(self, db: Session, id: Any, *, options: Sequence[Any] = ()) -> Optional[ModelType]:
+        return db.query(self.model).options(*options).filter(self.model.id == id).first()
 
     def get_multi(
-        self, db: Session, *, skip: int = 0, limit: int = 100
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        options: Sequence[Any] = (),
     ) -> List[ModelType]:
+        query = db.query(self.model).options(*options)
         if hasattr(self.model, "deleted_at"):
             #  exclude deleted objects
-            return db.query(self.model).filter(self.model.deleted_at == None).offset(skip).limit(limit).all()
-        return db.query(self.model).offset(skip).limit(limit).all()
+            query = query.filter(self.model.deleted_at == None)
+        return self.paginate(query, skip=skip, limit=limit, cursor=cursor)
+
+    async def aget(self, db: AnySession, id: Any, *, options: Sequence[Any] = ()) -> Optional[ModelType]:
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(self.get, db, id, options=options)
+        result = await db.execute(select(self.model).options(*options).filter(self.model.id == id))
+        return result.unique().scalars().first()
+
+    async def aget_multi(
+        self,
+        db: AnySession,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        options: Sequence[Any] = (),
+    ) -> List[ModelType]:
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(
+                self.get_multi, db, skip=skip, limit=limit, cursor=cursor, options=options)
+        statement = select(self.model).options(*options)
+        if hasattr(self.model, "deleted_at"):
+            #  exclude deleted objects
+            statement = statement.filter(self.model.deleted_at == None)
+        result = await db.execute(self.page(statement, skip=skip, limit=limit, cursor=cursor))
+        return result.unique().scalars().all()
+
+    def paginate(self, query: Query, *, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Any]:
+        return self.page(query, skip=skip, limit=limit, cursor=cursor).all()
+
+    def page(self, query: QueryType, *, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> QueryType:
+        """
+        Order a `Query` or `Select` by `order_by` and restrict it to one page.
+        With a `cursor` the page starts right after the row the cursor was made from (keyset pagination),
+        so deep pages cost the same as the first one. Without it `skip`/`limit` are used.
+        """
+        columns = [getattr(self.model, name) for name in self.order_by]
+        query = query.order_by(*[column.desc() if self.order_desc else column.asc() for column in columns])
+        if cursor is None:
+            return query.offset(skip).limit(limit)
+        key, values = tuple_(*columns), tuple_(*self.decode_cursor(cursor))
+        return query.filter(key < values if self.order_desc else key > values).limit(limit)
+
+    def encode_cursor(self, obj: ModelType) -> str:
+        values = [getattr(obj, name) for name in self.order_by]
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor: str) -> List[Any]:
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.order_by):
+                raise ValueError(cursor)
+            return [
+                datetime.fromisoformat(value) if getattr(self.model, name).type.python_type is datetime else value
+                for name, value in zip(self.order_by, values)
+            ]
+        except (ValueError, TypeError) as e:
+            raise InvalidCursorError("Invalid cursor") from e
 
     def update(
         self, db: Session, *, db_obj: ModelType, obj_in: Union[UpdateSchemaType, Dict[str, Any]]
     ) -> ModelType:
+        self._set_fields(db_obj, obj_in)
+        db.add(db_obj)
+        db.commit()
+        db.refresh(db_obj)
+        return db_obj
+
+    async def aupdate(
+        self, db: AnySession, *, db_obj: ModelType, obj_in: Union[UpdateSchemaType, Dict[str, Any]]
+    ) -> ModelType:
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(self.update, db, db_obj=db_obj, obj_in=obj_in)
+        self._set_fields(db_obj, obj_in)
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    @staticmethod
+    def _set_fields(db_obj: ModelType, obj_in: Union[UpdateSchemaType, Dict[str, Any]]) -> None:
         obj_data = jsonable_encoder(db_obj)
         if isinstance(obj_in, dict):
             update_data = obj_in
@@ -46,16 +163,23 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         for field in obj_data:
             if field in update_data:
                 setattr(db_obj, field, update_data[field])
-        db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
-        return db_obj
 
     def remove(self, db: Session, *, id: int) -> ModelType:
         obj = db.query(self.model).get(id)
-        obj.updated_at = datetime.now()
-        obj.deleted_at = datetime.now()
+        obj.updated_at = datetime.utcnow()
+        obj.deleted_at = datetime.utcnow()
         db.add(obj)
         db.commit()
         db.refresh(obj)
         return obj
+
+    async def aremove(self, db: AnySession, *, id: int) -> ModelType:
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(self.remove, db, id=id)
+        obj = await db.get(self.model, id)
+        obj.updated_at = datetime.utcnow()
+        obj.deleted_at = datetime.utcnow()
+        db.add(obj)
+        await db.commit()
+        await db.refresh(obj)
+        return obj
@@ -0,0 +1,86 @@
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from crud.base import CRUDBase
+import models
+import schemas
+
+# per scene statistics as stored in `Scene.character_stats`: {name: {"lines": ..., "words": ...}}
+SceneStats = Dict[str, Dict[str, int]]
+STAT_FIELDS = ("lines", "words", "scenes")
+
+
+def sum_scene_stats(scenes: Iterable[SceneStats]) -> Dict[str, Dict[str, int]]:
+    """
+    Add up the statistics of scenes per character, counting the scenes each character appears in.
+    """
+    totals: Dict[str, Dict[str, int]] = {}
+    for stats in scenes:
+        for name, values in (stats or {}).items():
+            total = totals.setdefault(name, dict.fromkeys(STAT_FIELDS, 0))
+            total["lines"] += values.get("lines", 0)
+            total["words"] += values.get("words", 0)
+            total["scenes"] += 1
+    return totals
+
+
+class CRUDCharacterStat(CRUDBase[models.CharacterStat, schemas.CharacterStat, schemas.CharacterStat]):
+
+    def get_multi_by_screenplay(self, db: Session, *, screenplay_id: int) -> List[models.CharacterStat]:
+        return db.query(self.model).filter(
+            self.model.screenplay_id == screenplay_id
+        ).order_by(self.model.lines.desc(), self.model.name).all()
+
+    def apply_delta(
+            self, db: Session, *, screenplay_id: int, removed: Iterable[SceneStats], added: Iterable[SceneStats]
+    ) -> None:
+        """
+        Update the totals of a screenplay after the scenes with statistics `removed` were replaced by `added`.
+        Only characters whose numbers changed are written, each with one atomic upsert, so concurrent edits of
+        the same screenplay do not lose updates. The caller is responsible for committing.
+        """
+        before, after = sum_scene_stats(removed), sum_scene_stats(added)
+        delta = {}
+        for name in before.keys() | after.keys():
+            values = {
+                field: after.get(name, {}).get(field, 0) - before.get(name, {}).get(field, 0) for field in STAT_FIELDS
+            }
+            if any(values.values()):
+                delta[name] = values
+        if not delta:
+            return
+
+        table = self.model.__table__
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            constraint="character_stat_screenplay_name_key",
+            set_={
+                **{field: table.c[field] + statement.excluded[field] for field in STAT_FIELDS},
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        db.execute(statement, [
+            {"screenplay_id": screenplay_id, "name": name, **values} for name, values in delta.items()
+        ])
+        if any(value < 0 for values in delta.values() for value in values.values()):
+            db.execute(delete(table).where(table.c.screenplay_id == screenplay_id, table.c.scenes <= 0))
+
+    def rebuild(self, db: Session, *, screenplay_id: int) -> None:
+        """
+        Recompute the totals of a screenplay from its scene index. The caller is responsible for committing.
+        """
+        table = self.model.__table__
+        db.execute(delete(table).where(table.c.screenplay_id == screenplay_id))
+        totals = sum_scene_stats(stats for stats, in db.query(models.Scene.character_stats).filter(
+            models.Scene.screenplay_id == screenplay_id))
+        if totals:
+            db.execute(table.insert(), [
+                {"screenplay_id": screenplay_id, "name": name, **values} for name, values in totals.items()
+            ])
+
+
+character_stat = CRUDCharacterStat(models.CharacterStat)
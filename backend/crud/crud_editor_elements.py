@@ -1,12 +1,38 @@
 from datetime import datetime
+from typing import Dict, List, Optional, Iterable, Any, Iterator, Tuple
 
-from sqlalchemy.orm import Session
-from crud.base import CRUDBase
+from sqlalchemy import update, bindparam, func, literal_column, or_, select
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+
+import crud
+from core import history, query_budget
+from core.config import settings
+from crud.base import CRUDBase, batched
 import models
 import schemas
 
 
+# Distance between neighbouring element positions. Inserts take the midpoint between two neighbours,
+# so about log2(POSITION_GAP) inserts can land in the same spot before the screenplay is respaced;
+# in wider gaps they step POSITION_GAP from the element before, so that pasted runs fill them evenly.
+POSITION_GAP = 1024
+
+# Text search configuration and document of the content search index; queries must use the same expression
+# for the index to apply.
+SEARCH_CONFIG = literal_column("'english'::regconfig")
+SEARCH_HEADLINE_OPTIONS = "MaxFragments=1, MaxWords=25, MinWords=8"
+
+
+class ElementOperationError(ValueError):
+    """
+    Raised when an element operation references an element that does not belong to the screenplay.
+    """
+
+
 class CRUDEditorElement(CRUDBase[models.EditorElement, schemas.EditorElementCreate, schemas.EditorElement]):
+    # document order
+    order_by = ("position", "id")
 
     @staticmethod
     def create(db: Session, obj_in: schemas.EditorElementCreate) -> schemas.EditorElement:
@@ -26,10 +52,437 @@ class CRUDEditorElement(CRUDBase[models.EditorElement, schemas.EditorElementCrea
             db_obj.content_type = obj_in["content_type"]
         if obj_in["position"]:
             db_obj.position = obj_in["position"]
-        db_obj.updated_at = datetime.now()
+        db_obj.updated_at = datetime.utcnow()
         db.commit()
         db.refresh(db_obj)
         return super().update(db=db, db_obj=db_obj, obj_in=obj_in)
 
+    def bulk_create(
+            self,
+            db: Session,
+            *,
+            screenplay_id: int,
+            elements: Iterable[Any],
+            start_position: int = POSITION_GAP,
+    ) -> List[int]:
+        """
+        Insert elements (anything with `content` and `content_type`) at consecutive positions from
+        `start_position`, using one multi-row INSERT per `ELEMENT_INSERT_BATCH_SIZE` elements, which count as
+        one query towards the request's query budget.
+        `elements` is consumed lazily, so it may be a generator. No ORM objects are built; the new ids are
+        returned in position order. The caller is responsible for committing.
+        """
+        table = self.model.__table__
+        position = start_position
+        with query_budget.batches():
+            for batch in batched(elements, settings.ELEMENT_INSERT_BATCH_SIZE):
+                rows = []
+                for element in batch:
+                    rows.append({
+                        "content": element.content,
+                        "content_type": element.content_type,
+                        "position": position,
+                        "screenplay_id": screenplay_id,
+                    })
+                    position += POSITION_GAP
+                db.execute(table.insert(), rows)
+        if position == start_position:
+            return []
+        return [_id for _id, in db.query(self.model.id).filter(
+            self.model.screenplay_id == screenplay_id,
+            self.model.position >= start_position,
+            self.model.position < position,
+        ).order_by(self.model.position)]
+
+    def iter_content(self, db: Session, *, screenplay_id: int) -> Iterator[Tuple[Any, Optional[str]]]:
+        """
+        Yield `(content_type, content)` of a screenplay's elements in position order through a server-side
+        cursor, `EXPORT_FETCH_SIZE` rows at a time, so that memory use does not depend on the screenplay size.
+        """
+        return iter(
+            db.query(self.model.content_type, self.model.content)
+            .filter(self.model.screenplay_id == screenplay_id)
+            .order_by(self.model.position, self.model.id)
+            .execution_options(stream_results=True)
+            .yield_per(settings.EXPORT_FETCH_SIZE)
+        )
+
+    def get_window(
+            self,
+            db: Session,
+            *,
+            screenplay_id: int,
+            from_position: Optional[int] = None,
+            to_position: Optional[int] = None,
+            limit: int = 500,
+            cursor: Optional[str] = None,
+    ) -> List[models.EditorElement]:
+        """
+        Up to `limit` elements of a screenplay in position order, from `from_position` up to and including
+        `to_position`, or after the element the `cursor` was made from.
+        Reads a range of the (screenplay_id, position) index, so any window costs the same.
+        """
+        query = db.query(self.model).filter(self.model.screenplay_id == screenplay_id)
+        if from_position is not None:
+            query = query.filter(self.model.position >= from_position)
+        if to_position is not None:
+            query = query.filter(self.model.position <= to_position)
+        return self.paginate(query, limit=limit, cursor=cursor)
+
+    def get_predecessor_ids(self, db: Session, *, screenplay_id: int, ids: Iterable[int]) -> Dict[int, Optional[int]]:
+        """
+        Id of the element right before each of the given elements, None for the first element.
+        """
+        element = aliased(self.model)
+        predecessor = db.query(self.model.id).filter(
+            self.model.screenplay_id == screenplay_id,
+            self.model.position < element.position,
+        ).order_by(self.model.position.desc()).limit(1).correlate(element).scalar_subquery()
+        return dict(db.query(element.id, predecessor).filter(
+            element.screenplay_id == screenplay_id, element.id.in_(list(ids))))
+
+    def count_by_screenplay(self, db: Session, *, screenplay_id: int) -> int:
+        return db.query(func.count(self.model.id)).filter(self.model.screenplay_id == screenplay_id).scalar()
+
+    def get_layout_rows(self, db: Session, *, screenplay_id: int) -> List[Tuple[int, Any, datetime, int]]:
+        """
+        `(id, content_type, updated_at, position)` of a screenplay's elements in position order, without content.
+        """
+        return db.query(
+            self.model.id, self.model.content_type, self.model.updated_at, self.model.position
+        ).filter(self.model.screenplay_id == screenplay_id).order_by(self.model.position, self.model.id).all()
+
+    def get_contents(self, db: Session, *, ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        """
+        Content of the given elements by id, `EXPORT_FETCH_SIZE` ids per query.
+        """
+        contents = {}
+        for batch in batched(ids, settings.EXPORT_FETCH_SIZE):
+            contents.update(db.query(self.model.id, self.model.content).filter(self.model.id.in_(batch)))
+        return contents
+
+    def search(
+            self,
+            db: Session,
+            *,
+            query: str,
+            mode: schemas.SearchMode = schemas.SearchMode.WORDS,
+            viewer_id: Optional[int] = None,
+            content_type: Optional[Any] = None,
+            owner_id: Optional[int] = None,
+            is_public: Optional[bool] = None,
+            skip: int = 0,
+            limit: int = 20,
+    ) -> List[Any]:
+        """
+        Elements matching `query`, best match first, with a highlighted snippet.
+        "words" matches web search syntax against the full-text index, "substring" matches any part of the
+        content and needs the trigram index. `viewer_id` restricts the search to that user's own and
+        public screenplays; without it all screenplays are searched.
+        Snippets are only built for the returned page.
+        """
+        screenplay = models.Screenplay
+        vector = func.to_tsvector(SEARCH_CONFIG, func.coalesce(self.model.content, literal_column("''")))
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+        if mode == schemas.SearchMode.SUBSTRING:
+            pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            condition = self.model.content.ilike(pattern, escape="\\")
+            rank = func.word_similarity(query, self.model.content)
+        else:
+            condition = vector.op("@@")(tsquery)
+            rank = func.ts_rank(vector, tsquery)
+
+        filters = [condition, screenplay.deleted_at.is_(None)]
+        if viewer_id is not None:
+            filters.append(or_(screenplay.owner_id == viewer_id, screenplay.is_public.is_(True)))
+        if content_type is not None:
+            filters.append(self.model.content_type == content_type)
+        if owner_id is not None:
+            filters.append(screenplay.owner_id == owner_id)
+        if is_public is not None:
+            filters.append(screenplay.is_public.is_(is_public))
+        hits = (
+            select(
+                self.model.id, self.model.screenplay_id, self.model.content_type, self.model.position,
+                self.model.content, screenplay.name, rank.label("rank"),
+            )
+            .join(screenplay, screenplay.id == self.model.screenplay_id)
+            .where(*filters)
+            .order_by(rank.desc(), self.model.id)
+            .offset(skip)
+            .limit(limit)
+            .subquery()
+        )
+        return db.execute(
+            select(
+                hits.c.screenplay_id,
+                hits.c.name.label("screenplay_name"),
+                hits.c.id.label("element_id"),
+                hits.c.content_type,
+                hits.c.position,
+                hits.c.rank,
+                func.ts_headline(SEARCH_CONFIG, hits.c.content, tsquery, SEARCH_HEADLINE_OPTIONS).label("snippet"),
+            ).order_by(hits.c.rank.desc(), hits.c.id)
+        ).all()
+
+    def apply_operations(
+            self, db: Session, *, screenplay_id: int, operations: List[schemas.EditorElementOperation]
+    ) -> schemas.EditorElementPatchResult:
+        """
+        Apply insert/update/delete/move operations to the elements of one screenplay in a single transaction.
+        Only the rows touched by the operations are loaded and written. Positions are worked out in memory from
+        the neighbours loaded up front, so that the rows are written in one batch per statement at the end
+        rather than one round trip per operation. The applied operations, with real ids and content changes
+        as splices, are appended to the revision log.
+        The caller locks the screenplay first, e.g. with `crud.screenplay.get_for_update`, so that concurrent
+        changes do not work out positions and scenes from the same rows.
+        """
+        # inserted elements by the temporary id of their operation, flushed together
+        ids: Dict[int, models.EditorElement] = {}
+        created: Dict[int, models.EditorElement] = {}
+        changed: Dict[models.EditorElement, None] = {}
+        deleted: List[int] = []
+        # positions written, to refresh the scene index in one pass
+        touched: List[int] = []
+        # operations for the revision log, with the elements in place of ids until these are known
+        logged: List[List[Any]] = []
+        try:
+            # load every existing element the operations refer to, and the position following it, in one query
+            referenced = {
+                element_id for operation in operations for element_id in (operation.id, operation.after_id)
+                if element_id is not None and element_id > 0
+            }
+            loaded: Dict[int, models.EditorElement] = {}
+            # position of the element following each anchor (None: the first position). Kept up to date by
+            # the operations; a position freed by a delete or move still bounds the gap after the anchor.
+            following: Dict[Optional[models.EditorElement], Optional[int]] = {}
+            if referenced:
+                for element, following_position in self._with_following_positions(
+                        db, screenplay_id=screenplay_id, ids=referenced):
+                    loaded[element.id] = element
+                    following[element] = following_position
+
+            def place(anchor: Optional[models.EditorElement], element: models.EditorElement, remaining: int) -> int:
+                # a move right after the element that follows the anchor needs the element after that one
+                if anchor in following and (element.position is None or following[anchor] != element.position):
+                    position = self._free_position(anchor, following[anchor])
+                else:
+                    position = None
+                if position is None:
+                    # unknown neighbour, or no room left: read it
+                    db.flush()
+                    following[anchor] = self._following_position(db, screenplay_id, anchor, exclude_id=element.id)
+                    position = self._free_position(anchor, following[anchor])
+                if position is None:
+                    # respace once, with room after the anchor for the rest of the patch
+                    positions = sorted(self.rebalance(
+                        db, screenplay_id=screenplay_id, room_after=anchor.id, room=remaining).values())
+                    after = dict(zip(positions, positions[1:] + [None]))
+                    for key in list(following) + [anchor]:
+                        following[key] = positions[0] if key is None else after[key.position]
+                    if following[anchor] == element.position:
+                        following[anchor] = after[element.position]
+                    position = self._free_position(anchor, following[anchor])
+                following[element] = following[anchor]
+                following[anchor] = position
+                return position
+
+            for index, operation in enumerate(operations):
+                # operations still to come, which at most can land in the same gap
+                remaining = len(operations) - index - 1
+                if operation.op == schemas.ElementOperationType.INSERT:
+                    element = models.EditorElement(
+                        content=operation.content or "",
+                        content_type=operation.content_type or "TEXT",
+                        screenplay_id=screenplay_id,
+                    )
+                    anchor = self._resolve(db, screenplay_id, created, operation.after_id, loaded, deleted)
+                    element.position = place(anchor, element, remaining)
+                    db.add(element)
+                    touched.append(element.position)
+                    logged.append([history.INSERT, element, anchor, element.content_type, element.content])
+                    if operation.id is not None:
+                        ids[operation.id] = created[operation.id] = element
+                    changed[element] = None
+                    continue
+
+                element = self._resolve(db, screenplay_id, created, operation.id, loaded, deleted)
+                if operation.op == schemas.ElementOperationType.DELETE:
+                    if element.id is None:
+                        # inserted by this patch, only persistent elements can be deleted
+                        db.flush()
+                    changed.pop(element, None)
+                    loaded.pop(element.id, None)
+                    following.pop(element, None)
+                    for temporary_id in [key for key, value in created.items() if value is element]:
+                        del created[temporary_id]
+                    deleted.append(element.id)
+                    touched.append(element.position)
+                    logged.append([history.DELETE, element.id])
+                    db.delete(element)
+                    continue
+
+                if operation.op == schemas.ElementOperationType.UPDATE:
+                    # content changes are written together when the scene index is refreshed
+                    change = None
+                    if operation.content is not None:
+                        change = history.splice(element.content, operation.content)
+                        element.content = operation.content
+                    if operation.content_type is not None:
+                        element.content_type = operation.content_type
+                    logged.append([history.UPDATE, element, operation.content_type, change])
+                elif operation.op == schemas.ElementOperationType.MOVE:
+                    anchor = self._resolve(db, screenplay_id, created, operation.after_id, loaded, deleted)
+                    if anchor is element:
+                        raise ElementOperationError(f"Element {element.id} cannot be moved after itself")
+                    position = place(anchor, element, remaining)
+                    # read the old position after placing, which may have respaced the screenplay
+                    touched.append(element.position)
+                    element.position = position
+                    logged.append([history.MOVE, element, anchor])
+                element.updated_at = datetime.utcnow()
+                touched.append(element.position)
+                changed[element] = None
+
+            db.flush()
+            logged = [
+                [value.id if isinstance(value, models.EditorElement) else value for value in entry] for entry in logged
+            ]
+            if touched:
+                crud.scene.refresh(db, screenplay_id=screenplay_id, start=min(touched), end=max(touched))
+            version = crud.screenplay.touch(db, id=screenplay_id)
+            if version is not None:
+                crud.revision.record(db, screenplay_id=screenplay_id, version=version, operations=logged)
+            # before committing expires the elements
+            result = schemas.EditorElementPatchResult(
+                elements=[schemas.EditorElement.from_orm(element) for element in changed],
+                deleted=deleted,
+                ids={temporary_id: element.id for temporary_id, element in ids.items()},
+                version=version,
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return result
+
+    def _resolve(
+            self,
+            db: Session,
+            screenplay_id: int,
+            created: Dict[int, models.EditorElement],
+            element_id: Optional[int],
+            loaded: Dict[int, models.EditorElement],
+            deleted: List[int],
+    ) -> Optional[models.EditorElement]:
+        if element_id is None:
+            return None
+        if element_id in created:
+            return created[element_id]
+        if element_id in loaded:
+            return loaded[element_id]
+        element = None
+        if element_id not in deleted:
+            element = db.query(self.model).filter(
+                self.model.id == element_id,
+                self.model.screenplay_id == screenplay_id,
+            ).first()
+        if not element:
+            raise ElementOperationError(f"Element {element_id} not found in screenplay {screenplay_id}")
+        return element
+
+    def _with_following_positions(
+            self, db: Session, *, screenplay_id: int, ids: Iterable[int]
+    ) -> List[Tuple[models.EditorElement, Optional[int]]]:
+        """
+        The given elements of a screenplay, each with the position of the element right after it.
+        """
+        element = aliased(self.model)
+        following = db.query(self.model.position).filter(
+            self.model.screenplay_id == screenplay_id,
+            self.model.position > element.position,
+        ).order_by(self.model.position.asc()).limit(1).correlate(element).scalar_subquery()
+        return db.query(element, following).filter(
+            element.screenplay_id == screenplay_id, element.id.in_(list(ids))).all()
+
+    def _following_position(
+            self,
+            db: Session,
+            screenplay_id: int,
+            anchor: Optional[models.EditorElement],
+            *,
+            exclude_id: Optional[int] = None,
+    ) -> Optional[int]:
+        following = db.query(self.model.position).filter(self.model.screenplay_id == screenplay_id)
+        if exclude_id is not None:
+            following = following.filter(self.model.id != exclude_id)
+        if anchor is not None:
+            following = following.filter(self.model.position > anchor.position)
+        return following.order_by(self.model.position.asc()).limit(1).scalar()
+
+    @staticmethod
+    def _free_position(anchor: Optional[models.EditorElement], following: Optional[int]) -> Optional[int]:
+        """
+        A position between `anchor` (the start when None) and `following` (the end when None), None if there is
+        no room left.
+        """
+        if anchor is None:
+            return POSITION_GAP if following is None else following - POSITION_GAP
+        if following is None:
+            return anchor.position + POSITION_GAP
+        if following - anchor.position > 1:
+            return min(anchor.position + POSITION_GAP, (anchor.position + following) // 2)
+        return None
+
+    def position_after(
+            self,
+            db: Session,
+            screenplay_id: int,
+            anchor: Optional[models.EditorElement],
+            *,
+            exclude_id: Optional[int] = None,
+    ) -> int:
+        """
+        Return a free position directly after `anchor` (or before the first element when it is None).
+        Positions are sparse, so this normally touches no other row. Only when two neighbours have run out
+        of space between them is the whole screenplay respaced.
+        """
+        position = self._free_position(
+            anchor, self._following_position(db, screenplay_id, anchor, exclude_id=exclude_id))
+        if position is not None:
+            return position
+        self.rebalance(db, screenplay_id=screenplay_id)
+        return self.position_after(db, screenplay_id, anchor, exclude_id=exclude_id)
+
+    def rebalance(
+            self, db: Session, *, screenplay_id: int, room_after: Optional[int] = None, room: int = 0
+    ) -> Dict[int, int]:
+        """
+        Respace the positions of a screenplay to multiples of POSITION_GAP, keeping their order, leaving `room`
+        more gaps after the element `room_after`, and rebuild its scene index. Returns the new positions by id.
+        The caller is responsible for committing.
+        """
+        ids = db.query(self.model.id).filter(
+            self.model.screenplay_id == screenplay_id
+        ).order_by(self.model.position, self.model.id).all()
+        positions = {}
+        position = 0
+        for _id, in ids:
+            position += POSITION_GAP
+            positions[_id] = position
+            if _id == room_after:
+                position += room * POSITION_GAP
+        db.execute(
+            update(self.model.__table__)
+            .where(self.model.__table__.c.id == bindparam("_id"))
+            .values(position=bindparam("_position")),
+            [{"_id": _id, "_position": position} for _id, position in positions.items()],
+        )
+        # loaded elements take their new position without a query each
+        for obj in list(db.identity_map.values()):
+            if isinstance(obj, self.model) and obj.screenplay_id == screenplay_id and obj.id in positions:
+                set_committed_value(obj, "position", positions[obj.id])
+        crud.scene.refresh(db, screenplay_id=screenplay_id)
+        return positions
 
 editor_element = CRUDEditorElement(models.EditorElement)
@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, defer
+
+from core import history
+from core.config import settings
+from crud.base import CRUDBase
+import models
+import schemas
+
+
+class CRUDRevision(CRUDBase[models.ScreenplayRevision, schemas.ScreenplayRevision, schemas.ScreenplayRevision]):
+    # newest first
+    order_by = ("version", "id")
+    order_desc = True
+
+    def record(self, db: Session, *, screenplay_id: int, version: int, operations: List[List[Any]]) -> None:
+        """
+        Append the operations that led to `version` to the revision log. A snapshot of the screenplay is stored
+        as well when there is none yet, or `REVISION_SNAPSHOT_INTERVAL` operations were logged since the last one.
+        Changes to the elements must be flushed. The caller is responsible for committing.
+        """
+        snapshot = models.ScreenplaySnapshot
+        last_snapshot = select(func.max(snapshot.version)).where(
+            snapshot.screenplay_id == screenplay_id).scalar_subquery()
+        pending = select(func.coalesce(func.sum(self.model.operation_count), 0)).where(
+            self.model.screenplay_id == screenplay_id, self.model.version > last_snapshot).scalar_subquery()
+        encoding, data = history.pack(operations)
+        # subqueries of RETURNING do not see the inserted row, so the entry is appended in the same round trip
+        snapshot_version, pending_count = db.execute(self.model.__table__.insert().values(
+            screenplay_id=screenplay_id,
+            version=version,
+            operation_count=len(operations),
+            encoding=encoding,
+            data=data,
+        ).returning(last_snapshot, pending)).one()
+        if snapshot_version is None or pending_count + len(operations) >= settings.REVISION_SNAPSHOT_INTERVAL:
+            self.snapshot(db, screenplay_id=screenplay_id, version=version)
+
+    def snapshot(self, db: Session, *, screenplay_id: int, version: int) -> None:
+        """
+        Store the current content of the screenplay as the snapshot of `version`, reading it in two queries.
+        """
+        screenplay = db.query(models.Screenplay.name, models.Screenplay.description).filter(
+            models.Screenplay.id == screenplay_id).one()
+        element = models.EditorElement
+        elements = db.query(element.id, element.content_type, element.content).filter(
+            element.screenplay_id == screenplay_id).order_by(element.position, element.id)
+        encoding, data = history.pack(history.document(
+            screenplay.name, screenplay.description, [list(row) for row in elements]))
+        db.execute(models.ScreenplaySnapshot.__table__.insert().values(
+            screenplay_id=screenplay_id,
+            version=version,
+            encoding=encoding,
+            data=data,
+        ))
+
+    def get_multi_by_screenplay(
+            self,
+            db: Session,
+            *,
+            screenplay_id: int,
+            skip: int = 0,
+            limit: int = 100,
+            cursor: Optional[str] = None,
+    ) -> List[models.ScreenplayRevision]:
+        query = db.query(self.model).options(defer(self.model.data)).filter(
+            self.model.screenplay_id == screenplay_id)
+        return self.paginate(query, skip=skip, limit=limit, cursor=cursor)
+
+    def reconstruct(self, db: Session, *, screenplay_id: int, version: int) -> Optional[Dict[str, Any]]:
+        """
+        The screenplay as of `version` (see `core.history.document`), from the closest snapshot at or before it
+        and the operations logged since. None if the version is not in the log, e.g. it predates history.
+        """
+        snapshot = db.query(models.ScreenplaySnapshot).filter(
+            models.ScreenplaySnapshot.screenplay_id == screenplay_id,
+            models.ScreenplaySnapshot.version <= version,
+        ).order_by(models.ScreenplaySnapshot.version.desc()).first()
+        if snapshot is None:
+            return None
+        revisions = db.query(self.model.encoding, self.model.data).filter(
+            self.model.screenplay_id == screenplay_id,
+            self.model.version > snapshot.version,
+            self.model.version <= version,
+        ).order_by(self.model.version).all()
+        # every version since the snapshot has its entry
+        if len(revisions) != version - snapshot.version:
+            return None
+        document = history.unpack(snapshot.encoding, snapshot.data)
+        operations = [operation for revision in revisions for operation in history.unpack(*revision)]
+        return history.replay(document, operations)
+
+
+revision = CRUDRevision(models.ScreenplayRevision)
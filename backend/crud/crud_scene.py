@@ -0,0 +1,124 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import crud
+from core.config import settings
+from crud.base import CRUDBase, batched
+import models
+import schemas
+from models.editor_elements import ContentType
+
+
+def character_name(content: Optional[str]) -> str:
+    """
+    Name of a CHARACTER element without extensions such as (V.O.) or (CONT'D).
+    """
+    return (content or "").split("(")[0].strip().upper()
+
+
+def build_scenes(
+        screenplay_id: int, elements: Iterable[Tuple[int, ContentType, Optional[str], int]]
+) -> Iterator[Dict[str, Any]]:
+    """
+    Scene rows for `(id, content_type, content, position)` of consecutive elements in position order.
+    DIALOGUE counts for the character of the last cue, until an element other than a parenthetical or
+    dialogue ends the exchange.
+    """
+    scene: Optional[Dict[str, Any]] = None
+    speaker: Optional[Dict[str, int]] = None
+    for _id, content_type, content, position in elements:
+        if scene is None or content_type == ContentType.HEADING:
+            if scene is not None:
+                yield scene
+            is_heading = content_type == ContentType.HEADING
+            scene = {
+                "screenplay_id": screenplay_id,
+                "heading_id": _id if is_heading else None,
+                "heading": content if is_heading else None,
+                "start_position": position,
+                "end_position": position,
+                "element_count": 0,
+                "word_count": 0,
+                "characters": [],
+                "character_stats": {},
+            }
+            speaker = None
+        words = len((content or "").split())
+        scene["end_position"] = position
+        scene["element_count"] += 1
+        scene["word_count"] += words
+        if content_type == ContentType.CHARACTER:
+            name = character_name(content)
+            speaker = None
+            if name:
+                if name not in scene["characters"]:
+                    scene["characters"].append(name)
+                speaker = scene["character_stats"].setdefault(name, {"lines": 0, "words": 0})
+        elif content_type == ContentType.DIALOGUE:
+            if speaker is not None:
+                speaker["lines"] += 1
+                speaker["words"] += words
+        elif content_type != ContentType.PARENTHETICAL:
+            speaker = None
+    if scene is not None:
+        yield scene
+
+
+class CRUDScene(CRUDBase[models.Scene, schemas.Scene, schemas.Scene]):
+
+    def get_multi_by_screenplay(self, db: Session, *, screenplay_id: int) -> List[models.Scene]:
+        return db.query(self.model).filter(
+            self.model.screenplay_id == screenplay_id
+        ).order_by(self.model.start_position).all()
+
+    def get_by_screenplay(self, db: Session, *, screenplay_id: int, id: int) -> Optional[models.Scene]:
+        return db.query(self.model).filter(self.model.screenplay_id == screenplay_id, self.model.id == id).first()
+
+    def count_by_screenplay(self, db: Session, *, screenplay_id: int) -> int:
+        return db.query(func.count(self.model.id)).filter(self.model.screenplay_id == screenplay_id).scalar()
+
+    def refresh(
+            self, db: Session, *, screenplay_id: int, start: Optional[int] = None, end: Optional[int] = None
+    ) -> None:
+        """
+        Rebuild the scenes covering element positions `start` to `end` from the current elements, after
+        elements in that range were inserted, edited, moved or deleted, and apply the difference to the
+        character statistics. Without a range the whole screenplay is rebuilt. Pending element changes
+        must be flushed. The caller is responsible for committing.
+        """
+        element = models.EditorElement
+        headings = db.query(element.position).filter(
+            element.screenplay_id == screenplay_id, element.content_type == ContentType.HEADING)
+        # Widen the range to whole scenes, from the last heading before `start` up to the first heading after `end`.
+        # A heading inserted or removed at `start` changes where the previous scene ends, so that scene is included.
+        lower = upper = None
+        if start is not None:
+            lower = headings.filter(element.position < start).order_by(element.position.desc()).limit(1).scalar()
+        if end is not None:
+            upper = headings.filter(element.position > end).order_by(element.position.asc()).limit(1).scalar()
+
+        stale = db.query(self.model).filter(self.model.screenplay_id == screenplay_id)
+        rows = db.query(element.id, element.content_type, element.content, element.position).filter(
+            element.screenplay_id == screenplay_id)
+        if lower is not None:
+            stale = stale.filter(self.model.start_position >= lower)
+            rows = rows.filter(element.position >= lower)
+        if upper is not None:
+            stale = stale.filter(self.model.start_position < upper)
+            rows = rows.filter(element.position < upper)
+        removed = [stats for stats, in stale.with_entities(self.model.character_stats)]
+        stale.delete(synchronize_session=False)
+
+        added = []
+        table = self.model.__table__
+        scenes = build_scenes(
+            screenplay_id, rows.order_by(element.position, element.id).yield_per(settings.EXPORT_FETCH_SIZE))
+        for batch in batched(scenes, settings.ELEMENT_INSERT_BATCH_SIZE):
+            db.execute(table.insert(), batch)
+            added.extend(scene["character_stats"] for scene in batch)
+        crud.character_stat.apply_delta(db, screenplay_id=screenplay_id, removed=removed, added=added)
+
+
+scene = CRUDScene(models.Scene)
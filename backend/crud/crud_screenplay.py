@@ -1,32 +1,100 @@
 from datetime import datetime
-from typing import List
+from typing import List, Any, Iterable, Sequence, Optional, Tuple
 
-from sqlalchemy.orm import Session
-from crud.base import CRUDBase
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload, joinedload, noload
+from starlette.concurrency import run_in_threadpool
+
+import crud
+from core import cache, history
+from crud.base import CRUDBase, AnySession
 import models
 import schemas
 
+# ids of public screenplays changed in the current transaction, None for a new one
+INVALIDATED_KEY = "invalidated_screenplays"
+
+
+def invalidate(db: Session, id: Optional[int] = None) -> None:
+    """
+    Drop the cached copies of the screenplay and of the public listings once the transaction commits,
+    so that no other request caches a copy read before the change became visible.
+    """
+    db.info.setdefault(INVALIDATED_KEY, set()).add(id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(db: Session) -> None:
+    for id in db.info.pop(INVALIDATED_KEY, ()):
+        cache.invalidate_public_screenplay(id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(db: Session) -> None:
+    db.info.pop(INVALIDATED_KEY, None)
+
 
 class CRUDScreenplay(CRUDBase[models.Screenplay, schemas.ScreenplayBase, schemas.ScreenplayBase]):
+    # recently edited screenplays first
+    order_by = ("updated_at", "id")
+    order_desc = True
 
-    @staticmethod
-    async def create(db: Session, *, obj_in: schemas.ScreenplayCreate) -> models.Screenplay:
+    def create(self, db: Session, *, obj_in: schemas.ScreenplayCreate) -> models.Screenplay:
+        db_obj = self._insert(db, obj_in)
+        db.commit()
+        db.refresh(db_obj)
+        return db_obj
+
+    async def acreate(self, db: AnySession, *, obj_in: schemas.ScreenplayCreate) -> models.Screenplay:
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(self.create, db, obj_in=obj_in)
+        db_obj = await db.run_sync(self._insert, obj_in)
+        await db.commit()
+        # reload instead of refresh: lazy loads are not available on an AsyncSession
+        result = await db.execute(
+            select(self.model)
+            .options(self.elements_loader("selectin"))
+            .filter(self.model.id == db_obj.id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().one()
+
+    def _insert(self, db: Session, obj_in: schemas.ScreenplayCreate) -> models.Screenplay:
+        """
+        Insert the screenplay row and bulk insert its elements, in client position order, without committing.
+        """
+        elements = sorted(obj_in.get('elements'), key=lambda element: element.position)
+        return self._insert_with_elements(db, obj_in, elements)
+
+    def _insert_with_elements(self, db: Session, obj_in: dict, elements: Iterable[Any]) -> models.Screenplay:
         db_obj = models.Screenplay()
         db_obj.name = obj_in['name']
         db_obj.description = obj_in['description']
+        db_obj.is_public = obj_in.get('is_public', False)
         db_obj.owner_id = obj_in['owner_id']
+        db.add(db_obj)
+        db.flush()
 
-        for element in obj_in.get('elements'):
-            e = models.EditorElement(
-                content=element.content,
-                content_type=element.content_type,
-                position=element.position,
-                screenplay_id=db_obj.id
-            )
-            db_obj.elements.append(e)
+        crud.editor_element.bulk_create(db, screenplay_id=db_obj.id, elements=elements)
+        crud.scene.refresh(db, screenplay_id=db_obj.id)
+        crud.revision.record(db, screenplay_id=db_obj.id, version=db_obj.version, operations=[])
+        if db_obj.is_public:
+            invalidate(db)
+        return db_obj
 
-        db.add(db_obj)
-        db.commit()
+    def create_from_elements(self, db: Session, *, obj_in: dict, elements: Iterable[Any]) -> models.Screenplay:
+        """
+        Create a screenplay from an iterable of elements in document order, e.g. a parser reading an upload.
+        Elements are consumed lazily and inserted in batches of `ELEMENT_INSERT_BATCH_SIZE`,
+        the whole import is committed at once.
+        """
+        try:
+            db_obj = self._insert_with_elements(db, obj_in, elements)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
         db.refresh(db_obj)
         return db_obj
 
@@ -35,32 +103,139 @@ class CRUDScreenplay(CRUDBase[models.Screenplay, schemas.ScreenplayBase, schemas
             update_data = obj_in
         else:
             update_data = obj_in.dict(exclude_unset=True)
+        previous = {"name": db_obj.name, "description": db_obj.description}
         if update_data["name"]:
             db_obj.name = update_data["name"]
         if update_data["description"]:
             db_obj.description = update_data["description"]
 
-        db_obj.updated_at = datetime.now()
-        return super().update(db=db, db_obj=db_obj, obj_in=update_data)
+        self._set_fields(db_obj, update_data)
+        changed = {
+            field: getattr(db_obj, field) for field, value in previous.items() if getattr(db_obj, field) != value
+        }
+        db.add(db_obj)
+        db.flush()
+        # bumped in SQL like element patches do, so that concurrent writers never share a version
+        version = self.touch(db, id=db_obj.id)
+        invalidate(db, db_obj.id)
+        # logged under the version the bump returned; db_obj is refreshed after the commit
+        crud.revision.record(
+            db, screenplay_id=db_obj.id, version=version, operations=[[history.METADATA, changed]] if changed else [])
+        db.commit()
+        db.refresh(db_obj)
+        return db_obj
+
+    def remove(self, db: Session, *, id: int) -> models.Screenplay:
+        invalidate(db, id)
+        return super().remove(db=db, id=id)
+
+    @staticmethod
+    def elements_loader(strategy: str = "selectin") -> Any:
+        """
+        Loader option for `Screenplay.elements`.
+        "selectin" loads the elements of any number of screenplays in one extra query and suits lists,
+        "joined" loads a single screenplay with its elements in one query, "none" skips the elements.
+        """
+        loaders = {"selectin": selectinload, "joined": joinedload, "none": noload}
+        return loaders[strategy](models.Screenplay.elements)
+
+    def touch(self, db: Session, *, id: int) -> Optional[int]:
+        """
+        Mark the screenplay as modified and bump its version without loading it. Returns the new version.
+        The caller is responsible for committing.
+        """
+        row = db.execute(
+            update(self.model)
+            .where(self.model.id == id)
+            .values(updated_at=datetime.utcnow(), version=self.model.version + 1)
+            .returning(self.model.is_public, self.model.version)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is None:
+            return None
+        if row.is_public:
+            invalidate(db, id)
+        return row.version
+
+    def purge_deleted(self, db: Session, *, deleted_before: datetime, limit: int = 100) -> Tuple[int, int]:
+        """
+        Delete up to `limit` screenplays soft-deleted before `deleted_before` for good, with their elements.
+        Screenplays locked by a concurrent purge are skipped. Returns the number of screenplays and elements
+        deleted. The caller is responsible for committing.
+        """
+        ids = [_id for _id, in db.query(self.model.id).filter(
+            self.model.deleted_at < deleted_before
+        ).order_by(self.model.deleted_at).limit(limit).with_for_update(skip_locked=True)]
+        if not ids:
+            return 0, 0
+        # the foreign key would cascade as well, deleting the elements first counts them
+        element_count = db.execute(
+            delete(models.EditorElement)
+            .where(models.EditorElement.screenplay_id.in_(ids))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.execute(delete(self.model).where(self.model.id.in_(ids)).execution_options(synchronize_session=False))
+        return len(ids), element_count
+
+    def oldest_deleted_at(self, db: Session) -> Optional[datetime]:
+        return db.query(func.min(self.model.deleted_at)).filter(self.model.deleted_at.isnot(None)).scalar()
+
+    def get_for_update(self, db: Session, *, id: int) -> Optional[models.Screenplay]:
+        """
+        Load the screenplay and lock its row until the transaction ends, so that a precondition checked
+        against it still holds when the change is committed.
+        """
+        return db.query(self.model).filter(self.model.id == id).with_for_update().first()
+
+    def get_validators(self, db: Session, *, id: int) -> Optional[Any]:
+        """
+        Only the columns needed for permission checks and conditional requests, without the elements.
+        """
+        return db.query(*self._validator_columns()).filter(self.model.id == id).first()
+
+    async def aget_validators(self, db: AnySession, *, id: int) -> Optional[Any]:
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(self.get_validators, db, id=id)
+        result = await db.execute(select(*self._validator_columns()).filter(self.model.id == id))
+        return result.first()
+
+    def _validator_columns(self) -> List[Any]:
+        return [
+            self.model.id, self.model.owner_id, self.model.is_public, self.model.version,
+            self.model.updated_at, self.model.deleted_at,
+        ]
 
     def get_multi_by_owner(
-            self, db: Session, *, owner_id: int, skip: int = 0, limit: int = 100
+            self,
+            db: Session,
+            *,
+            owner_id: int,
+            skip: int = 0,
+            limit: int = 100,
+            cursor: Optional[str] = None,
+            options: Sequence[Any] = (),
     ) -> List[models.Screenplay]:
-        return (
+        query = (
             db.query(self.model)
+            .options(*options)
             .filter(self.model.owner_id == owner_id, self.model.deleted_at.is_(None))
-            .offset(skip)
-            .limit(limit)
-            .all()
         )
+        return self.paginate(query, skip=skip, limit=limit, cursor=cursor)
 
     def get_multi_public(
-        self, db: Session, *, skip: int = 0, limit: int = 100
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        options: Sequence[Any] = (),
     ) -> List[models.Screenplay]:
-        return db.query(self.model).filter(
+        query = db.query(self.model).options(*options).filter(
             self.model.deleted_at.is_(None),
             self.model.is_public.is_(True)
-        ).offset(skip).limit(limit).all()
+        )
+        return self.paginate(query, skip=skip, limit=limit, cursor=cursor)
 
 
 screenplay = CRUDScreenplay(models.Screenplay)
@@ -1,9 +1,14 @@
 from typing import Any, Dict, Optional, Union
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from core.security import get_password_hash, verify_password
-from crud.base import CRUDBase
+from core.security import (
+    get_password_hash, aget_password_hash, verify_and_update_password, averify_and_update_password, token_versions,
+)
+from crud.base import CRUDBase, AnySession
 import models
 import schemas
 
@@ -14,27 +19,66 @@ class CRUDUser(CRUDBase[models.User, schemas.UserCreate, schemas.UserUpdate]):
         _user = self.get_by_email(db, email=email)
         if not _user:
             return None
-        if not verify_password(password, _user.hashed_password):
+        valid, new_hash = verify_and_update_password(password, _user.hashed_password)
+        if not valid:
             return None
+        if new_hash:
+            self._save(db, _user, hashed_password=new_hash)
+        return _user
+
+    async def aauthenticate(self, db: AnySession, *, email: str, password: str) -> Optional[models.User]:
+        _user = await self.aget_by_email(db, email=email)
+        if not _user:
+            return None
+        valid, new_hash = await averify_and_update_password(password, _user.hashed_password)
+        if not valid:
+            return None
+        if new_hash:
+            await self._asave(db, _user, hashed_password=new_hash)
         return _user
 
     @staticmethod
     def get_by_email(db: Session, *, email: str) -> Optional[models.User]:
         return db.query(models.User).filter(models.User.email == email).first()
 
+    async def aget_by_email(self, db: AnySession, *, email: str) -> Optional[models.User]:
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(self.get_by_email, db, email=email)
+        result = await db.execute(select(models.User).filter(models.User.email == email))
+        return result.scalars().first()
+
+    def create(self, db: Session, *, obj_in: schemas.UserCreate) -> models.User:
+        return self._save(db, self._build(obj_in), hashed_password=get_password_hash(obj_in.password))
+
+    async def acreate(self, db: AnySession, *, obj_in: schemas.UserCreate) -> models.User:
+        return await self._asave(db, self._build(obj_in), hashed_password=await aget_password_hash(obj_in.password))
+
     @staticmethod
-    def create(db: Session, *, obj_in: schemas.UserCreate) -> models.User:
+    def _build(obj_in: schemas.UserCreate) -> models.User:
         db_obj = models.User()
         db_obj.email = obj_in.email
-        db_obj.hashed_password = get_password_hash(obj_in.password)
         db_obj.first_name = obj_in.first_name
         db_obj.last_name = obj_in.last_name
         db_obj.is_superuser = obj_in.is_superuser
+        return db_obj
+
+    @staticmethod
+    def _save(db: Session, db_obj: models.User, *, hashed_password: str) -> models.User:
+        db_obj.hashed_password = hashed_password
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
         return db_obj
 
+    async def _asave(self, db: AnySession, db_obj: models.User, *, hashed_password: str) -> models.User:
+        if not isinstance(db, AsyncSession):
+            return await run_in_threadpool(self._save, db, db_obj, hashed_password=hashed_password)
+        db_obj.hashed_password = hashed_password
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
     def update(
         self, db: Session, *, db_obj: models.User, obj_in: Union[schemas.UserUpdate, Dict[str, Any]]
     ) -> models.User:
@@ -42,11 +86,29 @@ class CRUDUser(CRUDBase[models.User, schemas.UserCreate, schemas.UserUpdate]):
             update_data = obj_in
         else:
             update_data = obj_in.dict(exclude_unset=True)
-        if update_data["password"]:
+        revoke_tokens = any(
+            field in update_data and update_data[field] != getattr(db_obj, field)
+            for field in ("is_active", "is_superuser")
+        )
+        if update_data.get("password"):
             hashed_password = get_password_hash(update_data["password"])
-            del update_data["password"]
             update_data["hashed_password"] = hashed_password
-        return super().update(db, db_obj=db_obj, obj_in=update_data)
+            revoke_tokens = True
+        update_data.pop("password", None)
+        if revoke_tokens:
+            update_data["token_version"] = (db_obj.token_version or 0) + 1
+        user = super().update(db, db_obj=db_obj, obj_in=update_data)
+        token_versions.invalidate(user.id)
+        return user
+
+    @staticmethod
+    def get_token_version(db: Session, *, id: int) -> Optional[int]:
+        """
+        Current token version of a live user, None if the user does not exist or was deleted.
+        """
+        return db.query(models.User.token_version).filter(
+            models.User.id == id, models.User.deleted_at.is_(None)
+        ).scalar()
 
     @staticmethod
     def is_active(_user: models.User) -> bool:
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+import crud
+from core.config import settings
+from database.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class Purge:
+    """
+    Deletes screenplays that were soft-deleted longer than `retention` ago for good, `batch_size` per
+    transaction so that locks are short, and keeps throughput and lag figures of the runs.
+    Lag is how long the oldest screenplay due for deletion has been waiting past the retention period.
+    Purges on several workers do not block each other.
+    """
+
+    def __init__(self, retention: timedelta, batch_size: int) -> None:
+        self.retention = retention
+        self.batch_size = batch_size
+        self.runs = 0
+        self.screenplays = 0
+        self.elements = 0
+        self.last_run_seconds = 0.0
+        self.last_run_rows_per_second = 0.0
+        self.lag_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def run(self) -> Tuple[int, int]:
+        """
+        Purge until no screenplay is due. Returns the number of screenplays and elements deleted.
+        """
+        started = time.monotonic()
+        screenplays = elements = 0
+        db = SessionLocal()
+        try:
+            while True:
+                deleted_before = datetime.utcnow() - self.retention
+                batch_screenplays, batch_elements = crud.screenplay.purge_deleted(
+                    db, deleted_before=deleted_before, limit=self.batch_size)
+                db.commit()
+                screenplays += batch_screenplays
+                elements += batch_elements
+                if batch_screenplays < self.batch_size:
+                    break
+            oldest = crud.screenplay.oldest_deleted_at(db)
+            db.rollback()
+        finally:
+            db.close()
+
+        seconds = time.monotonic() - started
+        with self._stats_lock:
+            self.runs += 1
+            self.screenplays += screenplays
+            self.elements += elements
+            self.last_run_seconds = seconds
+            self.last_run_rows_per_second = (screenplays + elements) / seconds if seconds else 0.0
+            self.lag_seconds = max((deleted_before - oldest).total_seconds(), 0.0) if oldest else 0.0
+        logger.info(
+            "Purged %d screenplays and %d elements in %.2fs, lag %.0fs", screenplays, elements, seconds,
+            self.lag_seconds)
+        return screenplays, elements
+
+    async def run_periodically(self, interval: int) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(self.run)
+            except Exception:
+                logger.exception("Purge of deleted screenplays failed")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "runs": self.runs,
+                "screenplays": self.screenplays,
+                "elements": self.elements,
+                "last_run_seconds": self.last_run_seconds,
+                "last_run_rows_per_second": self.last_run_rows_per_second,
+                "lag_seconds": self.lag_seconds,
+            }
+
+
+purge = Purge(timedelta(days=settings.PURGE_RETENTION_DAYS), settings.PURGE_BATCH_SIZE)
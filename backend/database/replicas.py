@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine, ExceptionContext
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# set on clients that committed a change, who read from the primary while it lasts
+READ_PRIMARY_COOKIE = "read_primary"
+# seconds the replica is behind, 0 when it replayed everything it received; also 0 on a primary
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+
+    def __init__(self, name: str, engine: Engine, async_engine: Optional[AsyncEngine] = None) -> None:
+        self.name = name
+        self.engine = engine
+        self.async_engine = async_engine
+        self.healthy = True
+        self.lag_seconds = 0.0
+
+
+class ReplicaSet:
+    """
+    Read replicas that read-only sessions are spread over round-robin. A replica is left out once it drops
+    a connection, cannot be reached or lags more than `max_lag_seconds` behind, until `check` finds it back.
+    """
+
+    def __init__(self, replicas: List[Replica], max_lag_seconds: float, read_your_writes_seconds: int = 0) -> None:
+        self.replicas = replicas
+        self.max_lag_seconds = max_lag_seconds
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self._next = 0
+        self._lock = threading.Lock()
+        # users whose reads go to the primary, until when
+        self._writers: Dict[int, float] = {}
+        for replica in replicas:
+            event.listen(replica.engine, "handle_error", self._error_handler(replica))
+            if replica.async_engine is not None:
+                event.listen(replica.async_engine.sync_engine, "handle_error", self._error_handler(replica))
+
+    def _error_handler(self, replica: Replica) -> Callable[[ExceptionContext], None]:
+        def handle_error(context: ExceptionContext) -> None:
+            # no connection means that connecting failed
+            if context.is_disconnect or context.connection is None:
+                self.mark_down(replica, context.original_exception)
+        return handle_error
+
+    def choose(self) -> Optional[Replica]:
+        """
+        The next healthy replica, None if there is none.
+        """
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[self._next % len(self.replicas)]
+                self._next += 1
+                if replica.healthy:
+                    return replica
+        return None
+
+    def note_writers(self, user_ids: Iterable[int]) -> None:
+        """
+        Send the reads of these users to the primary for `read_your_writes_seconds`, after a change of theirs was
+        committed outside of their HTTP requests, e.g. over the collaboration WebSocket, where `READ_PRIMARY_COOKIE`
+        cannot be set. Kept in-process, like `token_versions`.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._writers = {user_id: until for user_id, until in self._writers.items() if until > now}
+            for user_id in user_ids:
+                self._writers[user_id] = now + self.read_your_writes_seconds
+
+    def has_writers(self) -> bool:
+        return bool(self._writers)
+
+    def wrote_recently(self, user_id: int) -> bool:
+        with self._lock:
+            return self._writers.get(user_id, 0) > time.monotonic()
+
+    def mark_down(self, replica: Replica, reason: Any) -> None:
+        if replica.healthy:
+            logger.warning("Replica %s left out: %s", replica.name, reason)
+        replica.healthy = False
+
+    def check(self) -> None:
+        """
+        Measure the lag of every replica, leaving out those that cannot be reached or lag too far behind.
+        """
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as connection:
+                    replica.lag_seconds = float(connection.execute(LAG_QUERY).scalar())
+            except Exception as e:
+                self.mark_down(replica, e)
+                continue
+            if replica.lag_seconds > self.max_lag_seconds:
+                self.mark_down(replica, f"{replica.lag_seconds:.1f}s behind")
+            elif not replica.healthy:
+                logger.info("Replica %s is back, %.1fs behind", replica.name, replica.lag_seconds)
+                replica.healthy = True
+
+    async def check_periodically(self, interval: int) -> None:
+        while True:
+            try:
+                await run_in_threadpool(self.check)
+            except Exception:
+                logger.exception("Health check of the replicas failed")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "count": len(self.replicas),
+            "healthy": sum(replica.healthy for replica in self.replicas),
+            "max_lag_seconds": max((replica.lag_seconds for replica in self.replicas), default=0.0),
+        }
+
+
+class _Commits:
+    __slots__ = ("committed",)
+
+    def __init__(self) -> None:
+        self.committed = False
+
+
+# the object is shared with the threadpool, where sync routes commit, through the copied context
+_commits: ContextVar[Optional[_Commits]] = ContextVar("request_commits", default=None)
+
+
+@event.listens_for(Session, "after_commit")
+def _note_commit(db: Session) -> None:
+    commits = _commits.get()
+    if commits is not None:
+        commits.committed = True
+
+
+class ReadYourWritesMiddleware:
+    """
+    Set `READ_PRIMARY_COOKIE` for `max_age` seconds on responses to requests that committed a change, so that
+    the client's next reads go to the primary and see the change even if the replicas did not replay it yet.
+    """
+
+    def __init__(self, app: ASGIApp, max_age: int) -> None:
+        self.app = app
+        self.max_age = max_age
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        commits = _Commits()
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and commits.committed:
+                MutableHeaders(scope=message).append(
+                    "set-cookie", f"{READ_PRIMARY_COOKIE}=1; Max-Age={self.max_age}; Path=/; HttpOnly; SameSite=lax")
+            await send(message)
+
+        token = _commits.set(commits)
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _commits.reset(token)
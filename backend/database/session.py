@@ -1,7 +1,98 @@
-from sqlalchemy import create_engine
+import time
+from typing import Any
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
+from core import metrics, query_budget
 from core.config import settings
+from database.replicas import Replica, ReplicaSet
+
+
+class TimedPoolMixin:
+    """
+    Reports how long checkouts wait for a free connection, or for a new one to be opened,
+    labelled with the `pool_logging_name` of the engine.
+    """
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.record_pool_checkout(self.logging_name or "", time.perf_counter() - started)
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+def _before_query(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool):
+    query_budget.record(statement)
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+
+def _after_query(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool):
+    started = getattr(context, "metrics_started", None)
+    if started is not None:
+        metrics.record_query(time.perf_counter() - started)
+
+
+def instrument(name: str, engine: Engine) -> None:
+    """
+    Account the queries of `engine` to the current request, in the metrics and the query budget,
+    and expose its pool in the metrics.
+    """
+    event.listen(engine, "before_cursor_execute", _before_query)
+    event.listen(engine, "after_cursor_execute", _after_query)
+    metrics.register_pool(name, engine)
+
+
+# psycopg2 sends executemany() INSERTs as multi-row VALUES and UPDATEs in batches
+engine = create_engine(
+    settings.SQLALCHEMY_DATABASE_URI,
+    pool_pre_ping=True,
+    poolclass=TimedQueuePool,
+    pool_logging_name="sync",
+    executemany_mode="values_plus_batch",
+    executemany_values_page_size=settings.ELEMENT_INSERT_BATCH_SIZE,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+instrument("sync", engine)
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.ASYNC_DB_ENABLED:
+    async_engine = create_async_engine(
+        settings.SQLALCHEMY_ASYNC_DATABASE_URI, pool_pre_ping=True, poolclass=TimedAsyncAdaptedQueuePool,
+        pool_logging_name="async")
+    instrument("async", async_engine.sync_engine)
+    AsyncSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, expire_on_commit=False, bind=async_engine, class_=AsyncSession
+    )
+
+# read-only routes use these, see `deps.get_read_db`
+replicas = None
+if settings.SQLALCHEMY_REPLICA_URIS:
+    replica_list = []
+    for number, uri in enumerate(settings.SQLALCHEMY_REPLICA_URIS, 1):
+        name = f"replica{number}"
+        replica_engine = create_engine(uri, pool_pre_ping=True, poolclass=TimedQueuePool, pool_logging_name=name)
+        instrument(name, replica_engine)
+        replica_async_engine = None
+        if settings.ASYNC_DB_ENABLED:
+            replica_async_engine = create_async_engine(
+                settings.SQLALCHEMY_ASYNC_REPLICA_URIS[number - 1], pool_pre_ping=True,
+                poolclass=TimedAsyncAdaptedQueuePool, pool_logging_name=f"{name}_async")
+            instrument(f"{name}_async", replica_async_engine.sync_engine)
+        replica_list.append(Replica(name, replica_engine, replica_async_engine))
+    replicas = ReplicaSet(
+        replica_list, settings.DB_REPLICA_MAX_LAG_SECONDS, settings.DB_REPLICA_READ_YOUR_WRITES_SECONDS)
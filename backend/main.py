@@ -1,8 +1,21 @@
+import asyncio
+
 from fastapi import FastAPI
+from starlette import status
 from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 
 from api.api_v1.api import api_router
+from api.pagination import NEXT_CURSOR_HEADER
+from core import cache, metrics
+from core.query_budget import QueryBudgetMiddleware
 from core.config import settings
+from core.middleware import APIResponse, CompressionMiddleware, ContentNegotiationMiddleware
+from crud import InvalidCursorError
+from database import session
+from database.purge import purge
+from database.replicas import ReadYourWritesMiddleware
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -18,8 +31,20 @@ app = FastAPI(
         "name": "MIT License",
         "url": "https://opensource.org/licenses/MIT",
     },
+    default_response_class=APIResponse,
 )
 
+if settings.MSGPACK_ENABLED:
+    app.add_middleware(ContentNegotiationMiddleware)
+
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY if settings.COMPRESSION_BROTLI_ENABLED else None,
+    )
+
 # Set all CORS enabled origins
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -28,7 +53,58 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified"],
     )
 
+if session.replicas is not None:
+    app.add_middleware(ReadYourWritesMiddleware, max_age=settings.DB_REPLICA_READ_YOUR_WRITES_SECONDS)
+
+# installed when "off" too, so that tests and the benchmark can check budgets with `query_budget.enforce()`
+app.add_middleware(
+    QueryBudgetMiddleware,
+    mode=settings.QUERY_BUDGET_MODE,
+    max_queries=settings.QUERY_BUDGET_MAX_QUERIES,
+    max_repeats=settings.QUERY_BUDGET_MAX_REPEATS,
+)
+
+# outermost, so that the latency includes the other middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.add_route("/metrics", metrics.scrape, include_in_schema=False)
+    metrics.register_stats("cache", cache.cache.stats, "Cache of public screenplays and listings")
+    metrics.register_stats("purge", purge.stats, "Purge of deleted screenplays")
+    if session.replicas is not None:
+        metrics.register_stats("db_replicas", session.replicas.stats, "Read replicas")
+
+
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_exception_handler(request: Request, exc: InvalidCursorError) -> JSONResponse:
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": str(exc)})
+
+
+@app.on_event("startup")
+async def start_purge() -> None:
+    if settings.PURGE_INTERVAL_SECONDS:
+        app.state.purge_task = asyncio.create_task(purge.run_periodically(settings.PURGE_INTERVAL_SECONDS))
+
+
+@app.on_event("shutdown")
+async def stop_purge() -> None:
+    if getattr(app.state, "purge_task", None):
+        app.state.purge_task.cancel()
+
+
+@app.on_event("startup")
+async def start_replica_checks() -> None:
+    if session.replicas is not None:
+        app.state.replica_check_task = asyncio.create_task(
+            session.replicas.check_periodically(settings.DB_REPLICA_CHECK_SECONDS))
+
+
+@app.on_event("shutdown")
+async def stop_replica_checks() -> None:
+    if getattr(app.state, "replica_check_task", None):
+        app.state.replica_check_task.cancel()
+
 
 app.include_router(api_router, prefix=settings.API_V1)
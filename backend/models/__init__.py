@@ -1,3 +1,6 @@
 from .user import User
 from .screenplay import Screenplay
 from .editor_elements import EditorElement
+from .scene import Scene
+from .character_stat import CharacterStat
+from .revision import ScreenplayRevision, ScreenplaySnapshot
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint
+from database.base_class import Base
+
+
+class CharacterStat(Base):
+    """
+    Class that represents the dialogue statistics of one character of a screenplay in the database.
+    Rows are the sums of the per scene `Scene.character_stats`, kept up to date by `crud.character_stat.apply_delta`.
+    """
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    screenplay_id = Column(Integer, ForeignKey('screenplays.id', ondelete="CASCADE"), nullable=False)
+    name = Column(String, nullable=False)
+    # DIALOGUE elements spoken by the character, and their words
+    lines = Column(Integer, nullable=False, default=0)
+    words = Column(Integer, nullable=False, default=0)
+    # scenes with at least one cue of the character
+    scenes = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("screenplay_id", "name", name="character_stat_screenplay_name_key"),
+    )
@@ -1,6 +1,6 @@
 import enum
 from sqlalchemy import Enum
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database.base_class import Base
 
@@ -28,3 +28,7 @@ class EditorElement(Base):
     screenplay_id = Column(Integer, ForeignKey('screenplays.id', ondelete="CASCADE"), nullable=False)
 
     screenplay = relationship("Screenplay", back_populates="elements")
+
+    __table_args__ = (
+        Index("editor_element_screenplay_position_idx", "screenplay_id", "position"),
+    )
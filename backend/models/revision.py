@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, LargeBinary, UniqueConstraint
+from database.base_class import Base
+
+
+class ScreenplayRevision(Base):
+    """
+    Class that represents one entry of the append-only revision log of a screenplay in the database.
+    `version` is the screenplay version the entry leads to, `data` its operations, packed by `core.history.pack`.
+    """
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    screenplay_id = Column(Integer, ForeignKey('screenplays.id', ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)
+    operation_count = Column(Integer, nullable=False, default=0)
+    encoding = Column(String, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("screenplay_id", "version", name="screenplay_revision_screenplay_version_key"),
+    )
+
+
+class ScreenplaySnapshot(Base):
+    """
+    Class that represents the full content of a screenplay at one version in the database,
+    the starting point for replaying the revision log.
+    """
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    screenplay_id = Column(Integer, ForeignKey('screenplays.id', ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)
+    encoding = Column(String, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("screenplay_id", "version", name="screenplay_snapshot_screenplay_version_key"),
+    )
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, JSON
+from database.base_class import Base
+
+
+class Scene(Base):
+    """
+    Class that represents the scene index of a screenplay in the database.
+    Rows are derived from the screenplay elements and rebuilt by `crud.scene.refresh` whenever they change.
+    """
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    screenplay_id = Column(Integer, ForeignKey('screenplays.id', ondelete="CASCADE"), nullable=False)
+    # the HEADING element, None for the elements before the first heading
+    heading_id = Column(Integer, nullable=True)
+    heading = Column(String, nullable=True)
+    start_position = Column(Integer, nullable=False)
+    end_position = Column(Integer, nullable=False)
+    element_count = Column(Integer, nullable=False, default=0)
+    word_count = Column(Integer, nullable=False, default=0)
+    characters = Column(JSON, nullable=False, default=list)
+    # {name: {"lines": DIALOGUE elements, "words": words of dialogue}} for every character with a cue in the scene
+    character_stats = Column(JSON, nullable=False, default=dict)
+
+    __table_args__ = (
+        Index("scene_screenplay_start_position_idx", "screenplay_id", "start_position"),
+    )
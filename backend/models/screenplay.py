@@ -1,7 +1,6 @@
 from sqlalchemy import Column, Integer, String, ForeignKey, Boolean
 from sqlalchemy.orm import relationship
 from database.base_class import Base
-from sqlalchemy.ext.orderinglist import ordering_list
 
 
 class Screenplay(Base):
@@ -12,9 +11,10 @@ class Screenplay(Base):
     name = Column(String, index=True, nullable=False)
     description = Column(String, nullable=True)
     is_public = Column(Boolean, default=False)
+    # incremented on every change of the screenplay or its elements, part of the ETag
+    version = Column(Integer, nullable=False, default=0)
 
     owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
 
     owner = relationship("User", back_populates="screenplays")
-    elements = relationship("EditorElement", back_populates="screenplay", order_by="EditorElement.position",
-                            collection_class=ordering_list('position'))
+    elements = relationship("EditorElement", back_populates="screenplay", order_by="EditorElement.position")
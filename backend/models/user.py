@@ -16,5 +16,7 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean(), default=True)
     is_superuser = Column(Boolean(), default=False)
+    # bumped whenever issued tokens must stop being accepted (password or permission changes)
+    token_version = Column(Integer, nullable=False, default=0)
 
     screenplays = relationship("Screenplay", back_populates="owner")
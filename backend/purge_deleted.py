@@ -0,0 +1,31 @@
+import argparse
+import logging
+import sys
+from datetime import timedelta
+from typing import List, Optional
+
+from core.config import settings
+from database.purge import Purge
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Delete screenplays soft-deleted before the retention period.")
+    parser.add_argument(
+        "--retention-days", type=int, default=settings.PURGE_RETENTION_DAYS,
+        help="days a deleted screenplay is kept, PURGE_RETENTION_DAYS by default")
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.PURGE_BATCH_SIZE,
+        help="screenplays deleted per transaction, PURGE_BATCH_SIZE by default")
+    args = parser.parse_args(argv)
+
+    purge = Purge(timedelta(days=args.retention_days), args.batch_size)
+    purge.run()
+    logger.info("Purge: %s", purge.stats())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import argparse
+import logging
+import sys
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+import crud
+import models
+from core.config import settings
+from crud.crud_character_stat import sum_scene_stats
+from crud.crud_scene import build_scenes
+from database.session import SessionLocal
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCENE_FIELDS = (
+    "heading_id", "heading", "start_position", "end_position", "element_count", "word_count", "characters",
+    "character_stats",
+)
+
+
+def rebuild(db: Session, screenplay_id: int) -> None:
+    crud.scene.refresh(db, screenplay_id=screenplay_id)
+    crud.character_stat.rebuild(db, screenplay_id=screenplay_id)
+    db.commit()
+
+
+def check(db: Session, screenplay_id: int) -> List[str]:
+    """
+    Compare the scene index and character statistics of a screenplay with values computed from its elements.
+    """
+    element = models.EditorElement
+    rows = db.query(element.id, element.content_type, element.content, element.position).filter(
+        element.screenplay_id == screenplay_id
+    ).order_by(element.position, element.id).yield_per(settings.EXPORT_FETCH_SIZE)
+    expected = list(build_scenes(screenplay_id, rows))
+    actual = crud.scene.get_multi_by_screenplay(db, screenplay_id=screenplay_id)
+
+    problems = []
+    if len(expected) != len(actual):
+        problems.append(f"{len(actual)} scenes indexed, {len(expected)} expected")
+    for index, (scene, indexed) in enumerate(zip(expected, actual)):
+        for field in SCENE_FIELDS:
+            if getattr(indexed, field) != scene[field]:
+                problems.append(f"scene {index}: {field} is {getattr(indexed, field)!r}, expected {scene[field]!r}")
+
+    totals = sum_scene_stats(scene["character_stats"] for scene in expected)
+    stored = {
+        stat.name: {"lines": stat.lines, "words": stat.words, "scenes": stat.scenes}
+        for stat in crud.character_stat.get_multi_by_screenplay(db, screenplay_id=screenplay_id)
+    }
+    for name in totals.keys() | stored.keys():
+        if totals.get(name) != stored.get(name):
+            problems.append(f"character {name!r}: {stored.get(name)!r}, expected {totals.get(name)!r}")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild or check the scene index and character statistics.")
+    parser.add_argument("--check", action="store_true", help="only report screenplays whose index is out of date")
+    parser.add_argument("--screenplay", type=int, action="append", help="screenplay id, all screenplays by default")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        screenplay_ids = args.screenplay or [
+            _id for _id, in db.query(models.Screenplay.id).order_by(models.Screenplay.id)]
+        if not args.check:
+            logger.info("Rebuilding scene index")
+            for screenplay_id in screenplay_ids:
+                rebuild(db, screenplay_id)
+            logger.info("Indexed scenes of %d screenplays", len(screenplay_ids))
+            return 0
+
+        inconsistent = 0
+        for screenplay_id in screenplay_ids:
+            problems = check(db, screenplay_id)
+            if problems:
+                inconsistent += 1
+                logger.warning("Screenplay %d: %s", screenplay_id, "; ".join(problems))
+        logger.info("Checked %d screenplays, %d out of date", len(screenplay_ids), inconsistent)
+        return 1 if inconsistent else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
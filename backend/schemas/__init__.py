@@ -1,4 +1,14 @@
 from .token import Token, TokenPayload
-from .user import User, UserCreate, UserInDB, UserUpdate
-from .screenplay import ScreenplayBase, Screenplay, ScreenplayCreate, ScreenplayUpdate, ScreenplayDelete
-from .editor_elements import EditorElement, EditorElementCreate, EditorElementDelete, EditorElementBase
+from .user import User, UserCreate, UserInDB, UserUpdate, UserClaims
+from .screenplay import (
+    ScreenplayBase, Screenplay, ScreenplaySummary, ScreenplayMeta, ScreenplayCreate, ScreenplayUpdate, ScreenplayDelete,
+    ScreenplayFormat, ScreenplayImportFormat, PageBreak, ScreenplayPages,
+)
+from .editor_elements import (
+    EditorElement, EditorElementCreate, EditorElementDelete, EditorElementBase,
+    ElementOperationType, EditorElementOperation, EditorElementPatch, EditorElementPatchResult, CollaborationMessage,
+    ContentType, SearchMode, SearchHit,
+)
+from .scene import Scene
+from .character_stat import CharacterStat
+from .revision import ScreenplayRevision, RevisionElement, ScreenplayAtRevision
@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+
+
+class CharacterStat(BaseModel):
+    name: str
+    lines: int
+    words: int
+    scenes: int
+
+    class Config:
+        orm_mode = True
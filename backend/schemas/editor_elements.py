@@ -1,8 +1,8 @@
 from enum import Enum
-from typing import Optional, Any
+from typing import Optional, Any, List, Dict
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, root_validator
 
 
 class ContentType(str, Enum):
@@ -38,3 +38,74 @@ class EditorElement(EditorElementBase):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     deleted_at: Optional[Any] = None
+
+
+class ElementOperationType(str, Enum):
+    INSERT = 'insert'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    MOVE = 'move'
+
+
+class EditorElementOperation(BaseModel):
+    """
+    Single element-level edit. Inserts and moves are anchored on `after_id` (None means the start of the
+    screenplay). An insert may carry a negative `id` so that later operations in the same patch can refer to it.
+    """
+    op: ElementOperationType
+    id: Optional[int] = None
+    after_id: Optional[int] = None
+    content: Optional[str] = None
+    content_type: Optional[ContentType] = None
+
+    @root_validator(skip_on_failure=True)
+    def check_operation_fields(cls, values: Dict[str, Any]) -> Dict[str, Any]:
+        op, _id = values.get("op"), values.get("id")
+        if op == ElementOperationType.INSERT:
+            if _id is not None and _id >= 0:
+                raise ValueError("insert operations may only carry a negative temporary id")
+        elif _id is None:
+            raise ValueError(f"{op.value} operations require an element id")
+        return values
+
+
+class EditorElementPatch(BaseModel):
+    operations: List[EditorElementOperation] = Field(..., example=[
+        {'op': 'insert', 'id': -1, 'after_id': 1, 'content': 'JOHN', 'content_type': 'CHARACTER'},
+        {'op': 'insert', 'after_id': -1, 'content': 'Hello.', 'content_type': 'DIALOGUE'},
+        {'op': 'update', 'id': 2, 'content': 'EXT. PARK - DAY'},
+        {'op': 'move', 'id': 3, 'after_id': None},
+        {'op': 'delete', 'id': 4}])
+
+
+class CollaborationMessage(EditorElementPatch):
+    """
+    Operations sent over the collaboration WebSocket. `ref` is echoed in the acknowledgement.
+    """
+    ref: Optional[str] = None
+
+
+class EditorElementPatchResult(BaseModel):
+    elements: List[EditorElement] = []
+    deleted: List[int] = []
+    ids: Dict[int, int] = {}
+    # version of the screenplay after the operations
+    version: Optional[int] = None
+
+
+class SearchMode(str, Enum):
+    WORDS = 'words'
+    SUBSTRING = 'substring'
+
+
+class SearchHit(BaseModel):
+    screenplay_id: int
+    screenplay_name: str
+    element_id: int
+    content_type: ContentType
+    position: Optional[int] = None
+    rank: float
+    snippet: str
+
+    class Config:
+        orm_mode = True
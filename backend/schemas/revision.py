@@ -0,0 +1,29 @@
+from typing import Optional, List
+from datetime import datetime
+
+from pydantic import BaseModel
+
+from .editor_elements import ContentType
+
+
+class ScreenplayRevision(BaseModel):
+    version: int
+    operation_count: int
+    created_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+
+class RevisionElement(BaseModel):
+    id: int
+    content: Optional[str] = None
+    content_type: Optional[ContentType] = None
+
+
+class ScreenplayAtRevision(BaseModel):
+    id: int
+    version: int
+    name: str
+    description: Optional[str] = None
+    elements: List[RevisionElement] = []
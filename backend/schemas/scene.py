@@ -0,0 +1,18 @@
+from typing import Optional, List, Dict
+
+from pydantic import BaseModel
+
+
+class Scene(BaseModel):
+    id: int
+    heading_id: Optional[int] = None
+    heading: Optional[str] = None
+    start_position: int
+    end_position: int
+    element_count: int
+    word_count: int
+    characters: List[str] = []
+    character_stats: Dict[str, Dict[str, int]] = {}
+
+    class Config:
+        orm_mode = True
@@ -27,6 +27,17 @@ class ContentType(str, Enum):
     TEXT = 'TEXT'
 
 
+class ScreenplayFormat(str, Enum):
+    FOUNTAIN = 'fountain'
+    FDX = 'fdx'
+    TXT = 'txt'
+
+
+class ScreenplayImportFormat(str, Enum):
+    FOUNTAIN = 'fountain'
+    FDX = 'fdx'
+
+
 class EditorElement(BaseModel):
     content: str
     content_type: ContentType = ContentType.TEXT
@@ -64,11 +75,32 @@ class ScreenplayDelete(ScreenplayBase):
     deleted_at: Optional[Any] = None
 
 
-class Screenplay(ScreenplayBase):
+class ScreenplaySummary(ScreenplayBase):
     id: int
     owner_id: int
+    version: int = 0
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     deleted_at: Optional[Any] = None
 
+
+class ScreenplayMeta(ScreenplaySummary):
+    element_count: int
+    scene_count: int
+
+
+class Screenplay(ScreenplaySummary):
     elements: List[Any] = []
+
+
+class PageBreak(BaseModel):
+    page: int
+    element_id: int
+    position: Optional[int]
+    line: int
+    continued: bool
+
+
+class ScreenplayPages(BaseModel):
+    page_count: int
+    breaks: List[PageBreak] = []
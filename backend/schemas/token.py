@@ -11,3 +11,7 @@ class Token(BaseModel):
 class TokenPayload(BaseModel):
     email: str = None
     sub: Optional[int] = None
+    # claims carried by tokens, missing on tokens issued before they were added
+    active: Optional[bool] = None
+    superuser: Optional[bool] = None
+    ver: Optional[int] = None
@@ -31,3 +31,14 @@ class User(UserInDBBase):
 
 class UserInDB(UserInDBBase):
     hashed_password: str
+
+
+class UserClaims(BaseModel):
+    """
+    The authenticated user as described by the access token, available without loading the user row.
+    """
+    id: int
+    email: Optional[str] = None
+    is_active: bool
+    is_superuser: bool
+    token_version: int = 0
@@ -0,0 +1,44 @@
+from typing import Dict, Iterator
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from starlette.testclient import TestClient
+
+import crud
+import models
+import schemas
+from core import security
+from database.session import SessionLocal
+from main import app
+
+EMAIL_DOMAIN = "tests.example.com"
+
+
+@pytest.fixture
+def db() -> Iterator[Session]:
+    db = SessionLocal()
+    try:
+        db.execute("SELECT 1")
+    except OperationalError:
+        db.close()
+        pytest.skip("database not reachable")
+    try:
+        yield db
+    finally:
+        # screenplays and their rows go with the users through the foreign key cascades
+        db.rollback()
+        db.query(models.User).filter(models.User.email.like(f"%@{EMAIL_DOMAIN}")).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+@pytest.fixture
+def client() -> TestClient:
+    return TestClient(app)
+
+
+@pytest.fixture
+def user_headers(db: Session) -> Dict[str, str]:
+    user = crud.user.create(db, obj_in=schemas.UserCreate(email=f"user@{EMAIL_DOMAIN}", password="password"))
+    return {"Authorization": f"Bearer {security.create_access_token(user.id, user=user)}"}
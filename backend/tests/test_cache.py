@@ -0,0 +1,23 @@
+from core.cache import MemoryCache
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(maxsize=2, ttl=60)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.set("c", b"3")
+    assert cache.get("a") == b"1"
+    assert cache.get("b") is None
+    assert cache.get("c") == b"3"
+
+
+def test_memory_cache_keeps_counters_past_maxsize():
+    cache = MemoryCache(maxsize=3, ttl=60)
+    assert cache.incr("generation") == 1
+    for key in ("a", "b", "c", "d"):
+        cache.set(key, b"page")
+    assert cache.get("generation") == b"1"
+    assert cache.incr("generation") == 2
+    assert cache.get("a") is None
+    assert cache.get("d") == b"page"
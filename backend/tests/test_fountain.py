@@ -0,0 +1,39 @@
+from core.formats.fountain import export_fountain, parse_fountain
+from models.editor_elements import ContentType
+
+
+def round_trip(rows):
+    title, elements = parse_fountain("".join(export_fountain("Title", rows)).splitlines(keepends=True))
+    return title, [(element.content_type, element.content) for element in elements]
+
+
+def test_round_trip():
+    rows = [
+        (ContentType.HEADING, "INT. HOUSE - NIGHT"),
+        (ContentType.ACTION, "The lights go out."),
+        (ContentType.CHARACTER, "ANNA"),
+        (ContentType.PARENTHETICAL, "(whispering)"),
+        (ContentType.DIALOGUE, "Who's there?"),
+        (ContentType.TRANSITION, "CUT TO:"),
+        (ContentType.ACTION, "Two lines,\n\nwith a blank one."),
+    ]
+    assert round_trip(rows) == ("Title", rows)
+
+
+def test_round_trip_keeps_action_that_reads_as_another_element():
+    rows = [
+        (ContentType.ACTION, "BANG!"),
+        (ContentType.ACTION, "BANG!\nThe door explodes."),
+        (ContentType.ACTION, "@ANNA\nenters."),
+        (ContentType.ACTION, "INT. HOUSE - NIGHT"),
+        (ContentType.ACTION, "FADE TO:"),
+        (ContentType.ACTION, "int. is short for interior."),
+        (ContentType.ACTION, "> not a transition"),
+        (ContentType.ACTION, "!"),
+    ]
+    assert round_trip(rows) == ("Title", rows)
+
+
+def test_shots_and_text_read_back_as_action():
+    rows = [(ContentType.SHOT, "CLOSE ON\nthe gun."), (ContentType.TEXT, "THE END")]
+    assert round_trip(rows) == ("Title", [(ContentType.ACTION, content) for _, content in rows])
@@ -0,0 +1,43 @@
+from typing import Dict
+
+from starlette.testclient import TestClient
+
+from core import query_budget
+from core.config import settings
+
+# more INSERT batches than a statement may be repeated
+ELEMENTS = (settings.QUERY_BUDGET_MAX_REPEATS + 1) * settings.ELEMENT_INSERT_BATCH_SIZE + 1
+
+
+def fountain(elements: int) -> bytes:
+    lines = ["Title: Budget", ""]
+    for n in range(elements):
+        lines += [f"INT. ROOM {n} - DAY" if n % 10 == 0 else f"Action line {n}.", ""]
+    return "\n".join(lines).encode()
+
+
+def test_fingerprint_replaces_values():
+    assert query_budget.fingerprint("SELECT * FROM t WHERE id = 12 AND name = 'it''s'") == \
+        query_budget.fingerprint("SELECT * FROM t WHERE id = 3 AND name = 'x'")
+
+
+def test_import_larger_than_a_batch_stays_within_budget(client: TestClient, user_headers: Dict[str, str]):
+    with query_budget.enforce() as exceeded:
+        response = client.post(
+            f"{settings.API_V1}/screenplays/import", headers=user_headers,
+            files={"file": ("budget.fountain", fountain(ELEMENTS), "text/plain")})
+    assert response.status_code == 200
+    assert exceeded == []
+
+
+def test_create_larger_than_a_batch_stays_within_budget(client: TestClient, user_headers: Dict[str, str]):
+    elements = [
+        {"content": f"Action line {n}.", "content_type": "ACTION", "position": n} for n in range(ELEMENTS)
+    ]
+    with query_budget.enforce() as exceeded:
+        response = client.post(
+            f"{settings.API_V1}/screenplays/", headers=user_headers,
+            json={"name": "Budget", "is_public": False, "owner_id": 0, "elements": elements})
+    assert response.status_code == 200
+    assert len(response.json()["elements"]) == ELEMENTS
+    assert exceeded == []